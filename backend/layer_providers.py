@@ -255,7 +255,9 @@ class AviationStackFlightProvider(FlightProvider):
                         "coordinates": [float(longitude), float(latitude)]
                     },
                     "properties": {
-                        "icao24": flight.get("aircraft", {}).get("registration", ""),
+                        # Hex ICAO24 si viene (permite cruzarlo con OpenSky); si no, la matrícula
+                        "icao24": (flight.get("aircraft") or {}).get("icao24")
+                        or (flight.get("aircraft") or {}).get("registration", ""),
                         "callsign": callsign,
                         "alt_baro": altitude_m if altitude_m else None,
                         "track": direction,
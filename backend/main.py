@@ -7,7 +7,7 @@ import uuid
 import logging
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Dict, Optional, Literal
+from typing import Any, Dict, List, Optional, Literal
 from threading import Lock
 
 from fastapi import Body, FastAPI, Request
@@ -20,8 +20,13 @@ from backend.cache import CacheStore
 from backend.config_manager import ConfigManager
 from backend.services.config_upgrade import clean_aemet_keys
 from backend.services.opensky_service import OpenSkyService
+from backend.services.aircraft_db import AircraftDatabase
+from backend.services.flight_ingest import FlightIngestor
+from backend.services.plane_photos import PlanePhotoCache
 from backend.services.ships_service import AISStreamService
 from backend.services.blitzortung_service import BlitzortungService
+from backend.services.lightning_history import LightningHistoryLog
+from backend.services.storm_tracker import StormProximityTracker
 from backend.secret_store import SecretStore
 from backend.services import ephemerides
 from backend.logging_utils import configure_logging
@@ -51,8 +56,13 @@ secret_store = SecretStore()
 
 # Initialize Global Services
 opensky_service = OpenSkyService(secret_store, logger)
+flight_ingestor = FlightIngestor(secret_store, logger)
+opensky_service.attach_ingestor(flight_ingestor)
+aircraft_db = AircraftDatabase()
+plane_photos = PlanePhotoCache(cache_store.cache_dir / "plane_photos.json", logger=logger)
 ships_service = AISStreamService(cache_store=cache_store, secret_store=secret_store, logger=logger)
 blitzortung_service: Optional[BlitzortungService] = None
+storm_tracker: Optional[StormProximityTracker] = None
 _blitzortung_lock = Lock()
 
 
@@ -128,6 +138,15 @@ def test_maptiler(payload: Dict[str, Any] = Body(...)) -> Dict[str, Any]:
 
 # --- Startup/Shutdown ---
 
+def _warm_plane_photos(loop: asyncio.AbstractEventLoop, codes: List[str]) -> None:
+    """Precarga de fotos desde el hilo del poller: se lanza en el bucle de la app."""
+    try:
+        loop.call_soon_threadsafe(plane_photos.warm, codes)
+    except RuntimeError:
+        # Bucle ya cerrado (apagado en curso)
+        pass
+
+
 @app.on_event("startup")
 def _startup_services() -> None:
     """Initialize background services."""
@@ -151,14 +170,39 @@ def _startup_services() -> None:
     except Exception as exc:
         logger.error("[startup] Failed to start Ships service: %s", exc)
 
+    # OpenSky: sondeo en segundo plano del área configurada; cada publicación
+    # precarga las fotos de las aeronaves recién aparecidas
+    try:
+        app_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        logger.warning("[startup] No running loop; plane photos warm only from /nearby")
+    else:
+        opensky_service.set_publish_listener(lambda codes: _warm_plane_photos(app_loop, codes))
+    opensky_service.start_poller(config_manager.read)
+    opensky_service.start_token_refresher(config_manager.read)
+    flight_ingestor.start(config_manager.read)
+
     # Init Blitzortung (Lightning)
-    global blitzortung_service
+    global blitzortung_service, storm_tracker
     try:
         config = config_manager.read()
         lightning_config = config.layers.lightning if config.layers else None
         
         if lightning_config and lightning_config.enabled:
             logger.info("[startup] Initializing Blitzortung service")
+            history = None
+            if lightning_config.history_enabled:
+                try:
+                    history = LightningHistoryLog(retention_hours=lightning_config.history_retention_hours)
+                except OSError as exc:
+                    logger.warning("[startup] Lightning history disabled: %s", exc)
+            storm_lat, storm_lon = weather.resolve_weather_location(config, None, None)
+            storm_tracker = StormProximityTracker(
+                storm_lat,
+                storm_lon,
+                radius_km=lightning_config.storm_radius_km,
+                window_seconds=lightning_config.storm_window_minutes * 60,
+            )
             with _blitzortung_lock:
                 blitzortung_service = BlitzortungService(
                     enabled=True,
@@ -168,7 +212,13 @@ def _startup_services() -> None:
                     ws_enabled=lightning_config.ws_enabled,
                     ws_url=lightning_config.ws_url,
                     buffer_max=lightning_config.buffer_max,
-                    prune_seconds=lightning_config.prune_seconds
+                    prune_seconds=lightning_config.prune_seconds,
+                    history=history,
+                    callback=storm_tracker.add_strikes,
+                    mqtt_topics=lightning_config.mqtt_topics,
+                    concurrent_sources=lightning_config.concurrent_sources,
+                    dedup_window_seconds=lightning_config.dedup_window_seconds,
+                    ingest_batch_ms=lightning_config.ingest_batch_ms,
                 )
                 blitzortung_service.start()
     except Exception as exc:
@@ -178,7 +228,10 @@ def _startup_services() -> None:
 def _shutdown_services() -> None:
     """Stop background services."""
     logger.info("Shutting down services...")
+    flight_ingestor.stop()
+    opensky_service.set_publish_listener(None)
     opensky_service.close()
+    aircraft_db.close()
     ships_service.close()
     
     global blitzortung_service
@@ -187,6 +240,13 @@ def _shutdown_services() -> None:
             blitzortung_service.stop()
             blitzortung_service = None
 
+
+@app.on_event("shutdown")
+async def _shutdown_async_clients() -> None:
+    """Close clients bound to the application event loop."""
+    await opensky_service.aclose()
+    await plane_photos.aclose()
+
 # --- Static Files (SPA) ---
 # Serve the smart-display frontend
 class SPAStaticFiles(StaticFiles):
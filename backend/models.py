@@ -477,12 +477,16 @@ class OpenSkyProviderConfig(BaseModel):
 class AviationStackProviderConfig(BaseModel):
     """Configuración específica del proveedor AviationStack."""
     base_url: str = Field(default="http://api.aviationstack.com/v1", max_length=512)
+    # Sólo se usa si está en ``merge_providers``. Cada sondeo es una llamada: a 900 s
+    # son ~2.900 al mes (plan de pago); el gratuito (100/mes) exige >= 27000 s
+    poll_seconds: int = Field(default=900, ge=30, le=86400)
 
 
 class CustomFlightProviderConfig(BaseModel):
     """Configuración específica del proveedor personalizado de vuelos."""
     api_url: Optional[str] = Field(default=None, max_length=512)
     api_key: Optional[str] = Field(default=None, max_length=512)
+    poll_seconds: int = Field(default=30, ge=5, le=3600)
 
 
 class FlightsLayerConfig(BaseModel):
@@ -498,6 +502,14 @@ class FlightsLayerConfig(BaseModel):
     grid_px: int = Field(default=24, ge=8, le=128)
     styleScale: float = Field(default=3.2, ge=0.1, le=10)
     render_mode: Literal["circle", "symbol", "symbol_custom", "auto"] = "symbol_custom"
+    # Navegación a estima entre sondeos (0 = desactivada)
+    dead_reckoning_max_seconds: int = Field(default=30, ge=0, le=300)
+    # Historial de posiciones por aeronave (0 puntos = desactivado)
+    track_points: int = Field(default=64, ge=0, le=500)
+    track_max_aircraft: int = Field(default=2000, ge=100, le=10000)
+    track_expire_minutes: int = Field(default=10, ge=1, le=120)
+    # Proveedores que se fusionan con OpenSky (por icao24, gana la posición más reciente)
+    merge_providers: List[Literal["aviationstack", "custom"]] = Field(default_factory=list)
     circle: Optional[FlightsLayerCircleConfig] = None
     symbol: Optional[FlightsLayerSymbolConfig] = None
     opensky: Optional[OpenSkyProviderConfig] = None
@@ -524,6 +536,17 @@ class AISStreamProviderConfig(BaseModel):
     ws_url: Optional[str] = Field(default=DEFAULT_AISSTREAM_WS_URL, max_length=512)
     api_key: Optional[str] = Field(default=None, max_length=512)
     bbox: Optional[ShipsBBoxConfig] = Field(default_factory=ShipsBBoxConfig)
+    # "thread": hilo propio con su bucle; "event_loop": tarea en el bucle de FastAPI
+    ingest_mode: Literal["thread", "event_loop"] = "thread"
+    # Varias cajas (franjas costeras); si hay alguna sustituyen a bbox
+    bboxes: List[ShipsBBoxConfig] = Field(default_factory=list, max_length=16)
+    max_vessels: int = Field(default=10000, ge=100, le=100000)
+    # Limitador de ingesta por MMSI (0 segundos = desactivado)
+    min_report_interval_seconds: float = Field(default=5.0, ge=0, le=300)
+    min_report_move_meters: float = Field(default=50.0, ge=0, le=10000)
+    # Estelas por barco (0 puntos = desactivadas)
+    track_points: int = Field(default=32, ge=0, le=500)
+    track_max_total_points: int = Field(default=200000, ge=1000, le=2000000)
 
     @field_validator("ws_url", mode="before")
     @classmethod
@@ -566,6 +589,8 @@ class ShipsLayerConfig(BaseModel):
     decimate: Literal["grid", "none"] = "grid"
     grid_px: int = Field(default=24, ge=8, le=128)
     styleScale: float = Field(default=1.4, ge=0.1, le=10)
+    # Navegación a estima entre informes (0 = desactivada)
+    dead_reckoning_max_seconds: int = Field(default=120, ge=0, le=600)
     aisstream: Optional[AISStreamProviderConfig] = None
     aishub: Optional[AISHubProviderConfig] = None
     ais_generic: Optional[AISGenericProviderConfig] = None
@@ -651,6 +676,14 @@ class LightningLayerConfig(BaseModel):
     mqtt_topic: str = Field(default="blitzortung/1", max_length=256)
     ws_enabled: bool = False
     ws_url: Optional[str] = Field(default=None, max_length=512)
+    history_enabled: bool = True
+    history_retention_hours: int = Field(default=24, ge=1, le=168)
+    mqtt_topics: List[str] = Field(default_factory=list, max_length=16)
+    concurrent_sources: bool = False
+    dedup_window_seconds: int = Field(default=30, ge=1, le=600)
+    ingest_batch_ms: int = Field(default=50, ge=0, le=1000)
+    storm_radius_km: float = Field(default=150.0, ge=10, le=1000)
+    storm_window_minutes: int = Field(default=30, ge=5, le=180)
 
 
 class GlobalLayersConfig(BaseModel):
@@ -972,6 +1005,9 @@ class OpenSkyOAuth2Config(BaseModel):
         max_length=512,
     )
     scope: Optional[str] = Field(default=None, max_length=256)
+    # Renovación proactiva: fracción de la vida del token y margen aleatorio
+    refresh_fraction: float = Field(default=0.75, ge=0.1, le=0.95)
+    refresh_jitter_seconds: int = Field(default=30, ge=0, le=600)
 
 
 class OpenSkyBBoxTopLevelConfig(BaseModel):
@@ -989,6 +1025,12 @@ class OpenSkyTopLevelConfig(BaseModel):
     bbox: Optional[OpenSkyBBoxTopLevelConfig] = None
     poll_seconds: int = Field(default=10, ge=1, le=300)
     oauth2: Optional[OpenSkyOAuth2Config] = None
+    # Reparte los créditos diarios restantes; poll_seconds pasa a ser el mínimo
+    adaptive_polling: bool = True
+    max_poll_seconds: int = Field(default=600, ge=10, le=3600)
+    credit_reserve: float = Field(default=0.1, ge=0.0, le=0.9)
+    night_start_hour: int = Field(default=0, ge=0, le=23)
+    night_end_hour: int = Field(default=6, ge=0, le=23)
 
 
 class AISConfig(BaseModel):
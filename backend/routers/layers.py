@@ -1,13 +1,15 @@
 from __future__ import annotations
 
 import importlib
-from typing import Optional
+import time
+from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Query, Request
 from fastapi.concurrency import run_in_threadpool
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 
 from backend.services.layers import flights, radar, satellite, ships
+from backend.services.lightning_history import records_to_geojson
 
 router = APIRouter(prefix="/api/layers", tags=["layers"])
 
@@ -31,13 +33,27 @@ async def flights_test():
 
 
 @router.get("/flights")
-async def flights_data(request: Request, bbox: Optional[str] = None, extended: Optional[int] = None) -> JSONResponse:
+async def flights_data(
+    request: Request,
+    bbox: Optional[str] = None,
+    extended: Optional[int] = None,
+    trails: bool = False,
+) -> JSONResponse:
     # Use service method directly
-    res = await flights.get_flights_geojson(bbox, extended)
+    res = await flights.get_flights_geojson(bbox, extended, trails)
     print(f"[DEBUG] Flights GeoJSON: {len(res.get('features', []))} features")
     return JSONResponse(content=res)
 
 
+@router.get("/flights/{icao24}/track")
+async def flights_track(icao24: str):
+    main = _load_main_module()
+    track = main.opensky_service.get_track(icao24)
+    if track is None:
+        raise HTTPException(status_code=404, detail="track not found")
+    return track
+
+
 @router.get("/ships/test")
 async def ships_test():
     try:
@@ -48,17 +64,69 @@ async def ships_test():
 
 
 @router.get("/ships")
-async def ships_data(request: Request, bbox: Optional[str] = None, max_items_view: Optional[int] = None):
+async def ships_data(
+    request: Request,
+    bbox: Optional[str] = None,
+    max_items_view: Optional[int] = None,
+    priority: str = Query("recent", pattern="^(recent|speed)$"),
+    tracks: bool = False,
+):
     main = _load_main_module()
 
+    if not bbox and not max_items_view and not tracks:
+        # Snapshot completo: se sirven los bytes pre-serializados sin copiar nada
+        published = main.ships_service.get_published_snapshot()
+        if published is None:
+            return {"type": "FeatureCollection", "features": []}
+        headers = {"ETag": published.etag, "Cache-Control": "no-cache"}
+        if request.headers.get("if-none-match") == published.etag:
+            return Response(status_code=304, headers=headers)
+        return Response(content=published.body, media_type="application/json", headers=headers)
+
     def _call():
-        res = main.ships_service.get_ships_in_bbox(bbox, max_items_view)
+        res = main.ships_service.get_ships_in_bbox(bbox, max_items_view, priority, tracks)
         print(f"[DEBUG] Ships GeoJSON: {len(res.get('features', []))} features")
         return res
 
+    if main.ships_service.runs_in_event_loop:
+        # La ingesta vive en este mismo bucle: la consulta (índice en rejilla) es
+        # corta y así el lock nunca se disputa entre hilos
+        return _call()
     return await run_in_threadpool(_call)
 
 
+@router.post("/ships/view")
+async def ships_view(bbox: List[str] = Query(default=[])):
+    """Sigue la vista del mapa: una o varias cajas "minLon,minLat,maxLon,maxLat".
+
+    Sin cajas se vuelve a las de la configuración. La suscripción se actualiza
+    sobre la conexión abierta, sin reconectar.
+    """
+
+    boxes = []
+    for value in bbox:
+        try:
+            min_lon, min_lat, max_lon, max_lat = (float(x) for x in value.split(","))
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=f"invalid bbox: {value}") from exc
+        boxes.append([[min_lat, min_lon], [max_lat, max_lon]])
+    main = _load_main_module()
+    main.ships_service.set_view_bboxes(boxes or None)
+    return {"ok": True, "boxes": boxes}
+
+
+@router.get("/ships/{mmsi}/track")
+async def ships_track(mmsi: str):
+    main = _load_main_module()
+    if main.ships_service.runs_in_event_loop:
+        track = main.ships_service.get_track(mmsi)
+    else:
+        track = await run_in_threadpool(main.ships_service.get_track, mmsi)
+    if track is None:
+        raise HTTPException(status_code=404, detail="track not found")
+    return track
+
+
 @router.get("/global/radar/test")
 async def radar_test():
     try:
@@ -77,6 +145,15 @@ async def satellite_test():
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
 
+@router.get("/lightning/test")
+async def lightning_test():
+    main = _load_main_module()
+    service = main.blitzortung_service
+    if not service:
+        return {"ok": False, "layer": "lightning", "enabled": False}
+    return {"ok": service.running, "layer": "lightning", **service.get_status()}
+
+
 @router.get("/lightning")
 async def lightning_data(request: Request, bbox: Optional[str] = None) -> JSONResponse:
     main = _load_main_module()
@@ -99,3 +176,64 @@ async def lightning_data(request: Request, bbox: Optional[str] = None) -> JSONRe
         return service.to_geojson(bbox_tuple)
 
     return await run_in_threadpool(_call)
+
+
+@router.get("/lightning/clusters")
+async def lightning_clusters(request: Request, zoom: float = 4.0, bbox: Optional[str] = None) -> JSONResponse:
+    main = _load_main_module()
+
+    def _call():
+        service = main.blitzortung_service
+        if not service:
+            return {"type": "FeatureCollection", "features": [], "metadata": {"status": "disabled"}}
+
+        bbox_tuple = None
+        if bbox:
+            try:
+                parts = [float(x) for x in bbox.split(",")]
+                if len(parts) == 4:
+                    bbox_tuple = (parts[1], parts[3], parts[0], parts[2])  # minLat, maxLat, minLon, maxLon
+            except ValueError:
+                pass
+
+        return service.to_cluster_geojson(zoom, bbox_tuple)
+
+    return JSONResponse(content=await run_in_threadpool(_call))
+
+
+@router.get("/lightning/history")
+async def lightning_history(
+    request: Request,
+    from_ts: Optional[float] = Query(default=None, alias="from"),
+    to_ts: Optional[float] = Query(default=None, alias="to"),
+    bbox: Optional[str] = None,
+    limit: int = Query(default=5000, ge=1, le=50000),
+) -> JSONResponse:
+    main = _load_main_module()
+
+    def _call():
+        service = main.blitzortung_service
+        history = getattr(service, "history", None) if service else None
+        if not history:
+            return {"type": "FeatureCollection", "features": [], "metadata": {"status": "disabled"}}
+
+        end = to_ts if to_ts is not None else time.time()
+        start = from_ts if from_ts is not None else end - service.prune_seconds
+        if start > end:
+            raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+
+        bbox_tuple = None
+        if bbox:
+            try:
+                parts = [float(x) for x in bbox.split(",")]
+                if len(parts) == 4:
+                    bbox_tuple = (parts[1], parts[3], parts[0], parts[2])  # minLat, maxLat, minLon, maxLon
+            except ValueError:
+                pass
+
+        records = history.query(start, end, bbox_tuple, limit=limit)
+        result = records_to_geojson(records)
+        result["metadata"] = {"from": start, "to": end, "count": len(records), "limit": limit}
+        return result
+
+    return JSONResponse(content=await run_in_threadpool(_call))
@@ -3,14 +3,23 @@ from __future__ import annotations
 import importlib
 import math
 import logging
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import APIRouter, HTTPException
 from fastapi.concurrency import run_in_threadpool
 
+from backend.services.proximity import ProximityIndex, coordinates
+
 router = APIRouter(prefix="/api/transport", tags=["transport"])
 logger = logging.getLogger(__name__)
 
+PLANES_LIMIT = 20
+SHIPS_LIMIT = 15
+
+# Posiciones de la última versión de cada fuente y resultados por centro/radio
+_plane_index = ProximityIndex()
+_ship_index = ProximityIndex()
+
 AIS_TYPE_MAP: Dict[int, str] = {
     60: "Pasajeros",
     70: "Carga",
@@ -39,20 +48,44 @@ def _load_main_module():
     """Lazy load main module to access services."""
     return importlib.import_module("backend.main")
 
-def _dist(lat1, lon1, lat2, lon2):
-    # Simple Euclidean distance for rough proximity sorts (degrees)
-    return math.sqrt((lat1 - lat2)**2 + (lon1 - lon2)**2)
+def _snapshot_version(snapshot: Any, count: int) -> Optional[Tuple[Any, ...]]:
+    """Identifica un snapshot de OpenSky (``None`` si no se puede: sin caché)."""
+
+    fetched_at = getattr(snapshot, "fetched_at", None)
+    if fetched_at is None:
+        return None
+    return (fetched_at, getattr(snapshot, "bbox", None), count)
+
+
+def _plane_positions(snapshot: Any, items: List[Dict[str, Any]]) -> Tuple[Any, Any]:
+    columns = getattr(snapshot, "columns", None)
+    if columns is not None and len(columns) == len(items):
+        return columns.lat, columns.lon
+    return coordinates(items)
 
 
-def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    R = 6371.0
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+def _ship_features(ais: Any) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Features de barcos y versión (ETag) del snapshot publicado."""
+
+    get_published = getattr(ais, "get_published_snapshot", None)
+    if get_published is not None:
+        published = get_published()
+        if published is None:
+            return [], None
+        return list(published.features), published.etag
+    snapshot = ais.get_snapshot()
+    return list((snapshot or {}).get("features") or []), None
+
+
+def _ship_positions(features: List[Dict[str, Any]]) -> Tuple[Any, Any]:
+    points = []
+    for feature in features:
+        coords = (feature.get("geometry") or {}).get("coordinates") if isinstance(feature, dict) else None
+        if isinstance(coords, (list, tuple)) and len(coords) == 2:
+            points.append({"lat": coords[1], "lon": coords[0]})
+        else:
+            points.append({})
+    return coordinates(points)
 
 
 def _resolve_ship_type(raw_type: Any) -> Optional[str]:
@@ -72,36 +105,31 @@ def _resolve_ship_type(raw_type: Any) -> Optional[str]:
 
     return None
 
-import requests
-from functools import lru_cache
+async def _enrich_planes(main: Any, planes: List[Dict[str, Any]]) -> None:
+    """Añade matrícula, tipo y operador desde la base local (una consulta para todos).
+
+    La consulta (stat del fichero + SQLite) se hace en el threadpool.
+    """
 
-@lru_cache(maxsize=100)
-def _resolve_plane_image(icao24: str) -> Optional[str]:
-    """Fetch plane image from Planespotters API by ICAO24 hex."""
+    database = getattr(main, "aircraft_db", None)
+    if database is None or not planes:
+        return
+    codes = [plane["icao24"] for plane in planes if plane.get("icao24")]
     try:
-        # User-Agent is required by Planespotters
-        headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"}
-        # Attempt lookup by hex (unofficial but often supported or via separate lookup)
-        # Actually Planespotters API uses Registration normally.
-        # But we can try to search? No, simple API is /reg/.
-        # OpenSky provides icao24. We don't always have REG.
-        # However, OpenSky sometimes provides CALLSIGN.
-        # Let's try to query by hex if possible or fallback.
-        # Strategy: Use icao24 to find photo on generic aggregators or just return None if strict.
-        # But user wants a photo.
-        # Let's try: https://api.planespotters.net/pub/photos/hex/{icao24} -> This works on some versions?
-        # Let's verify URL: https://api.planespotters.net/pub/photos/hex/<hex> IS VALID.
-        url = f"https://api.planespotters.net/pub/photos/hex/{icao24}"
-        resp = requests.get(url, headers=headers, timeout=2)
-        if resp.status_code == 200:
-            data = resp.json()
-            photos = data.get("photos", [])
-            if photos:
-                # Prefer "thumbnail_large" which is decent quality but not full resolution
-                return photos[0].get("thumbnail_large", {}).get("src")
-    except Exception:
-        pass
-    return None
+        metadata = await run_in_threadpool(database.lookup_many, codes)
+    except Exception as exc:  # noqa: BLE001 - la base es opcional
+        logger.warning("transport.nearby aircraft metadata lookup failed: %s", exc)
+        return
+    for plane in planes:
+        info = metadata.get(plane.get("icao24") or "")
+        if not info:
+            continue
+        plane["registration"] = info.get("registration")
+        plane["aircraft_type"] = info.get("typecode")
+        plane["model"] = " ".join(filter(None, (info.get("manufacturer"), info.get("model")))) or None
+        plane["operator"] = info.get("operator") or info.get("owner")
+        plane["airline"] = plane["operator"] or plane.get("airline")
+
 
 @router.get("/nearby")
 async def get_transport_nearby(
@@ -156,6 +184,7 @@ async def get_transport_nearby(
             lon + d_lon  # max_lon
         )
     
+    photos = getattr(main, "plane_photos", None)
     try:
         opensky = main.opensky_service
         
@@ -164,39 +193,36 @@ async def get_transport_nearby(
         flights_config = getattr(layers, "flights", None) if layers else None
         
         if flights_config and flights_config.enabled:
-            snapshot = opensky.get_snapshot(
+            snapshot = await opensky.get_snapshot_async(
                 config=config,
                 bbox=planes_bbox,
                 extended_override=1
             )
 
-            payload_items = []
+            source = None
             if snapshot and snapshot.payload.get("items"):
-                payload_items = snapshot.payload["items"]
+                source = snapshot
             elif hasattr(opensky, "get_last_snapshot"):
                 fallback = opensky.get_last_snapshot()
                 if fallback and fallback.payload.get("items"):
-                    payload_items = fallback.payload["items"]
-
-            for item in payload_items:
-                p = item
-                if not isinstance(p, dict):
-                    continue
-
-                p_lat = p.get("lat") or p.get("latitude")
-                p_lon = p.get("lon") or p.get("longitude")
-                if p_lat is None or p_lon is None:
-                    continue
-
-                distance_km = _haversine_km(lat, lon, p_lat, p_lon)
+                    source = fallback
+            payload_items = source.payload["items"] if source is not None else []
+
+            indices, distances = _plane_index.search(
+                _snapshot_version(source, len(payload_items)),
+                lambda: _plane_positions(source, payload_items),
+                lat,
+                lon,
+                PLANES_LIMIT,
+            )
+            for index, distance_km in zip(indices.tolist(), distances.tolist()):
+                p = payload_items[index]
+                p_lat = p.get("lat") if p.get("lat") is not None else p.get("latitude")
+                p_lon = p.get("lon") if p.get("lon") is not None else p.get("longitude")
 
                 icao = p.get("icao24")
-                img = None
-                if icao:
-                    try:
-                        img = await run_in_threadpool(_resolve_plane_image, icao)
-                    except Exception:
-                        pass
+                # Sólo caché: las que faltan se buscan en segundo plano (ver más abajo)
+                img = photos.get(icao) if photos is not None and icao else None
 
                 altitude_m = p.get("alt") or p.get("baro_altitude")
                 altitude_ft = altitude_m * 3.28084 if altitude_m is not None else None
@@ -226,6 +252,7 @@ async def get_transport_nearby(
                     "image": img,
                     "kind": "aircraft",
                 })
+            await _enrich_planes(main, planes_data)
         else:
             errors.append("flights_layer_disabled")
     except Exception as e:
@@ -247,63 +274,51 @@ async def get_transport_nearby(
         ships_config = getattr(layers, "ships", None) if layers else None
         
         if ships_config and ships_config.enabled:
-            snapshot = ais.get_snapshot()
-            if snapshot and "features" in snapshot:
-                for feature in snapshot["features"]:
-                    geo = feature.get("geometry", {})
-                    coords = geo.get("coordinates")
-                    if not coords or not isinstance(coords, (list, tuple)):
-                        continue
-
-                    if len(coords) != 2:
-                        continue
-
-                    slon, slat = coords
-
-                    valid_bbox = ships_bbox if ships_bbox and len(ships_bbox) == 4 else None
-
-                    if not valid_bbox:
-                        continue
-
-                    # Check if inside our "nearby" box
-                    if (
-                        valid_bbox[0] <= slat <= valid_bbox[1]
-                        and valid_bbox[2] <= slon <= valid_bbox[3]
-                    ):
-                        props = feature.get("properties", {}) or {}
-                        raw_type = props.get("shipType") or props.get("type")
-                        ship_type = _resolve_ship_type(raw_type)
-                        ships_data.append({
-                            "id": props.get("mmsi") or f"ship-{slat:.4f}-{slon:.4f}",
-                            "name": props.get("name") or str(props.get("mmsi") or ""),
-                            "mmsi": props.get("mmsi"),
-                            "type": ship_type or raw_type,
-                            "ship_type": ship_type or raw_type,
-                            "speed_kts": props.get("speed"),
-                            "heading_deg": props.get("heading"),
-                            "lat": slat,
-                            "lon": slon,
-                            "destination": props.get("destination"),
-                            "distance_km": _haversine_km(lat, lon, slat, slon),
-                            # Ship photos are harder to get freely by API.
-                            # Leaving img as null/undefined to trigger fallback.
-                            "img": None,
-                            "kind": "ship",
-                        })
+            features, version = _ship_features(ais)
+            indices, distances = _ship_index.search(
+                version,
+                lambda: _ship_positions(features),
+                lat,
+                lon,
+                SHIPS_LIMIT,
+                bbox=ships_bbox,
+            )
+            for index, distance_km in zip(indices.tolist(), distances.tolist()):
+                feature = features[index]
+                slon, slat = feature["geometry"]["coordinates"]
+                props = feature.get("properties", {}) or {}
+                raw_type = props.get("shipType") or props.get("type")
+                ship_type = _resolve_ship_type(raw_type)
+                ships_data.append({
+                    "id": props.get("mmsi") or f"ship-{slat:.4f}-{slon:.4f}",
+                    "name": props.get("name") or str(props.get("mmsi") or ""),
+                    "mmsi": props.get("mmsi"),
+                    "type": ship_type or raw_type,
+                    "ship_type": ship_type or raw_type,
+                    "speed_kts": props.get("speed"),
+                    "heading_deg": props.get("heading"),
+                    "lat": slat,
+                    "lon": slon,
+                    "destination": props.get("destination"),
+                    "distance_km": distance_km,
+                    # Ship photos are harder to get freely by API.
+                    # Leaving img as null/undefined to trigger fallback.
+                    "img": None,
+                    "kind": "ship",
+                })
         else:
             errors.append("ships_layer_disabled")
     except Exception as e:
         print(f"Error fetching ships: {e}")
         errors.append(f"ships_error: {e}")
 
-    # Sort by proximity to target (Vila-real)
-    # Use default 0 for None values to avoid math errors
-    try:
-        planes_data.sort(key=lambda x: _dist(lat, lon, x.get('lat') or 0, x.get('lon') or 0))
-        ships_data.sort(key=lambda x: _dist(lat, lon, x.get('lat') or 0, x.get('lon') or 0))
-    except Exception as e:
-        print(f"Error sorting transport data: {e}")
-        errors.append(f"sort_error: {e}")
+    # planes_data y ships_data ya vienen ordenados por distancia (ProximityIndex)
+    if photos is not None and planes_data:
+        # Las más cercanas primero; la respuesta no espera a Planespotters
+        try:
+            photos.warm(plane.get("icao24") for plane in planes_data)
+        except Exception as e:
+            logger.warning("transport.nearby photo warm-up failed: %s", e)
 
     logger.info(
         "transport.nearby counts ships=%d aircraft=%d (radius_km=%.1f)",
@@ -316,9 +331,9 @@ async def get_transport_nearby(
         "ok": len(errors) == 0,
         "center": {"lat": lat, "lon": lon},
         "location": {"lat": lat, "lon": lon},
-        "planes": planes_data[:20],
-        "aircraft": planes_data[:20],
-        "ships": ships_data[:15],
+        "planes": planes_data,
+        "aircraft": planes_data,
+        "ships": ships_data,
     }
     
     if errors:
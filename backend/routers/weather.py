@@ -65,6 +65,21 @@ def get_lightning_strikes(min_lat: float = None, max_lat: float = None, min_lon:
         }
 
 
+@router.get("/storm/proximity")
+def get_storm_proximity() -> Dict[str, Any]:
+    """
+    Distancia a la tormenta más cercana y velocidad de aproximación a la ubicación configurada.
+    """
+    main = _load_main_module()
+    tracker = getattr(main, "storm_tracker", None)
+    if tracker is None:
+        return {"active": False, "status": "disabled"}
+    # La ubicación puede haber cambiado en la configuración desde el arranque
+    lat, lon = resolve_weather_location(config_manager.read(), None, None)
+    tracker.set_location(lat, lon)
+    return tracker.snapshot()
+
+
 
 def resolve_weather_location(config: AppConfig, lat: float | None, lon: float | None) -> Tuple[float, float]:
     """Resuelve coordenadas para servicios de clima con múltiples fuentes."""
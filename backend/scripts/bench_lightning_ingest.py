@@ -0,0 +1,104 @@
+"""Benchmark de la ingesta de rayos: ruta por mensaje vs micro-lotes.
+
+Reproduce un fichero grabado con un mensaje por línea (payload JSON tal cual
+llega por MQTT, opcionalmente precedido de ``tópico<TAB>``) y mide el tiempo
+de la ruta clásica (``json.loads`` + ``_process_lightning_data`` por mensaje)
+frente a la cola de micro-lotes.
+
+Uso:
+    python -m backend.scripts.bench_lightning_ingest mensajes.txt
+    python -m backend.scripts.bench_lightning_ingest --generate 20000 mensajes.txt
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from backend.services.blitzortung_service import BlitzortungService, LightningStrike
+from backend.services.lightning_ingest import LightningIngestQueue, orjson
+
+
+def generate(path: Path, count: int) -> None:
+    now = time.time()
+    with path.open("w", encoding="utf-8") as handle:
+        for i in range(count):
+            payload = {
+                "time": now - random.random() * 600,
+                "lat": 36.0 + random.random() * 8.0,
+                "lon": -10.0 + random.random() * 15.0,
+                "alt": 0,
+                "pol": random.choice([-1, 1]),
+                "mds": random.randint(1000, 15000),
+                "sig": [{"sta": random.randint(1, 3000), "time": random.randint(1, 99999)} for _ in range(6)],
+            }
+            handle.write(f"blitzortung/1.1/{i % 4}\t{json.dumps(payload)}\n")
+
+
+def load(path: Path) -> List[Tuple[str, bytes]]:
+    messages = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        topic, sep, payload = line.partition("\t")
+        if not sep:
+            topic, payload = "blitzortung/1", line
+        messages.append((f"mqtt:{topic}", payload.encode("utf-8")))
+    return messages
+
+
+def _new_service() -> BlitzortungService:
+    # buffer grande para que la poda no domine la medida
+    return BlitzortungService(enabled=True, buffer_max=1_000_000, prune_seconds=86400)
+
+
+def bench_per_message(messages: List[Tuple[str, bytes]]) -> Tuple[float, int]:
+    service = _new_service()
+    start = time.perf_counter()
+    for source, payload in messages:
+        data = json.loads(payload.decode("utf-8"))
+        service._process_lightning_data(data, source=source)
+    return time.perf_counter() - start, len(service.get_all_strikes())
+
+
+def bench_batched(messages: List[Tuple[str, bytes]], batch_size: int) -> Tuple[float, int]:
+    service = _new_service()
+    queue = LightningIngestQueue(service._ingest_batch, LightningStrike)
+    start = time.perf_counter()
+    for i, (source, payload) in enumerate(messages, 1):
+        queue.submit(source, payload)
+        if i % batch_size == 0:
+            queue.flush()
+    queue.flush()
+    return time.perf_counter() - start, len(service.get_all_strikes())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", type=Path, help="Fichero de mensajes grabados")
+    parser.add_argument("--generate", type=int, default=0, help="Genera N mensajes sintéticos en el fichero")
+    parser.add_argument("--batch-size", type=int, default=50, help="Mensajes por micro-lote simulado")
+    args = parser.parse_args()
+
+    if args.generate:
+        generate(args.file, args.generate)
+        print(f"Generated {args.generate} messages in {args.file}")
+
+    messages = load(args.file)
+    print(f"Replaying {len(messages)} messages (json backend: {'orjson' if orjson else 'json'})")
+
+    legacy_s, legacy_n = bench_per_message(messages)
+    batched_s, batched_n = bench_batched(messages, args.batch_size)
+    for label, seconds, stored in (("per-message", legacy_s, legacy_n), ("micro-batch", batched_s, batched_n)):
+        rate = len(messages) / seconds if seconds else float("inf")
+        print(f"{label:>12}: {seconds * 1000:8.1f} ms  {rate:10.0f} msg/s  stored={stored}")
+    if batched_s:
+        print(f"speedup: x{legacy_s / batched_s:.2f}")
+
+
+if __name__ == "__main__":
+    main()
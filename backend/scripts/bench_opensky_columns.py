@@ -0,0 +1,187 @@
+"""OpenSky ``/states/all``: saneado fila a fila vs ``StateColumns``.
+
+Compara, sobre un payload de estados (por defecto 10 000 aeronaves simuladas;
+con ``--payload`` uno grabado de ``/states/all``), el camino antiguo (un dict
+por aeronave y una feature GeoJSON que lo envuelve) con el columnar (arrays
+numpy y features generadas desde las columnas), incluida la estima.
+
+Uso:
+    python -m backend.scripts.bench_opensky_columns --states 10000
+    python -m backend.scripts.bench_opensky_columns --payload states.json
+    python -m backend.scripts.bench_opensky_columns --save states.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List
+
+import numpy as np
+
+from backend.services.dead_reckoning import extrapolate, extrapolate_items
+from backend.services.opensky_columns import StateColumns, features_from_columns
+
+DR_SECONDS = 30
+
+
+def _payload(count: int) -> Dict[str, Any]:
+    rng = random.Random(42)
+    now = int(time.time())
+    states = []
+    for i in range(count):
+        on_ground = rng.random() < 0.1
+        state = [
+            f"{0x340000 + i:06x}",
+            f"IBE{i:04d}  " if rng.random() < 0.9 else None,
+            rng.choice(["Spain", "France", "Portugal", "Germany"]),
+            now - rng.randint(0, 20),
+            now - rng.randint(0, 10),
+            None if rng.random() < 0.01 else rng.uniform(-180.0, 180.0),
+            None if rng.random() < 0.01 else rng.uniform(-80.0, 80.0),
+            None if on_ground else rng.uniform(300.0, 12000.0),
+            on_ground,
+            rng.uniform(0.0, 280.0),
+            rng.uniform(0.0, 360.0),
+            rng.uniform(-15.0, 15.0),
+            None,
+            None if on_ground else rng.uniform(300.0, 12000.0),
+            f"{rng.randint(0, 7777):04d}",
+            False,
+            0,
+        ]
+        if rng.random() < 0.5:
+            state.append(rng.randint(0, 7))
+        states.append(state)
+    return {"time": now, "states": states}
+
+
+def legacy_sanitize(payload: Dict[str, Any], max_aircraft: int) -> List[Dict[str, Any]]:
+    """Copia del ``OpenSkyClient.sanitize_states`` anterior."""
+
+    ts = int(payload.get("time", int(time.time())))
+    states = payload.get("states")
+    if not isinstance(states, Iterable):
+        return []
+    items: List[Dict[str, Any]] = []
+    for entry in states:
+        if not isinstance(entry, list) or len(entry) < 17:
+            continue
+        icao24 = (entry[0] or "").strip().lower()
+        callsign = (entry[1] or "").strip()
+        origin_country = (entry[2] or "").strip()
+        longitude = entry[5]
+        latitude = entry[6]
+        baro_altitude = entry[7]
+        velocity = entry[9]
+        true_track = entry[10]
+        vertical_rate = entry[11]
+        geo_altitude = entry[13] if len(entry) > 13 else None
+        if latitude is None or longitude is None:
+            continue
+        if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+            continue
+        altitude = geo_altitude if geo_altitude is not None else baro_altitude
+        items.append({
+            "id": icao24 or callsign or f"unknown-{len(items)}",
+            "icao24": icao24 or None,
+            "callsign": callsign or None,
+            "origin_country": origin_country or None,
+            "lon": float(longitude),
+            "lat": float(latitude),
+            "alt": float(altitude) if altitude is not None else None,
+            "velocity": float(velocity) if velocity is not None else None,
+            "vertical_rate": float(vertical_rate) if vertical_rate is not None else None,
+            "track": float(true_track) if true_track is not None else None,
+            "on_ground": bool(entry[8]) if entry[8] is not None else False,
+            "squawk": entry[14] if len(entry) > 14 else None,
+            "category": entry[17] if len(entry) > 17 else None,
+            "last_contact": int(entry[4] or entry[3] or ts),
+        })
+    if max_aircraft > 0 and len(items) > max_aircraft:
+        items = items[:max_aircraft]
+    return items
+
+
+def legacy_geojson(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    columns = [
+        {
+            "lat": item["lat"],
+            "lon": item["lon"],
+            "velocity": None if item["on_ground"] else item["velocity"],
+            "track": item["track"],
+            "last_contact": item["last_contact"],
+        }
+        for item in items
+    ]
+    lat, lon, applied = extrapolate_items(columns, time.time(), DR_SECONDS)
+    features = []
+    for index, item in enumerate(items):
+        properties = item
+        if applied[index] > 0:
+            properties = dict(item, dr_seconds=int(applied[index]))
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [float(lon[index]), float(lat[index])]},
+            "properties": properties,
+        })
+    return features
+
+
+def columnar_geojson(columns: StateColumns, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    velocity = np.where(columns.on_ground, np.nan, columns.velocity)
+    estimated = extrapolate(
+        columns.lat, columns.lon, velocity, columns.track, time.time() - columns.last_contact, DR_SECONDS
+    )
+    return features_from_columns(columns, items, *estimated)
+
+
+def timed(function: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--states", type=int, default=10000, help="Número de aeronaves simuladas")
+    parser.add_argument("--payload", type=Path, help="JSON grabado de /states/all")
+    parser.add_argument("--save", type=Path, help="Guarda el payload simulado en este fichero")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.payload:
+        payload = json.loads(args.payload.read_text(encoding="utf-8"))
+    else:
+        payload = _payload(args.states)
+        if args.save:
+            args.save.write_text(json.dumps(payload), encoding="utf-8")
+
+    legacy_items = legacy_sanitize(payload, 0)
+    columns = StateColumns.from_payload(payload, 0)
+    columnar_items = columns.to_items()
+    assert legacy_items == columnar_items, "los dos caminos deben devolver los mismos items"
+
+    # "sanitize" ocurre una vez por sondeo (en el poller); "serve" en cada petición
+    print(f"states: {len(payload.get('states') or [])}  valid: {len(legacy_items)}")
+    rows = (
+        ("sanitize legacy", timed(lambda: legacy_sanitize(payload, 0), args.repeat)),
+        ("sanitize columnar", timed(lambda: StateColumns.from_payload(payload, 0).to_items(), args.repeat)),
+        ("columns only", timed(lambda: StateColumns.from_payload(payload, 0), args.repeat)),
+        ("serve legacy", timed(lambda: legacy_geojson(legacy_items), args.repeat)),
+        ("serve columnar", timed(lambda: columnar_geojson(columns, columnar_items), args.repeat)),
+    )
+    for label, seconds in rows:
+        print(f"{label:>18}: {seconds * 1000:8.1f} ms")
+    print(f"sanitize speedup: x{rows[0][1] / rows[1][1]:.2f}")
+    print(f"   serve speedup: x{rows[3][1] / rows[4][1]:.2f}")
+
+
+if __name__ == "__main__":
+    main()
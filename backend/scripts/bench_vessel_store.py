@@ -0,0 +1,98 @@
+"""Memoria del buffer de barcos AIS: dict GeoJSON por MMSI vs ``VesselStore``.
+
+Mide con ``tracemalloc`` lo que ocupa el formato antiguo (una feature GeoJSON
+completa más ``received_at`` por barco) frente a los registros con
+``__slots__`` del ``VesselStore``.
+
+Uso:
+    python -m backend.scripts.bench_vessel_store --vessels 10000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from backend.services.vessel_store import VesselRecord, VesselStore
+
+SHIP_TYPES = ["Cargo", "Tanker", "Passenger", "Fishing", "Pleasure Craft", "Tug"]
+
+
+def _samples(count: int) -> List[Tuple[str, float, float, float, float, float, str, str]]:
+    rng = random.Random(42)
+    return [
+        (
+            str(224000000 + i),
+            36.0 + rng.random() * 8.0,
+            -10.0 + rng.random() * 15.0,
+            round(rng.random() * 25.0, 1),
+            round(rng.random() * 360.0, 1),
+            float(rng.randint(0, 359)),
+            f"VESSEL {i:05d}",
+            rng.choice(SHIP_TYPES),
+        )
+        for i in range(count)
+    ]
+
+
+def build_legacy(samples: List[Tuple[Any, ...]]) -> Dict[str, Dict[str, Any]]:
+    now = time.time()
+    vessels: Dict[str, Dict[str, Any]] = {}
+    for mmsi, lat, lon, sog, cog, heading, name, ship_type in samples:
+        feature = {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            "properties": {
+                "mmsi": mmsi,
+                "speed": sog,
+                "course": cog,
+                "heading": heading,
+                "source": "aisstream",
+                "timestamp": int(now),
+                "name": name,
+                "shipType": ship_type,
+            },
+        }
+        vessels[mmsi] = {"feature": feature, "received_at": now}
+    return vessels
+
+
+def build_store(samples: List[Tuple[Any, ...]]) -> VesselStore:
+    now = time.time()
+    store = VesselStore(capacity=len(samples))
+    for mmsi, lat, lon, sog, cog, heading, name, ship_type in samples:
+        store.upsert(VesselRecord(mmsi, lat, lon, sog, cog, heading, now, name, ship_type))
+    return store
+
+
+def measure(builder: Callable[[List[Tuple[Any, ...]]], Any], samples: List[Tuple[Any, ...]]) -> int:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = builder(samples)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del result
+    return size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vessels", type=int, default=10000, help="Número de barcos simulados")
+    args = parser.parse_args()
+
+    samples = _samples(args.vessels)
+    legacy = measure(build_legacy, samples)
+    compact = measure(build_store, samples)
+    print(f"vessels: {args.vessels}")
+    for label, size in (("legacy dict", legacy), ("VesselStore", compact)):
+        print(f"{label:>12}: {size / 1024:10.1f} KiB  {size / max(1, args.vessels):7.0f} B/vessel")
+    if compact:
+        print(f"reduction: x{legacy / compact:.2f}")
+
+
+if __name__ == "__main__":
+    main()
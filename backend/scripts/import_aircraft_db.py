@@ -0,0 +1,35 @@
+"""Importa una base pública de aeronaves a la base local por icao24.
+
+Acepta el ``aircraftDatabase.csv`` de OpenSky
+(https://opensky-network.org/datasets/metadata/) y CSV con cabeceras
+equivalentes (``hex``/``reg``/``icaotype``...). La base anterior se sustituye
+de forma atómica; el backend la recoge sin reiniciar.
+
+Uso:
+    python -m backend.scripts.import_aircraft_db aircraftDatabase.csv
+    python -m backend.scripts.import_aircraft_db aircraftDatabase.csv --db /tmp/aircraft.sqlite3
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+
+from backend.services.aircraft_db import AircraftDatabase
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv", type=Path, help="CSV de aeronaves")
+    parser.add_argument("--db", type=Path, help="Ruta de la base SQLite (por defecto la del estado de la app)")
+    args = parser.parse_args()
+
+    database = AircraftDatabase(args.db)
+    started = time.perf_counter()
+    count = database.import_csv(args.csv)
+    print(f"{count} aeronaves importadas en {database.path} ({time.perf_counter() - started:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
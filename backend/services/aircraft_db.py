@@ -0,0 +1,271 @@
+"""Base de datos local de aeronaves (matrícula, tipo, operador) por icao24.
+
+OpenSky sólo da ``callsign`` y ``origin_country``; el resto se obtiene de una
+base pública importada una vez (p. ej. ``aircraftDatabase.csv`` de OpenSky) a
+un SQLite indexado por icao24. Las consultas son locales y en bloque (un
+``SELECT ... IN`` por snapshot), así que enriquecer no cuesta nada en la
+petición y funciona sin conexión. Si la base no se ha importado, las
+consultas devuelven vacío.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("registration", "typecode", "model", "manufacturer", "operator", "operator_icao", "owner")
+
+# Cabeceras aceptadas por campo (OpenSky, ADS-B Exchange / Mictronics y variantes)
+COLUMN_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "icao24": ("icao24", "hex", "icao", "modes", "mode_s"),
+    "registration": ("registration", "reg", "r"),
+    "typecode": ("typecode", "icaotype", "icao_type", "type_code", "t"),
+    "model": ("model", "type", "desc"),
+    "manufacturer": ("manufacturername", "manufacturer", "manufacturericao"),
+    "operator": ("operator", "operatorname", "airline"),
+    "operator_icao": ("operatoricao", "operator_icao", "airline_icao"),
+    "owner": ("owner", "ownop"),
+}
+
+# Límite de parámetros por consulta de SQLite (999 en versiones antiguas)
+_IN_CHUNK = 900
+_MEMO_CAPACITY = 5000
+_IMPORT_BATCH = 5000
+
+
+def default_db_path() -> Path:
+    state_path = Path(os.getenv("PANTALLA_STATE_DIR", "/var/lib/pantalla-reloj"))
+    return Path(os.getenv("PANTALLA_AIRCRAFT_DB", state_path / "aircraft.sqlite3"))
+
+
+def _normalize_header(name: str) -> str:
+    return name.strip().strip("'\"").strip().lower()
+
+
+def _clean(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    cleaned = value.strip().strip("'\"").strip()
+    return cleaned or None
+
+
+def _column_map(header: List[str]) -> Dict[str, int]:
+    normalized = [_normalize_header(name) for name in header]
+    mapping: Dict[str, int] = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in normalized:
+                mapping[field] = normalized.index(alias)
+                break
+    if "icao24" not in mapping:
+        raise ValueError(f"CSV sin columna icao24 (cabecera: {header[:8]})")
+    return mapping
+
+
+def iter_csv_rows(handle: io.TextIOBase) -> Iterator[Tuple[Optional[str], ...]]:
+    """Filas ``(icao24, *FIELDS)`` de un CSV de aeronaves."""
+
+    sample = handle.read(4096)
+    handle.seek(0)
+    # El CSV de OpenSky usa comillas simples
+    quotechar = "'" if sample.lstrip().startswith("'") else '"'
+    reader = csv.reader(handle, quotechar=quotechar)
+    try:
+        header = next(reader)
+    except StopIteration:
+        return
+    mapping = _column_map(header)
+    width = max(mapping.values()) + 1
+    for row in reader:
+        if len(row) < width:
+            row = row + [""] * (width - len(row))
+        icao24 = _clean(row[mapping["icao24"]])
+        if not icao24 or len(icao24) != 6:
+            continue
+        yield (icao24.lower(),) + tuple(
+            _clean(row[mapping[field]]) if field in mapping else None for field in FIELDS
+        )
+
+
+class AircraftDatabase:
+    """Índice SQLite de aeronaves por icao24 con consultas en bloque."""
+
+    def __init__(self, path: Optional[Path] = None, memo_capacity: int = _MEMO_CAPACITY) -> None:
+        self.path = Path(path) if path else default_db_path()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_mtime: Optional[float] = None
+        # Resultados recientes (también los "no encontrado", como None)
+        self._memo: "OrderedDict[str, Optional[Dict[str, Any]]]" = OrderedDict()
+        self._memo_capacity = max(0, int(memo_capacity))
+        self.lookups = 0
+        self.memo_hits = 0
+
+    # ------------------------------------------------------------------
+    # Importación
+    # ------------------------------------------------------------------
+    def import_csv(self, csv_path: Path, source: Optional[str] = None) -> int:
+        """Importa un CSV a una base nueva y la sustituye de forma atómica."""
+
+        csv_path = Path(csv_path)
+        with csv_path.open("r", encoding="utf-8", errors="replace", newline="") as handle:
+            return self.import_rows(iter_csv_rows(handle), source=source or csv_path.name)
+
+    def import_rows(self, rows: Iterable[Tuple[Optional[str], ...]], source: str = "") -> int:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        if tmp_path.exists():
+            tmp_path.unlink()
+        conn = sqlite3.connect(tmp_path)
+        count = 0
+        try:
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE aircraft (icao24 TEXT PRIMARY KEY, "
+                + ", ".join(f"{field} TEXT" for field in FIELDS)
+                + ") WITHOUT ROWID"
+            )
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            insert = (
+                f"INSERT OR REPLACE INTO aircraft (icao24, {', '.join(FIELDS)}) "
+                f"VALUES ({', '.join('?' * (len(FIELDS) + 1))})"
+            )
+            batch: List[Tuple[Optional[str], ...]] = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= _IMPORT_BATCH:
+                    conn.executemany(insert, batch)
+                    count += len(batch)
+                    batch.clear()
+            if batch:
+                conn.executemany(insert, batch)
+                count += len(batch)
+            conn.executemany(
+                "INSERT INTO meta (key, value) VALUES (?, ?)",
+                [("source", source), ("imported_at", str(int(time.time()))), ("rows", str(count))],
+            )
+            conn.commit()
+        except Exception:
+            conn.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+        conn.close()
+        with self._lock:
+            self._close_locked()
+            os.replace(tmp_path, self.path)
+            self._memo.clear()
+        logger.info("[aircraft_db] imported %d aircraft from %s into %s", count, source, self.path)
+        return count
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    def _connection_locked(self) -> Optional[sqlite3.Connection]:
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            self._close_locked()
+            return None
+        if self._conn is None or mtime != self._conn_mtime:
+            # Base nueva (importada por otro proceso): se reabre
+            self._close_locked()
+            self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn_mtime = mtime
+            self._memo.clear()
+        return self._conn
+
+    def _close_locked(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = None
+        self._conn_mtime = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_locked()
+
+    @property
+    def available(self) -> bool:
+        return self.path.exists()
+
+    def lookup(self, icao24: str) -> Optional[Dict[str, Any]]:
+        return self.lookup_many([icao24]).get(icao24.strip().lower())
+
+    def lookup_many(self, icao24s: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Metadatos de varias aeronaves en una pasada (sólo las encontradas)."""
+
+        wanted = {code.strip().lower() for code in icao24s if code}
+        result: Dict[str, Dict[str, Any]] = {}
+        if not wanted:
+            return result
+        with self._lock:
+            conn = self._connection_locked()
+            if conn is None:
+                return result
+            self.lookups += len(wanted)
+            missing = []
+            for code in wanted:
+                if code in self._memo:
+                    self._memo.move_to_end(code)
+                    self.memo_hits += 1
+                    cached = self._memo[code]
+                    if cached is not None:
+                        result[code] = cached
+                else:
+                    missing.append(code)
+            found: Dict[str, Dict[str, Any]] = {}
+            for start in range(0, len(missing), _IN_CHUNK):
+                chunk = missing[start:start + _IN_CHUNK]
+                query = f"SELECT * FROM aircraft WHERE icao24 IN ({', '.join('?' * len(chunk))})"
+                for row in conn.execute(query, chunk):
+                    found[row["icao24"]] = {field: row[field] for field in FIELDS if row[field]}
+            for code in missing:
+                self._remember_locked(code, found.get(code))
+            result.update(found)
+        return result
+
+    def _remember_locked(self, code: str, value: Optional[Dict[str, Any]]) -> None:
+        if not self._memo_capacity:
+            return
+        self._memo[code] = value
+        while len(self._memo) > self._memo_capacity:
+            self._memo.popitem(last=False)
+
+    def enrich(self, items: List[Mapping[str, Any]]) -> List[Dict[str, Any]]:
+        """Copias de ``items`` con los metadatos de cada icao24 (los originales no se tocan)."""
+
+        metadata = self.lookup_many(item.get("icao24") for item in items if item.get("icao24"))
+        if not metadata:
+            return [dict(item) for item in items]
+        return [dict(item, **metadata.get(item.get("icao24") or "", {})) for item in items]
+
+    def describe(self) -> Dict[str, Any]:
+        info: Dict[str, Any] = {
+            "path": str(self.path),
+            "available": self.available,
+            "lookups": self.lookups,
+            "memo_hits": self.memo_hits,
+        }
+        with self._lock:
+            conn = self._connection_locked()
+            if conn is not None:
+                try:
+                    info.update({row["key"]: row["value"] for row in conn.execute("SELECT key, value FROM meta")})
+                except sqlite3.DatabaseError as exc:
+                    info["error"] = str(exc)
+        return info
+
+
+__all__ = ["AircraftDatabase", "FIELDS", "default_db_path", "iter_csv_rows"]
@@ -0,0 +1,194 @@
+"""Datos estáticos y de viaje AIS (``ShipStaticData`` / ``StaticDataReport``).
+
+Estos mensajes llegan con poca frecuencia y cambian todavía menos, así que se
+guardan aparte de las posiciones: una LRU acotada por MMSI que se persiste en
+JSON en el directorio de caché y se une a las features al serializar.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+STATIC_MESSAGE_TYPES = ("ShipStaticData", "StaticDataReport")
+DEFAULT_STATIC_CAPACITY = 20000
+
+
+def _clean_text(value: Any) -> Optional[str]:
+    if not isinstance(value, str):
+        return None
+    # AIS rellena los campos de texto con '@' y espacios
+    cleaned = value.replace("@", " ").strip()
+    return cleaned or None
+
+
+def _positive_int(value: Any) -> Optional[int]:
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number > 0 else None
+
+
+def _dimensions(dimension: Any) -> Dict[str, Any]:
+    if not isinstance(dimension, dict):
+        return {}
+    result: Dict[str, Any] = {}
+    a, b = _positive_int(dimension.get("A")) or 0, _positive_int(dimension.get("B")) or 0
+    c, d = _positive_int(dimension.get("C")) or 0, _positive_int(dimension.get("D")) or 0
+    if a + b:
+        result["length_m"] = a + b
+    if c + d:
+        result["width_m"] = c + d
+    return result
+
+
+def _eta(eta: Any) -> Optional[str]:
+    if not isinstance(eta, dict):
+        return None
+    month, day = _positive_int(eta.get("Month")), _positive_int(eta.get("Day"))
+    if not month or not day or month > 12 or day > 31:
+        return None
+    hour = eta.get("Hour") if isinstance(eta.get("Hour"), int) and eta.get("Hour") < 24 else 0
+    minute = eta.get("Minute") if isinstance(eta.get("Minute"), int) and eta.get("Minute") < 60 else 0
+    return f"{month:02d}-{day:02d} {hour:02d}:{minute:02d}"
+
+
+def parse_static_message(message_type: str, body: Mapping[str, Any]) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Extrae ``(mmsi, campos)`` de un mensaje estático de AISStream."""
+
+    mmsi = _positive_int(body.get("UserID"))
+    if not mmsi:
+        return None
+
+    fields: Dict[str, Any] = {}
+    if message_type == "ShipStaticData":
+        fields["name"] = _clean_text(body.get("Name"))
+        fields["callsign"] = _clean_text(body.get("CallSign"))
+        fields["imo"] = _positive_int(body.get("ImoNumber"))
+        fields["type"] = _positive_int(body.get("Type"))
+        fields["destination"] = _clean_text(body.get("Destination"))
+        fields["eta"] = _eta(body.get("Eta"))
+        draught = body.get("MaximumStaticDraught")
+        if isinstance(draught, (int, float)) and draught > 0:
+            fields["draught_m"] = float(draught)
+        fields.update(_dimensions(body.get("Dimension")))
+    elif message_type == "StaticDataReport":
+        report_a = body.get("ReportA")
+        if isinstance(report_a, dict) and report_a.get("Valid"):
+            fields["name"] = _clean_text(report_a.get("Name"))
+        report_b = body.get("ReportB")
+        if isinstance(report_b, dict) and report_b.get("Valid"):
+            fields["callsign"] = _clean_text(report_b.get("CallSign"))
+            fields["type"] = _positive_int(report_b.get("ShipType"))
+            fields.update(_dimensions(report_b.get("Dimension")))
+    else:
+        return None
+
+    fields = {key: value for key, value in fields.items() if value is not None}
+    if not fields:
+        return None
+    return str(mmsi), fields
+
+
+class VesselStaticCache:
+    """LRU acotada de datos estáticos por MMSI, persistida en disco.
+
+    Cada entrada es un dict que se sustituye (nunca se muta) al actualizarse,
+    así que los lectores pueden usarla sin bloquear. Sólo se marca como sucia
+    cuando algún campo cambia de verdad.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        capacity: int = DEFAULT_STATIC_CAPACITY,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.path = path
+        self.capacity = max(1, int(capacity))
+        self._logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._dirty = False
+        self.updates = 0
+        self.unchanged = 0
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, mmsi: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(mmsi)
+
+    def update(self, mmsi: str, fields: Mapping[str, Any]) -> bool:
+        """Fusiona ``fields`` en la entrada; devuelve ``True`` si algo cambió."""
+
+        with self._lock:
+            current = self._entries.get(mmsi)
+            if current is not None and all(current.get(key) == value for key, value in fields.items()):
+                self._entries.move_to_end(mmsi)
+                self.unchanged += 1
+                return False
+            merged = dict(current or {})
+            merged.update(fields)
+            self._entries[mmsi] = merged
+            self._entries.move_to_end(mmsi)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+            self._dirty = True
+            self.updates += 1
+            return True
+
+    def save(self) -> bool:
+        """Escribe el fichero si hay cambios pendientes (escritura atómica)."""
+
+        if self.path is None:
+            return False
+        with self._lock:
+            if not self._dirty:
+                return False
+            data = dict(self._entries)
+            self._dirty = False
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        try:
+            tmp_path.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+        except OSError as exc:
+            self._logger.warning("Could not persist AIS static data to %s: %s", self.path, exc)
+            with self._lock:
+                self._dirty = True
+            return False
+        return True
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "updates": self.updates,
+            "unchanged": self.unchanged,
+            "path": str(self.path) if self.path else None,
+        }
+
+    def _load(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            self._logger.warning("Ignoring unreadable AIS static cache %s: %s", self.path, exc)
+            return
+        if not isinstance(data, dict):
+            return
+        # El fichero conserva el orden LRU (el más reciente al final)
+        for mmsi, fields in list(data.items())[-self.capacity:]:
+            if isinstance(fields, dict):
+                self._entries[str(mmsi)] = fields
+
+
+__all__ = ["DEFAULT_STATIC_CAPACITY", "STATIC_MESSAGE_TYPES", "VesselStaticCache", "parse_static_message"]
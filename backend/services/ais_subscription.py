@@ -0,0 +1,116 @@
+"""Suscripciones AISStream: varias cajas y estadísticas de volumen.
+
+AISStream acepta un nuevo mensaje de suscripción sobre el socket abierto, así
+que cambiar de zona no requiere reconectar. Para decidir qué cajas compensan se
+registra, por suscripción, el área cubierta y el ritmo de mensajes recibido, y
+se compara con la caja grande por defecto.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence
+
+# Formato AISStream: [[lat_min, lon_min], [lat_max, lon_max]]
+AISBox = List[List[float]]
+
+DEFAULT_BOXES: List[AISBox] = [[[36.0, -10.0], [44.0, 5.0]]]
+EARTH_RADIUS_KM = 6371.0
+HISTORY_SIZE = 8
+
+
+def box_area_km2(box: AISBox) -> float:
+    (lat1, lon1), (lat2, lon2) = box
+    lat_lo, lat_hi = sorted((lat1, lat2))
+    dlon = abs(lon2 - lon1)
+    return (
+        EARTH_RADIUS_KM ** 2
+        * abs(math.sin(math.radians(lat_hi)) - math.sin(math.radians(lat_lo)))
+        * math.radians(dlon)
+    )
+
+
+def boxes_area_km2(boxes: Sequence[AISBox]) -> float:
+    """Suma de áreas (las cajas solapadas cuentan dos veces)."""
+
+    return sum(box_area_km2(box) for box in boxes)
+
+
+def normalize_boxes(boxes: Sequence[Sequence[Sequence[float]]]) -> List[AISBox]:
+    result: List[AISBox] = []
+    for box in boxes:
+        (lat1, lon1), (lat2, lon2) = box
+        result.append(
+            [[float(min(lat1, lat2)), float(min(lon1, lon2))], [float(max(lat1, lat2)), float(max(lon1, lon2))]]
+        )
+    return result
+
+
+class SubscriptionStats:
+    """Mensajes recibidos por suscripción, con histórico corto para comparar."""
+
+    def __init__(self) -> None:
+        self.current: Optional[Dict[str, Any]] = None
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=HISTORY_SIZE)
+        self.resubscriptions = 0
+
+    def start(self, boxes: List[AISBox], now: Optional[float] = None, live: bool = False) -> None:
+        now = time.time() if now is None else now
+        self._close(now)
+        if live:
+            self.resubscriptions += 1
+        self.current = {
+            "boxes": boxes,
+            "area_km2": round(boxes_area_km2(boxes), 1),
+            "started_at": now,
+            "messages": 0,
+        }
+
+    def count(self) -> None:
+        if self.current is not None:
+            self.current["messages"] += 1
+
+    def _close(self, now: float) -> None:
+        if self.current is None:
+            return
+        entry = dict(self.current)
+        entry["ended_at"] = now
+        entry["rate_per_min"] = self._rate(entry, now)
+        self.history.append(entry)
+        self.current = None
+
+    @staticmethod
+    def _rate(entry: Dict[str, Any], now: float) -> Optional[float]:
+        elapsed = now - entry["started_at"]
+        if elapsed < 1:
+            return None
+        return round(entry["messages"] * 60.0 / elapsed, 1)
+
+    def describe(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = time.time() if now is None else now
+        default_area = boxes_area_km2(DEFAULT_BOXES)
+        result: Dict[str, Any] = {
+            "resubscriptions": self.resubscriptions,
+            "default_area_km2": round(default_area, 1),
+            "history": list(self.history),
+        }
+        current = self.current
+        if current is not None:
+            rate = self._rate(current, now)
+            result["current"] = dict(current, rate_per_min=rate)
+            result["area_vs_default"] = round(current["area_km2"] / default_area, 3) if default_area else None
+            # Ritmo medido con la caja por defecto (si se usó en esta sesión)
+            baseline = [
+                entry["rate_per_min"]
+                for entry in self.history
+                if entry["boxes"] == DEFAULT_BOXES and entry.get("rate_per_min") is not None
+            ]
+            if baseline and rate is not None:
+                result["default_rate_per_min"] = baseline[-1]
+                result["rate_vs_default"] = round(rate / baseline[-1], 3) if baseline[-1] else None
+        return result
+
+
+__all__ = ["DEFAULT_BOXES", "SubscriptionStats", "box_area_km2", "boxes_area_km2", "normalize_boxes"]
@@ -0,0 +1,140 @@
+"""Limitador por MMSI de los informes de posición AIS antes de parsearlos.
+
+En zonas con mucho tráfico (Estrecho, accesos a puertos) AISStream envía varios
+informes por barco y minuto. El limitador extrae MMSI y posición del bloque
+``MetaData`` con expresiones regulares sobre el mensaje en bruto, sin
+``json.loads``, y aplaza el informe si el barco se aplicó hace menos de
+``min_interval_seconds`` y no se ha movido más de ``min_move_meters``. De los
+aplazados sólo se guarda el último de cada barco, que ``due`` entrega cuando
+vence el intervalo: por intervalo se aplica la posición más reciente, no la
+primera. Los mensajes que no sean de posición (o que no se puedan leer así)
+pasan siempre.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+POSITION_MESSAGE_TYPES = frozenset({"PositionReport", "StandardClassBPositionReport"})
+
+_MESSAGE_TYPE_RE = re.compile(r'"MessageType"\s*:\s*"(\w+)"')
+_MMSI_RE = re.compile(r'"MMSI"\s*:\s*(\d+)')
+_LAT_RE = re.compile(r'"latitude"\s*:\s*(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)')
+_LON_RE = re.compile(r'"longitude"\s*:\s*(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)')
+
+METERS_PER_DEG = 111_320.0
+# Se purgan entradas antiguas cuando la tabla supera este tamaño
+PRUNE_THRESHOLD = 20_000
+
+
+def _peek(payload: str) -> Optional[Tuple[str, float, float]]:
+    msg_type = _MESSAGE_TYPE_RE.search(payload)
+    if msg_type is None or msg_type.group(1) not in POSITION_MESSAGE_TYPES:
+        return None
+    mmsi = _MMSI_RE.search(payload)
+    lat = _LAT_RE.search(payload)
+    lon = _LON_RE.search(payload)
+    if mmsi is None or lat is None or lon is None:
+        return None
+    return mmsi.group(1), float(lat.group(1)), float(lon.group(1))
+
+
+class AISIngestThrottle:
+    """Decide barato si un mensaje AIS merece el parseo completo."""
+
+    def __init__(self, min_interval_seconds: float = 5.0, min_move_meters: float = 50.0) -> None:
+        self.min_interval_seconds = float(min_interval_seconds)
+        self.min_move_meters = float(min_move_meters)
+        self._last: Dict[str, Tuple[float, float, float]] = {}
+        # Último informe aplazado por MMSI: (recibido, lat, lon, payload)
+        self._pending: Dict[str, Tuple[float, float, float, str]] = {}
+        self.received = 0
+        self.applied = 0
+        self.throttled = 0
+        self.deferred_applied = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.min_interval_seconds > 0
+
+    def configure(self, min_interval_seconds: float, min_move_meters: float) -> None:
+        self.min_interval_seconds = float(min_interval_seconds)
+        self.min_move_meters = float(min_move_meters)
+
+    def admit(self, payload: str, now: float) -> bool:
+        """``True`` si el mensaje debe procesarse; actualiza contadores."""
+
+        self.received += 1
+        if not self.enabled:
+            self.applied += 1
+            return True
+
+        peeked = _peek(payload)
+        if peeked is None:
+            self.applied += 1
+            return True
+
+        mmsi, lat, lon = peeked
+        last = self._last.get(mmsi)
+        if last is not None and now - last[0] < self.min_interval_seconds:
+            last_ts, last_lat, last_lon = last
+            dy = (lat - last_lat) * METERS_PER_DEG
+            dx = (lon - last_lon) * METERS_PER_DEG * math.cos(math.radians(lat))
+            if dx * dx + dy * dy < self.min_move_meters * self.min_move_meters:
+                # Sustituye al aplazado anterior: se aplicará el más reciente
+                self._pending[mmsi] = (now, lat, lon, payload)
+                self.throttled += 1
+                return False
+
+        if len(self._last) >= PRUNE_THRESHOLD and mmsi not in self._last:
+            self._prune(now)
+        self._last[mmsi] = (now, lat, lon)
+        self._pending.pop(mmsi, None)
+        self.applied += 1
+        return True
+
+    def due(self, now: float) -> List[Tuple[str, float]]:
+        """Informes aplazados cuyo intervalo ha vencido: ``[(payload, recibido)]``.
+
+        Se dan por aplicados (cuentan como ``applied``), así que el llamador
+        debe procesarlos sin volver a pasar por ``admit``.
+        """
+
+        ready: List[Tuple[str, float]] = []
+        for mmsi, (received_at, lat, lon, payload) in list(self._pending.items()):
+            last = self._last.get(mmsi)
+            if last is not None and now - last[0] < self.min_interval_seconds:
+                continue
+            del self._pending[mmsi]
+            self._last[mmsi] = (now, lat, lon)
+            self.applied += 1
+            self.deferred_applied += 1
+            ready.append((payload, received_at))
+        return ready
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self.min_interval_seconds
+        self._last = {
+            key: value for key, value in self._last.items() if value[0] >= cutoff or key in self._pending
+        }
+
+    def reset(self) -> None:
+        self._last.clear()
+        self._pending.clear()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "min_interval_seconds": self.min_interval_seconds,
+            "min_move_meters": self.min_move_meters,
+            "received": self.received,
+            "applied": self.applied,
+            "throttled": self.throttled,
+            "deferred_applied": self.deferred_applied,
+            "pending": len(self._pending),
+            "tracked": len(self._last),
+        }
+
+
+__all__ = ["AISIngestThrottle", "POSITION_MESSAGE_TYPES"]
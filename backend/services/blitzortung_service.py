@@ -1,4 +1,4 @@
-"""Servicio para conectar con Blitzortung vía MQTT o WebSocket."""
+"""Servicio para conectar con Blitzortung vía MQTT y/o WebSocket."""
 
 from __future__ import annotations
 
@@ -8,7 +8,7 @@ import threading
 import time
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 
 try:
@@ -21,6 +21,11 @@ try:
 except ImportError:
     websocket = None
 
+from .lightning_dedup import HISTORY_SOURCE, StrikeDeduplicator
+from .lightning_ingest import LightningIngestQueue
+from .lightning_clusters import LightningClusterCache, cells_to_geojson, zoom_bucket
+from .lightning_history import SEVERITY_NAMES, LightningHistoryLog
+
 logger = logging.getLogger(__name__)
 
 
@@ -62,7 +67,12 @@ class BlitzortungService:
         ws_url: Optional[str] = None,
         callback: Optional[Callable[[List[LightningStrike]], None]] = None,
         buffer_max: int = 500,
-        prune_seconds: int = 900
+        prune_seconds: int = 900,
+        history: Optional[LightningHistoryLog] = None,
+        mqtt_topics: Optional[List[str]] = None,
+        concurrent_sources: bool = False,
+        dedup_window_seconds: float = 30.0,
+        ingest_batch_ms: int = 50
     ):
         """Inicializa el servicio Blitzortung.
         
@@ -76,19 +86,36 @@ class BlitzortungService:
             callback: Función a llamar cuando se reciben nuevos rayos
             buffer_max: Máximo número de eventos en memoria
             prune_seconds: TTL de eventos en segundos (edad máxima)
+            history: Log persistente opcional donde se guardan los rayos recibidos
+            mqtt_topics: Tópicos MQTT adicionales a los que suscribirse
+            concurrent_sources: Si True, conecta MQTT y WebSocket a la vez (redundancia)
+            dedup_window_seconds: Ventana de de-duplicación entre fuentes
+            ingest_batch_ms: Intervalo de micro-lote de ingesta (0 = procesar cada mensaje al llegar)
         """
         self.enabled = enabled
         self.mqtt_host = mqtt_host
         self.mqtt_port = mqtt_port
         self.mqtt_topic = mqtt_topic
+        self.mqtt_topics: List[str] = [mqtt_topic] + [
+            topic for topic in (mqtt_topics or []) if topic and topic != mqtt_topic
+        ]
+        self.concurrent_sources = concurrent_sources
         self.ws_enabled = ws_enabled
         self.ws_url = ws_url
         self.callback = callback
         self.buffer_max = buffer_max
         self.prune_seconds = prune_seconds
+        self.history = history
         
         self.strikes: List[LightningStrike] = []
         self.strikes_lock = threading.Lock()
+        # Se incrementa en cada mutación del buffer (invalida cachés derivadas)
+        self.version = 0
+        self._clusters = LightningClusterCache()
+        # Protegido por strikes_lock
+        self._dedup = StrikeDeduplicator(window_seconds=dedup_window_seconds)
+        self.ingest_batch_ms = ingest_batch_ms
+        self._ingest_queue: Optional[LightningIngestQueue] = None
         
         self.mqtt_client: Optional[Any] = None
         self.ws_client: Optional[Any] = None
@@ -113,24 +140,38 @@ class BlitzortungService:
             logger.warning("[Blitzortung] Service already running")
             return False
         
+        self._replay_history()
+        
+        if self.ingest_batch_ms > 0:
+            self._ingest_queue = LightningIngestQueue(
+                self._ingest_batch, LightningStrike, interval_ms=self.ingest_batch_ms
+            )
+            self._ingest_queue.start()
+        
+        started = False
+        
         # Try to start MQTT if configured
-        if mqtt and not self.ws_enabled:
+        if mqtt and (not self.ws_enabled or self.concurrent_sources):
             if self._start_mqtt():
-                self.running = True
-                self._start_cleanup_thread()
-                return True
+                started = True
             else:
                 logger.warning("[Blitzortung] MQTT connection failed")
         
-        # Try to start WebSocket if configured
-        if websocket and (self.ws_enabled or self.ws_url):
+        # Try to start WebSocket if configured (también en paralelo a MQTT si hay redundancia)
+        if websocket and (self.ws_enabled or self.ws_url) and (not started or self.concurrent_sources):
              if self._start_websocket():
-                 self.running = True
-                 self._start_cleanup_thread()
-                 return True
+                 started = True
              else:
                  logger.warning("[Blitzortung] WebSocket connection failed")
         
+        if started:
+            self.running = True
+            self._start_cleanup_thread()
+            return True
+        
+        if self._ingest_queue:
+            self._ingest_queue.stop()
+            self._ingest_queue = None
         logger.warning("[Blitzortung] Failed to start: No valid connection established")
         return False
     
@@ -156,6 +197,13 @@ class BlitzortungService:
                 logger.error("[Blitzortung] Error stopping WebSocket client: %s", exc)
             self.ws_client = None
         
+        if self._ingest_queue:
+            self._ingest_queue.stop()
+            self._ingest_queue = None
+        
+        if self.history:
+            self.history.close()
+        
         logger.info("[Blitzortung] Service stopped")
     
     def _start_mqtt(self) -> bool:
@@ -221,16 +269,21 @@ class BlitzortungService:
         """Callback cuando se conecta MQTT."""
         if rc == 0:
             logger.info("[Blitzortung] Connected to MQTT broker")
-            client.subscribe(self.mqtt_topic)
+            for topic in self.mqtt_topics:
+                client.subscribe(topic)
         else:
             logger.error("[Blitzortung] Failed to connect to MQTT broker, return code: %d", rc)
     
     def _on_mqtt_message(self, client: Any, userdata: Any, msg: Any) -> None:
         """Callback cuando llega un mensaje MQTT."""
+        queue = self._ingest_queue
+        if queue:
+            queue.submit(f"mqtt:{msg.topic}", msg.payload)
+            return
         try:
             payload = msg.payload.decode("utf-8")
             data = json.loads(payload)
-            self._process_lightning_data(data)
+            self._process_lightning_data(data, source=f"mqtt:{msg.topic}")
         except Exception as exc:
             logger.error("[Blitzortung] Failed to process MQTT message: %s", exc)
     
@@ -244,9 +297,13 @@ class BlitzortungService:
     
     def _on_ws_message(self, ws: Any, message: str) -> None:
         """Callback cuando llega un mensaje WebSocket."""
+        queue = self._ingest_queue
+        if queue:
+            queue.submit("ws", message)
+            return
         try:
             data = json.loads(message)
-            self._process_lightning_data(data)
+            self._process_lightning_data(data, source="ws")
         except Exception as exc:
             logger.error("[Blitzortung] Failed to process WebSocket message: %s", exc)
     
@@ -258,11 +315,12 @@ class BlitzortungService:
         """Callback cuando se cierra WebSocket."""
         logger.warning("[Blitzortung] WebSocket connection closed: %d - %s", close_status_code, close_msg)
     
-    def _process_lightning_data(self, data: Dict[str, Any]) -> None:
+    def _process_lightning_data(self, data: Dict[str, Any], source: str = "default") -> None:
         """Procesa datos de rayos recibidos.
         
         Args:
             data: Datos de rayos (formato puede variar según proveedor)
+            source: Identificador de la fuente (para de-duplicación y contadores)
         """
         # Formato esperado de Blitzortung (puede variar):
         # {"time": timestamp, "lat": lat, "lon": lon}
@@ -282,22 +340,30 @@ class BlitzortungService:
             if strike:
                 strikes_to_add.append(strike)
         
-        if strikes_to_add:
-            with self.strikes_lock:
-                # Añadir nuevos rayos
-                self.strikes.extend(strikes_to_add)
-                # Limpiar rayos antiguos y mantener buffer_max
-                self._cleanup_old_strikes()
-                # Limitar tamaño del buffer
-                if len(self.strikes) > self.buffer_max:
-                    # Ordenar por timestamp (más recientes primero) y mantener solo los más recientes
-                    self.strikes.sort(key=lambda s: s.timestamp, reverse=True)
-                    self.strikes = self.strikes[:self.buffer_max]
+        self._ingest_batch([(source, strikes_to_add)])
+    
+    def _ingest_batch(self, batch: List[Tuple[str, List[LightningStrike]]]) -> None:
+        """Añade un lote de rayos de una o varias fuentes tomando el lock una sola vez.
+        
+        Args:
+            batch: Lista de (fuente, rayos) ya parseados
+        """
+        accepted: List[LightningStrike] = []
+        with self.strikes_lock:
+            for source, strikes in batch:
+                # Descarta rayos ya recibidos por otra fuente
+                accepted.extend(self._dedup.filter(source, strikes))
+            if accepted:
+                self._add_strikes_locked(accepted)
+        
+        if accepted:
+            if self.history:
+                self.history.append(accepted)
             
             # Llamar callback si existe
             if self.callback:
                 try:
-                    self.callback(strikes_to_add)
+                    self.callback(accepted)
                 except Exception as exc:
                     logger.error("[Blitzortung] Callback error: %s", exc)
     
@@ -333,6 +399,49 @@ class BlitzortungService:
             logger.debug("[Blitzortung] Failed to parse lightning strike: %s", exc)
             return None
     
+    def _replay_history(self) -> None:
+        """Recarga en el buffer los últimos prune_seconds del histórico persistente."""
+        if not self.history:
+            return
+        try:
+            records = self.history.load_recent(self.prune_seconds)
+        except Exception as exc:
+            logger.error("[Blitzortung] Failed to replay lightning history: %s", exc)
+            return
+        if not len(records):
+            return
+        strikes = [
+            LightningStrike(timestamp=ts, lat=lat, lon=lon, severity=SEVERITY_NAMES.get(sev))
+            for ts, lat, lon, sev in zip(
+                records["ts"].tolist(),
+                records["lat"].tolist(),
+                records["lon"].tolist(),
+                records["severity"].tolist(),
+            )
+        ]
+        with self.strikes_lock:
+            # Siembra el de-duplicador: las fuentes en vivo pueden reenviar estos rayos
+            self._dedup.filter(HISTORY_SOURCE, strikes)
+            self._add_strikes_locked(strikes)
+        logger.info("[Blitzortung] Replayed %d strikes from history", len(strikes))
+        if self.callback:
+            try:
+                self.callback(strikes)
+            except Exception as exc:
+                logger.error("[Blitzortung] Callback error: %s", exc)
+    
+    def _add_strikes_locked(self, strikes: List[LightningStrike]) -> None:
+        """Añade rayos al buffer aplicando TTL y buffer_max (requiere strikes_lock)."""
+        self.strikes.extend(strikes)
+        self.version += 1
+        # Limpiar rayos antiguos y mantener buffer_max
+        self._cleanup_old_strikes()
+        # Limitar tamaño del buffer
+        if len(self.strikes) > self.buffer_max:
+            # Ordenar por timestamp (más recientes primero) y mantener solo los más recientes
+            self.strikes.sort(key=lambda s: s.timestamp, reverse=True)
+            self.strikes = self.strikes[:self.buffer_max]
+
     def _cleanup_old_strikes(self) -> None:
         """Elimina rayos antiguos de la lista según prune_seconds."""
         if not self.strikes:
@@ -340,10 +449,13 @@ class BlitzortungService:
         
         now = time.time()
         
-        self.strikes = [
+        kept = [
             strike for strike in self.strikes
             if (now - strike.timestamp) < self.prune_seconds
         ]
+        if len(kept) != len(self.strikes):
+            self.strikes = kept
+            self.version += 1
     
     def _start_cleanup_thread(self) -> None:
         """Inicia thread de limpieza periódica."""
@@ -376,13 +488,7 @@ class BlitzortungService:
                         lon=lon,
                         severity="strong" if random.random() > 0.5 else "medium"
                     )
-                    self.strikes.append(strike)
-                    self._cleanup_old_strikes()
-                    
-                    # Limitar
-                    if len(self.strikes) > self.buffer_max:
-                         self.strikes.sort(key=lambda s: s.timestamp, reverse=True)
-                         self.strikes = self.strikes[:self.buffer_max]
+                    self._add_strikes_locked([strike])
         
         self.test_thread = threading.Thread(target=test_loop, daemon=True)
         self.test_thread.start()
@@ -440,3 +546,40 @@ class BlitzortungService:
             "features": [strike.to_geojson_feature() for strike in strikes]
         }
 
+    def get_status(self) -> Dict[str, Any]:
+        """Información de estado del servicio y contadores por fuente."""
+        with self.strikes_lock:
+            buffer_size = len(self.strikes)
+            dedup = self._dedup.describe()
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "mqtt_connected": self.mqtt_client is not None,
+            "mqtt_topics": list(self.mqtt_topics),
+            "ws_connected": self.ws_client is not None,
+            "concurrent_sources": self.concurrent_sources,
+            "buffer_size": buffer_size,
+            "buffer_max": self.buffer_max,
+            "dedup": dedup,
+            "ingest": self._ingest_queue.describe() if self._ingest_queue else None,
+        }
+    
+    def to_cluster_geojson(self, zoom: float, bbox: Optional[tuple] = None) -> Dict[str, Any]:
+        """Agrega los rayos en una rejilla dependiente del zoom.
+
+        Cada celda lleva el número de rayos, el timestamp más reciente y el
+        centroide. El resultado se cachea por bucket de zoom hasta la siguiente
+        mutación del buffer.
+
+        Args:
+            zoom: Zoom actual del mapa
+            bbox: Opcional (min_lat, max_lat, min_lon, max_lon) para filtrar
+
+        Returns:
+            GeoJSON FeatureCollection de clusters
+        """
+        bucket = zoom_bucket(zoom)
+        with self.strikes_lock:
+            version = self.version
+        cells = self._clusters.get_cells(bucket, version, self.get_all_strikes)
+        return cells_to_geojson(cells, bucket, bbox)
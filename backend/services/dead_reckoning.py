@@ -0,0 +1,85 @@
+"""Estimación de posición por navegación a estima (dead reckoning).
+
+Entre dos informes (AIS irregular, OpenSky cada 5-10 s) los marcadores saltan.
+Al construir la respuesta se proyecta cada posición con su velocidad y rumbo
+hasta el instante actual, con una antigüedad máxima de extrapolación. El
+cálculo se hace vectorizado con numpy sobre toda la flota de una vez.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_M = 6_371_000.0
+KNOTS_TO_MS = 0.514444
+
+
+def extrapolate(
+    lat: Sequence[float],
+    lon: Sequence[float],
+    speed_ms: Sequence[Optional[float]],
+    course_deg: Sequence[Optional[float]],
+    age_s: Sequence[float],
+    max_age_s: float,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Proyecta posiciones ``age_s`` segundos hacia delante.
+
+    Devuelve ``(lat, lon, segundos_aplicados)``. Los elementos sin velocidad o
+    rumbo (``None``/NaN), parados o con antigüedad negativa no se mueven; la
+    antigüedad se recorta a ``max_age_s``.
+    """
+
+    lat_arr = np.asarray(lat, dtype=np.float64)
+    lon_arr = np.asarray(lon, dtype=np.float64)
+    speed = np.asarray(speed_ms, dtype=np.float64)
+    course = np.asarray(course_deg, dtype=np.float64)
+    age = np.clip(np.asarray(age_s, dtype=np.float64), 0.0, max(0.0, float(max_age_s)))
+
+    valid = np.isfinite(speed) & np.isfinite(course) & (speed > 0.0)
+    applied = np.where(valid, age, 0.0)
+    distance = np.where(valid, speed, 0.0) * applied
+
+    course_rad = np.radians(np.where(valid, course, 0.0))
+    lat_rad = np.radians(lat_arr)
+    # Aproximación local plana: los desplazamientos son de pocos km
+    dlat = distance * np.cos(course_rad) / EARTH_RADIUS_M
+    cos_lat = np.maximum(np.cos(lat_rad), 1e-6)
+    dlon = distance * np.sin(course_rad) / (EARTH_RADIUS_M * cos_lat)
+
+    new_lat = np.clip(lat_arr + np.degrees(dlat), -90.0, 90.0)
+    new_lon = (lon_arr + np.degrees(dlon) + 180.0) % 360.0 - 180.0
+    return new_lat, new_lon, applied
+
+
+def extrapolate_items(
+    items: List[Dict[str, Any]],
+    now: float,
+    max_age_s: float,
+    *,
+    lat_key: str = "lat",
+    lon_key: str = "lon",
+    speed_key: str = "velocity",
+    course_key: str = "track",
+    ts_key: str = "last_contact",
+    speed_factor: float = 1.0,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Atajo para listas de dicts (p. ej. aeronaves de OpenSky)."""
+
+    def _column(key: str) -> np.ndarray:
+        return np.array([item.get(key) for item in items], dtype=np.float64)
+
+    ts = _column(ts_key)
+    age = np.where(np.isfinite(ts), now - ts, 0.0)
+    return extrapolate(
+        _column(lat_key),
+        _column(lon_key),
+        _column(speed_key) * speed_factor,
+        _column(course_key),
+        age,
+        max_age_s,
+    )
+
+
+__all__ = ["EARTH_RADIUS_M", "KNOTS_TO_MS", "extrapolate", "extrapolate_items"]
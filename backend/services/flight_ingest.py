@@ -0,0 +1,332 @@
+"""Ingesta de vuelos de varios proveedores fusionada en un único snapshot.
+
+OpenSky sigue siendo la fuente principal: su poller publica el área
+configurada. Los proveedores de ``merge_providers`` (AviationStack, URL
+personalizada) se sondean cada uno en su propio hilo y con su propio
+intervalo, sobre esa misma área. Cada vez que cualquiera trae datos se
+fusionan por icao24 quedándose con la posición más reciente y el resultado se
+publica como snapshot del poller: un proveedor lento nunca retrasa el mapa
+(se usa su último resultado) y las zonas sin cobertura de uno las rellenan
+los otros.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ..layer_providers import AviationStackFlightProvider, CustomFlightProvider, FlightProvider
+from ..secret_store import SecretStore
+
+MERGE_SOURCES = ("aviationstack", "custom")
+DISABLED_POLL_SECONDS = 30
+ERROR_RETRY_SECONDS = 60
+PRIMARY_WAIT_SECONDS = 5
+
+BBox = Tuple[float, float, float, float]  # (lamin, lamax, lomin, lomax)
+
+_HEX_ICAO24 = re.compile(r"^[0-9a-f]{6}$")
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number == number else None
+
+
+def feature_to_item(feature: Dict[str, Any], source: str, now: float) -> Optional[Dict[str, Any]]:
+    """Feature GeoJSON de ``layer_providers`` -> item con el formato de OpenSky."""
+
+    coordinates = (feature.get("geometry") or {}).get("coordinates") if isinstance(feature, dict) else None
+    if not isinstance(coordinates, (list, tuple)) or len(coordinates) < 2:
+        return None
+    lon, lat = _number(coordinates[0]), _number(coordinates[1])
+    if lat is None or lon is None or not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        return None
+    props = feature.get("properties") or {}
+    icao24 = str(props.get("icao24") or "").strip().lower()
+    callsign = str(props.get("callsign") or "").strip()
+    last_contact = _number(props.get("last_contact") or props.get("timestamp")) or now
+    item_id = icao24 or callsign or f"{source}-{lat:.4f}-{lon:.4f}"
+    return {
+        "id": item_id,
+        "icao24": icao24 or None,
+        "callsign": callsign or None,
+        "origin_country": props.get("origin_country") or None,
+        "lon": lon,
+        "lat": lat,
+        "alt": _number(props.get("alt") if props.get("alt") is not None else props.get("alt_baro")),
+        "velocity": _number(props.get("velocity") if props.get("velocity") is not None else props.get("speed")),
+        "vertical_rate": _number(props.get("vertical_rate")),
+        "track": _number(props.get("track")),
+        "on_ground": bool(props.get("on_ground")),
+        "squawk": props.get("squawk"),
+        "category": props.get("category"),
+        "last_contact": int(last_contact),
+        "source": source,
+    }
+
+
+def merge_items(groups: Iterable[Sequence[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Une varias listas de items; por icao24 gana el ``last_contact`` más reciente.
+
+    Los items sin icao24 válido (p. ej. AviationStack sin hex) no se pueden
+    cruzar con los demás y se conservan tal cual. A igualdad de ``last_contact``
+    gana el grupo anterior (el principal va primero).
+    """
+
+    merged: Dict[str, Dict[str, Any]] = {}
+    for group in groups:
+        for item in group:
+            icao24 = item.get("icao24") or ""
+            key = icao24 if _HEX_ICAO24.match(icao24) else f"{item.get('source')}:{item.get('id')}"
+            current = merged.get(key)
+            if current is None or (item.get("last_contact") or 0) > (current.get("last_contact") or 0):
+                merged[key] = item
+    return list(merged.values())
+
+
+def _inside(item: Dict[str, Any], area: Optional[BBox]) -> bool:
+    if area is None:
+        return True
+    lamin, lamax, lomin, lomax = area
+    return lamin <= item["lat"] <= lamax and lomin <= item["lon"] <= lomax
+
+
+@dataclass
+class _ProviderState:
+    name: str
+    enabled: bool = False
+    poll_seconds: float = 0.0
+    # Edad máxima de sus posiciones: ``max_age_seconds`` más su propio intervalo
+    max_age_seconds: float = 0.0
+    items: List[Dict[str, Any]] = field(default_factory=list)
+    fetched_at: Optional[float] = None
+    last_error: Optional[str] = None
+    runs: int = 0
+    failures: int = 0
+
+
+class FlightIngestor:
+    """Sondea los proveedores secundarios y fusiona sus vuelos con los de OpenSky."""
+
+    def __init__(
+        self,
+        secret_store: Optional[SecretStore] = None,
+        logger: Optional[logging.Logger] = None,
+        provider_factory: Optional[Callable[[str, Any], Optional[FlightProvider]]] = None,
+    ) -> None:
+        self._logger = logger or logging.getLogger("pantalla.backend.flight_ingest")
+        self._secret_store = secret_store
+        self._provider_factory = provider_factory or self._build_provider
+        self._lock = threading.Lock()
+        self._states: Dict[str, _ProviderState] = {name: _ProviderState(name) for name in MERGE_SOURCES}
+        self._threads: List[threading.Thread] = []
+        self._stop: Optional[threading.Event] = None
+        self._primary: List[Dict[str, Any]] = []
+        self._primary_at: Optional[float] = None
+        self._area: Optional[BBox] = None
+        self._max_items = 0
+        self._merged_count: Optional[int] = None
+        self._on_merge: Optional[Callable[[List[Dict[str, Any]], float], None]] = None
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+    def set_publisher(self, callback: Callable[[List[Dict[str, Any]], float], None]) -> None:
+        """``callback(items, ts)`` recibe cada snapshot fusionado."""
+
+        self._on_merge = callback
+
+    def start(self, config_reader: Callable[[], Any]) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._stop = threading.Event()
+            for name in MERGE_SOURCES:
+                thread = threading.Thread(
+                    target=self._provider_loop,
+                    args=(name, config_reader, self._stop),
+                    name=f"FlightIngest-{name}",
+                    daemon=True,
+                )
+                self._threads.append(thread)
+                thread.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            threads, stop_event = self._threads, self._stop
+            self._threads, self._stop = [], None
+        if stop_event:
+            stop_event.set()
+        for thread in threads:
+            if thread.is_alive():
+                thread.join(timeout=5)
+
+    @property
+    def active(self) -> bool:
+        return any(state.enabled for state in self._states.values())
+
+    # ------------------------------------------------------------------
+    # Fusión
+    # ------------------------------------------------------------------
+    def merge_primary(
+        self,
+        items: List[Dict[str, Any]],
+        fetched_at: float,
+        area: Optional[BBox],
+        max_items: int = 0,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Fusiona un snapshot nuevo de OpenSky; ``None`` si no hay nada que añadir."""
+
+        with self._lock:
+            self._primary = items
+            self._primary_at = fetched_at
+            self._area = area
+            self._max_items = max(0, int(max_items))
+            if not self.active:
+                self._merged_count = None
+                return None
+            return self._merge_locked(time.time())
+
+    def _merge_locked(self, now: float) -> List[Dict[str, Any]]:
+        # Los secundarios sólo aportan posiciones recientes y dentro del área; cada
+        # uno con su propio límite para no desaparecer entre dos de sus sondeos
+        extras = [
+            [
+                item
+                for item in state.items
+                if item["last_contact"] >= now - state.max_age_seconds and _inside(item, self._area)
+            ]
+            for state in self._states.values()
+            if state.enabled
+        ]
+        merged = merge_items([self._primary, *extras])
+        if self._max_items and len(merged) > self._max_items:
+            merged = merged[: self._max_items]
+        self._merged_count = len(merged)
+        return merged
+
+    def _republish(self) -> None:
+        """Tras un sondeo secundario, vuelve a publicar con el último OpenSky."""
+
+        callback = self._on_merge
+        with self._lock:
+            if callback is None or self._primary_at is None:
+                # Sin snapshot de OpenSky aún: se fusionará cuando llegue
+                return
+            merged = self._merge_locked(time.time())
+            ts = self._primary_at
+        callback(merged, ts)
+
+    # ------------------------------------------------------------------
+    # Proveedores secundarios
+    # ------------------------------------------------------------------
+    def _build_provider(self, name: str, flights_config: Any) -> Optional[FlightProvider]:
+        if name == "aviationstack":
+            cfg = getattr(flights_config, "aviationstack", None)
+            api_key = self._secret_store.get_secret("aviationstack_api_key") if self._secret_store else None
+            return AviationStackFlightProvider(base_url=getattr(cfg, "base_url", None), api_key=api_key)
+        if name == "custom":
+            cfg = getattr(flights_config, "custom", None)
+            if not getattr(cfg, "api_url", None):
+                return None
+            return CustomFlightProvider(api_url=cfg.api_url, api_key=getattr(cfg, "api_key", None))
+        return None
+
+    def _provider_loop(self, name: str, config_reader: Callable[[], Any], stop_event: threading.Event) -> None:
+        delay = 0.0
+        while not stop_event.wait(delay):
+            try:
+                delay = self._poll_provider(name, config_reader())
+            except Exception as exc:  # noqa: BLE001 - el hilo no debe morir
+                self._logger.warning("[flights] %s poll failed: %s", name, exc)
+                with self._lock:
+                    self._states[name].failures += 1
+                    self._states[name].last_error = str(exc)
+                delay = float(ERROR_RETRY_SECONDS)
+
+    def _poll_provider(self, name: str, config: Any) -> float:
+        """Un sondeo de ``name``; devuelve los segundos hasta el siguiente."""
+
+        flights = getattr(getattr(config, "layers", None), "flights", None)
+        state = self._states[name]
+        enabled = bool(
+            flights is not None and flights.enabled and name in (getattr(flights, "merge_providers", None) or [])
+        )
+        if not enabled:
+            if state.enabled:
+                with self._lock:
+                    state.enabled = False
+                    state.items = []
+                self._republish()
+            return float(DISABLED_POLL_SECONDS)
+
+        provider_cfg = getattr(flights, name, None)
+        default_poll = 900 if name == "aviationstack" else 30
+        poll_seconds = float(getattr(provider_cfg, "poll_seconds", default_poll) or default_poll)
+        provider = self._provider_factory(name, flights)
+        with self._lock:
+            state.enabled = provider is not None
+            state.poll_seconds = poll_seconds
+            state.max_age_seconds = float(getattr(flights, "max_age_seconds", 120)) + poll_seconds
+            area = self._area
+            waiting_primary = self._primary_at is None
+        if provider is None:
+            return float(DISABLED_POLL_SECONDS)
+        if waiting_primary:
+            # Hasta que OpenSky publique no se conoce el área (y no se gasta cupo)
+            return float(PRIMARY_WAIT_SECONDS)
+
+        bounds = None
+        if area is not None:
+            lamin, lamax, lomin, lomax = area
+            # layer_providers usa (min_lon, min_lat, max_lon, max_lat)
+            bounds = (lomin, lamin, lomax, lamax)
+        collection = provider.fetch(bounds=bounds)
+        now = time.time()
+        items = [
+            item
+            for item in (feature_to_item(feature, name, now) for feature in collection.get("features") or [])
+            if item is not None
+        ]
+        with self._lock:
+            state.items = items
+            state.fetched_at = now
+            state.runs += 1
+            state.last_error = None
+        self._logger.info("[flights] %s returned %d aircraft", name, len(items))
+        self._republish()
+        return poll_seconds
+
+    def describe(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            providers = {
+                name: {
+                    "enabled": state.enabled,
+                    "poll_seconds": state.poll_seconds or None,
+                    "max_age_seconds": state.max_age_seconds or None,
+                    "items": len(state.items),
+                    "age": int(now - state.fetched_at) if state.fetched_at else None,
+                    "runs": state.runs,
+                    "failures": state.failures,
+                    "last_error": state.last_error,
+                }
+                for name, state in self._states.items()
+            }
+            return {
+                "active": self.active,
+                "primary_items": len(self._primary),
+                "merged_items": self._merged_count,
+                "providers": providers,
+            }
+
+
+__all__ = ["FlightIngestor", "MERGE_SOURCES", "feature_to_item", "merge_items"]
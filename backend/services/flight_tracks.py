@@ -0,0 +1,216 @@
+"""Historial reciente de posiciones por aeronave en anillos compactos.
+
+Como las estelas de barcos (``vessel_tracks``), cada icao24 guarda sus últimas
+posiciones en un ``array('d')`` plano ``[ts, lat, lon, alt, ...]`` usado como
+anillo de ``max_points`` (altitud desconocida = NaN). Se alimenta con cada
+snapshot de OpenSky: una aeronave cuyo ``last_contact`` no ha cambiado no añade
+punto. El número de aeronaves está acotado; al superarlo se descartan las
+actualizadas hace más tiempo, y las que llevan ``expire_seconds`` sin verse se
+eliminan.
+"""
+
+from __future__ import annotations
+
+import math
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .opensky_columns import StateColumns
+
+STRIDE = 4
+# Ventana para la tendencia vertical y umbral (m/s) para considerarla subida/bajada
+TREND_WINDOW_SECONDS = 120.0
+TREND_MIN_RATE = 1.0
+
+Point = Tuple[float, float, float, Optional[float]]  # (ts, lat, lon, alt)
+
+
+class _Ring:
+    __slots__ = ("data", "start")
+
+    def __init__(self) -> None:
+        self.data = array("d")
+        self.start = 0
+
+    def __len__(self) -> int:
+        return len(self.data) // STRIDE
+
+    def _slot(self, index: int, max_points: int) -> int:
+        return ((self.start + index) % max_points) * STRIDE
+
+    def last_ts(self, max_points: int) -> float:
+        return self.data[self._slot(len(self) - 1, max_points)]
+
+    def append(self, values: Tuple[float, float, float, float], max_points: int) -> None:
+        if len(self) < max_points:
+            self.data.extend(values)
+            return
+        offset = self.start * STRIDE
+        self.data[offset:offset + STRIDE] = array("d", values)
+        self.start = (self.start + 1) % max_points
+
+    def points(self, max_points: int) -> List[Point]:
+        result = []
+        for index in range(len(self)):
+            offset = self._slot(index, max_points)
+            alt = self.data[offset + 3]
+            result.append((self.data[offset], self.data[offset + 1], self.data[offset + 2], None if alt != alt else alt))
+        return result
+
+
+def vertical_trend(points: List[Point]) -> Optional[str]:
+    """``climb``, ``descent`` o ``level`` según la altitud de los últimos puntos."""
+
+    with_alt = [(ts, alt) for ts, _, _, alt in points if alt is not None]
+    if len(with_alt) < 2:
+        return None
+    last_ts, last_alt = with_alt[-1]
+    ref_ts, ref_alt = next(
+        (point for point in with_alt if point[0] >= last_ts - TREND_WINDOW_SECONDS and point[0] < last_ts),
+        with_alt[-2],
+    )
+    if last_ts <= ref_ts:
+        return None
+    rate = (last_alt - ref_alt) / (last_ts - ref_ts)
+    if rate >= TREND_MIN_RATE:
+        return "climb"
+    if rate <= -TREND_MIN_RATE:
+        return "descent"
+    return "level"
+
+
+class FlightTrackStore:
+    """Anillos de posiciones recientes por icao24 con límite de aeronaves.
+
+    No es thread-safe: el servicio lo protege con su propio lock.
+    """
+
+    def __init__(self, max_points: int = 64, max_aircraft: int = 2000, expire_seconds: float = 600.0) -> None:
+        self.max_points = max(2, int(max_points))
+        self.max_aircraft = max(1, int(max_aircraft))
+        self.expire_seconds = float(expire_seconds)
+        self._tracks: "OrderedDict[str, _Ring]" = OrderedDict()
+        self._total_points = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    def configure(self, max_points: int, max_aircraft: int, expire_seconds: float) -> None:
+        max_points = max(2, int(max_points))
+        if max_points != self.max_points:
+            # Cambiar el tamaño del anillo invalida la disposición de los datos
+            self.clear()
+            self.max_points = max_points
+        self.max_aircraft = max(1, int(max_aircraft))
+        self.expire_seconds = float(expire_seconds)
+        self._enforce_budget()
+
+    def add(self, icao24: str, ts: float, lat: float, lon: float, alt: Optional[float]) -> None:
+        ring = self._tracks.get(icao24)
+        if ring is None:
+            ring = _Ring()
+            self._tracks[icao24] = ring
+        else:
+            self._tracks.move_to_end(icao24)
+            if ts <= ring.last_ts(self.max_points):
+                # Mismo contacto que en el snapshot anterior
+                return
+        before = len(ring)
+        ring.append((ts, lat, lon, math.nan if alt is None else alt), self.max_points)
+        self._total_points += len(ring) - before
+        self._enforce_budget()
+
+    def add_columns(self, columns: StateColumns) -> None:
+        """Añade un punto por aeronave (con icao24) de un snapshot."""
+
+        for icao24, ts, lat, lon, alt in zip(
+            columns.icao24.tolist(),
+            columns.last_contact.tolist(),
+            columns.lat.tolist(),
+            columns.lon.tolist(),
+            columns.alt.tolist(),
+        ):
+            if icao24:
+                self.add(icao24, float(ts), lat, lon, None if alt != alt else alt)
+
+    def get(self, icao24: str, since: Optional[float] = None) -> List[Point]:
+        """Puntos ``(ts, lat, lon, alt)`` del más antiguo al más reciente."""
+
+        ring = self._tracks.get(icao24)
+        if ring is None:
+            return []
+        points = ring.points(self.max_points)
+        if since is not None:
+            points = [point for point in points if point[0] >= since]
+        return points
+
+    def get_many(
+        self,
+        icao24s: Iterable[str],
+        max_points: Optional[int] = None,
+        since: Optional[float] = None,
+    ) -> Dict[str, List[Point]]:
+        result = {}
+        for icao24 in icao24s:
+            points = self.get(icao24, since=since)
+            if points:
+                result[icao24] = points[-max_points:] if max_points else points
+        return result
+
+    def discard(self, icao24: str) -> None:
+        ring = self._tracks.pop(icao24, None)
+        if ring is not None:
+            self._total_points -= len(ring)
+
+    def expire(self, now: float) -> int:
+        """Elimina las aeronaves sin contacto en los últimos ``expire_seconds``."""
+
+        before = now - self.expire_seconds
+        removed = 0
+        while self._tracks:
+            icao24, ring = next(iter(self._tracks.items()))
+            if ring.last_ts(self.max_points) >= before:
+                break
+            self.discard(icao24)
+            removed += 1
+        return removed
+
+    def clear(self) -> None:
+        self._tracks.clear()
+        self._total_points = 0
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "aircraft": len(self._tracks),
+            "points": self._total_points,
+            "max_points": self.max_points,
+            "max_aircraft": self.max_aircraft,
+            "expire_seconds": int(self.expire_seconds),
+            "bytes": self._total_points * STRIDE * 8,
+            "evicted": self.evicted,
+        }
+
+    def _enforce_budget(self) -> None:
+        while len(self._tracks) > self.max_aircraft:
+            icao24, _ = next(iter(self._tracks.items()))
+            self.discard(icao24)
+            self.evicted += 1
+
+
+def track_to_feature(icao24: str, points: List[Point]) -> Dict[str, Any]:
+    return {
+        "type": "Feature",
+        "geometry": {"type": "LineString", "coordinates": [[lon, lat] for _, lat, lon, _ in points]},
+        "properties": {
+            "icao24": icao24,
+            "timestamps": [int(ts) for ts, _, _, _ in points],
+            "altitudes": [alt for _, _, _, alt in points],
+            "points": len(points),
+            "vertical_trend": vertical_trend(points),
+        },
+    }
+
+
+__all__ = ["FlightTrackStore", "track_to_feature", "vertical_trend"]
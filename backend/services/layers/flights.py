@@ -6,6 +6,11 @@ from typing import Any, Dict, Optional, Tuple, List
 
 import httpx
 
+import numpy as np
+
+from backend.services.dead_reckoning import extrapolate, extrapolate_items
+from backend.services.opensky_columns import StateColumns, features_from_columns
+
 
 def _model_to_dict(model_obj: Any) -> Optional[Dict[str, Any]]:
     if model_obj is None:
@@ -28,10 +33,15 @@ def _load_main_module():
     return importlib.import_module("backend.main")
 
 
-async def get_flights_geojson(bbox: Optional[str] = None, extended: Optional[int] = None) -> Dict[str, Any]:
+async def get_flights_geojson(
+    bbox: Optional[str] = None,
+    extended: Optional[int] = None,
+    trails: bool = False,
+) -> Dict[str, Any]:
     """
     Obtiene los vuelos actuales en formato GeoJSON.
     bbox: "minLon,minLat,maxLon,maxLat"
+    trails: añade a cada feature su historial reciente en ``properties.track``
     """
     main = _load_main_module()
     config = main.config_manager.read()
@@ -51,34 +61,56 @@ async def get_flights_geojson(bbox: Optional[str] = None, extended: Optional[int
 
     # Use opensky service to get snapshot
     print(f"[DEBUG_FLIGHTS] Calling get_snapshot with bbox={bbox_tuple}, extended={extended}")
-    snapshot = main.opensky_service.get_snapshot(config, bbox=bbox_tuple, extended_override=extended)
+    # Normalmente responde desde el snapshot del poller; si la zona pedida cae
+    # fuera, la consulta a OpenSky es asíncrona y no bloquea el event loop
+    snapshot = await main.opensky_service.get_snapshot_async(config, bbox=bbox_tuple, extended_override=extended)
     
     # Convert to GeoJSON
     features: List[Dict[str, Any]] = []
     if snapshot:
         print(f"[DEBUG_FLIGHTS] Snapshot returned. Count={snapshot.payload.get('count')}, Stale={snapshot.payload.get('stale')}")
-        if snapshot.payload.get("items"):
-             for item in snapshot.payload["items"]:
-                 if not isinstance(item, dict):
-                     continue
-
+        columns = getattr(snapshot, "columns", None)
+        if columns is not None and len(columns) == len(snapshot.payload.get("items") or []):
+             # Camino columnar: coordenadas y estima salen de los arrays numpy
+             max_dr = int(getattr(config.layers.flights, "dead_reckoning_max_seconds", 0) or 0)
+             estimated = _estimate_columns(columns, max_dr)
+             if estimated is None:
+                 features = features_from_columns(columns, snapshot.payload["items"])
+             else:
+                 features = features_from_columns(columns, snapshot.payload["items"], *estimated)
+        elif snapshot.payload.get("items"):
+             items = [
+                 item
+                 for item in snapshot.payload["items"]
+                 if isinstance(item, dict)
+                 and (item.get("lat") or item.get("latitude")) is not None
+                 and (item.get("lon") or item.get("longitude")) is not None
+             ]
+             max_dr = int(getattr(config.layers.flights, "dead_reckoning_max_seconds", 0) or 0)
+             estimated = _estimate_positions(items, max_dr)
+             for index, item in enumerate(items):
                  lat = item.get("lat") or item.get("latitude")
                  lon = item.get("lon") or item.get("longitude")
-                 
-                 if lat is None or lon is None:
-                     continue
-                     
+                 properties = item
+                 if estimated is not None and estimated[2][index] > 0:
+                     # No se modifica el item cacheado: copia con la posición estimada
+                     lat, lon = float(estimated[0][index]), float(estimated[1][index])
+                     properties = dict(item, dr_seconds=int(estimated[2][index]))
+
                  features.append({
                      "type": "Feature",
                      "geometry": {
                          "type": "Point",
                          "coordinates": [lon, lat]
                      },
-                     "properties": item
+                     "properties": properties
                  })
     else:
         print("[DEBUG_FLIGHTS] Snapshot is None")
              
+    if trails and features:
+        features = _with_trails(main.opensky_service, features)
+
     print(f"[DEBUG_FLIGHTS] Returning {len(features)} features")
     return {
         "type": "FeatureCollection",
@@ -91,6 +123,50 @@ async def get_flights_geojson(bbox: Optional[str] = None, extended: Optional[int
     }
 
 
+def _with_trails(service: Any, features: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copia de las features con ``properties.track`` (los items cacheados no se tocan)."""
+
+    codes = [feature["properties"].get("icao24") for feature in features]
+    trails = service.get_trails([code for code in codes if code])
+    result = []
+    for code, feature in zip(codes, features):
+        points = trails.get(code) if code else None
+        if points:
+            properties = dict(feature["properties"], track=[[lon, lat] for _, lat, lon, _ in points])
+            feature = dict(feature, properties=properties)
+        result.append(feature)
+    return result
+
+
+def _estimate_columns(columns: StateColumns, max_seconds: int):
+    """Como ``_estimate_positions`` pero directamente sobre las columnas."""
+
+    if max_seconds <= 0 or not len(columns):
+        return None
+    velocity = np.where(columns.on_ground, np.nan, columns.velocity)
+    age = time.time() - columns.last_contact
+    return extrapolate(columns.lat, columns.lon, velocity, columns.track, age, max_seconds)
+
+
+def _estimate_positions(items: List[Dict[str, Any]], max_seconds: int):
+    """Posiciones por navegación a estima (``None`` si está desactivada)."""
+
+    if max_seconds <= 0 or not items:
+        return None
+    columns = [
+        {
+            "lat": item.get("lat") or item.get("latitude"),
+            "lon": item.get("lon") or item.get("longitude"),
+            # En tierra no se extrapola (rodaje, aparcado)
+            "velocity": None if item.get("on_ground") else item.get("velocity"),
+            "track": item.get("track"),
+            "last_contact": item.get("last_contact"),
+        }
+        for item in items
+    ]
+    return extrapolate_items(columns, time.time(), max_seconds)
+
+
 async def get_status() -> Dict[str, Any]:
     """
     Devuelve el estado actual de la capa de vuelos según la configuración y el servicio OpenSky.
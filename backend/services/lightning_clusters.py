@@ -0,0 +1,147 @@
+"""Agregación de rayos en rejilla dependiente del zoom para la capa de rayos."""
+
+from __future__ import annotations
+
+import math
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Protocol, Tuple
+
+# Celdas por tesela de 256 px: 8 celdas ≈ 32 px en pantalla a cualquier zoom.
+CELLS_PER_TILE = 8
+MIN_ZOOM_BUCKET = 0
+MAX_ZOOM_BUCKET = 14
+
+
+class _StrikeLike(Protocol):
+    timestamp: float
+    lat: float
+    lon: float
+
+
+@dataclass
+class LightningCell:
+    """Celda de la rejilla con los agregados de los rayos que contiene."""
+
+    count: int = 0
+    newest_ts: float = 0.0
+    sum_lat: float = 0.0
+    sum_lon: float = 0.0
+
+    @property
+    def centroid(self) -> Tuple[float, float]:
+        return self.sum_lat / self.count, self.sum_lon / self.count
+
+    def to_geojson_feature(self, cell_id: str) -> Dict[str, Any]:
+        """Convierte la celda a un Feature de GeoJSON ubicado en su centroide."""
+        lat, lon = self.centroid
+        return {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [round(lon, 5), round(lat, 5)]},
+            "properties": {
+                "cell": cell_id,
+                "count": self.count,
+                "newest_ts": self.newest_ts,
+                "newest_iso": datetime.fromtimestamp(self.newest_ts, tz=timezone.utc).isoformat(),
+            },
+        }
+
+
+def zoom_bucket(zoom: float) -> int:
+    """Normaliza un zoom de MapLibre (float) a un bucket entero acotado."""
+    if zoom is None or math.isnan(zoom):
+        return MIN_ZOOM_BUCKET
+    return max(MIN_ZOOM_BUCKET, min(MAX_ZOOM_BUCKET, int(math.floor(zoom))))
+
+
+def cell_size_deg(bucket: int) -> float:
+    """Tamaño de celda en grados para un bucket de zoom."""
+    return 360.0 / ((2 ** bucket) * CELLS_PER_TILE)
+
+
+def bin_strikes(strikes: Iterable[_StrikeLike], bucket: int) -> Dict[Tuple[int, int], LightningCell]:
+    """Agrupa rayos en celdas de la rejilla del bucket indicado."""
+    size = cell_size_deg(bucket)
+    cells: Dict[Tuple[int, int], LightningCell] = {}
+    for strike in strikes:
+        key = (int(math.floor(strike.lat / size)), int(math.floor(strike.lon / size)))
+        cell = cells.get(key)
+        if cell is None:
+            cell = LightningCell()
+            cells[key] = cell
+        cell.count += 1
+        cell.sum_lat += strike.lat
+        cell.sum_lon += strike.lon
+        if strike.timestamp > cell.newest_ts:
+            cell.newest_ts = strike.timestamp
+    return cells
+
+
+class LightningClusterCache:
+    """Caché de agregados por bucket de zoom, invalidada por versión del buffer.
+
+    El buffer de rayos incrementa su versión en cada mutación; cada bucket sólo
+    se recalcula la primera vez que se pide tras un cambio, de modo que varios
+    clientes consultando el mismo zoom comparten el mismo resultado.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buckets: Dict[int, Tuple[int, List[Tuple[str, LightningCell]]]] = {}
+
+    def get_cells(
+        self,
+        bucket: int,
+        version: int,
+        strikes_provider: Callable[[], List[_StrikeLike]],
+    ) -> List[Tuple[str, LightningCell]]:
+        with self._lock:
+            cached = self._buckets.get(bucket)
+            if cached and cached[0] == version:
+                return cached[1]
+        cells = bin_strikes(strikes_provider(), bucket)
+        result = [(f"{bucket}/{key[0]}/{key[1]}", cell) for key, cell in cells.items()]
+        with self._lock:
+            self._buckets[bucket] = (version, result)
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+def cells_to_geojson(
+    cells: List[Tuple[str, LightningCell]],
+    bucket: int,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+) -> Dict[str, Any]:
+    """Serializa las celdas a FeatureCollection, filtrando por bbox (min_lat, max_lat, min_lon, max_lon)."""
+    features = []
+    total = 0
+    for cell_id, cell in cells:
+        lat, lon = cell.centroid
+        if bbox and not (bbox[0] <= lat <= bbox[1] and bbox[2] <= lon <= bbox[3]):
+            continue
+        total += cell.count
+        features.append(cell.to_geojson_feature(cell_id))
+    return {
+        "type": "FeatureCollection",
+        "features": features,
+        "metadata": {
+            "zoom_bucket": bucket,
+            "cell_deg": cell_size_deg(bucket),
+            "clusters": len(features),
+            "strikes": total,
+        },
+    }
+
+
+__all__ = [
+    "LightningCell",
+    "LightningClusterCache",
+    "bin_strikes",
+    "cell_size_deg",
+    "cells_to_geojson",
+    "zoom_bucket",
+]
@@ -0,0 +1,139 @@
+"""De-duplicación espacio-temporal de rayos recibidos por varias fuentes."""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+RATE_WINDOW_SECONDS = 60.0
+# Fuente con la que se siembra el de-duplicador al reproducir el histórico
+HISTORY_SOURCE = "history"
+
+
+@dataclass
+class SourceStats:
+    """Contadores de ingesta de una fuente (tópico MQTT, WebSocket...)."""
+
+    received: int = 0
+    accepted: int = 0
+    duplicates: int = 0
+    last_seen: Optional[float] = None
+    _arrivals: Deque[Tuple[float, int]] = field(default_factory=deque, repr=False)
+
+    def record(self, now: float, received: int, accepted: int) -> None:
+        self.received += received
+        self.accepted += accepted
+        self.duplicates += received - accepted
+        self.last_seen = now
+        arrivals = self._arrivals
+        arrivals.append((now, received))
+        cutoff = now - RATE_WINDOW_SECONDS
+        while arrivals and arrivals[0][0] < cutoff:
+            arrivals.popleft()
+
+    def rate_per_min(self, now: float) -> float:
+        cutoff = now - RATE_WINDOW_SECONDS
+        return float(sum(count for ts, count in self._arrivals if ts >= cutoff))
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "accepted": self.accepted,
+            "duplicates_dropped": self.duplicates,
+            "ingest_rate_per_min": self.rate_per_min(now),
+            "last_seen": self.last_seen,
+        }
+
+
+class StrikeDeduplicator:
+    """Descarta rayos ya recibidos por otra fuente dentro de una ventana deslizante.
+
+    Sólo se cruzan fuentes distintas: dos rayos de la misma fuente en la misma
+    celda son descargas distintas (cada fuente ya envía cada rayo una vez). El
+    histórico reproducido al arrancar se pasa como una fuente más para que las
+    copias en vivo de esos rayos no se acepten otra vez.
+
+    La clave de cada rayo es (bucket temporal, celda de lat, celda de lon), con
+    celdas de ``10**-coord_decimals`` grados. Se comprueban también los buckets
+    y celdas vecinos para que dos informes del mismo rayo no escapen por caer a
+    ambos lados de un límite (relojes desfasados o redondeo de coordenadas).
+    No es thread-safe: el llamador debe serializar el acceso.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = 30.0,
+        time_bucket_seconds: float = 0.5,
+        coord_decimals: int = 2,
+    ) -> None:
+        self.window_seconds = float(window_seconds)
+        self.time_bucket_seconds = float(time_bucket_seconds)
+        self.coord_decimals = int(coord_decimals)
+        self._scale = 10 ** self.coord_decimals
+        # Clave -> fuentes que la han enviado dentro de la ventana
+        self._seen: Dict[Tuple[int, int, int], Set[str]] = {}
+        self._order: Deque[Tuple[float, Tuple[int, int, int], str]] = deque()
+        self.sources: Dict[str, SourceStats] = {}
+
+    def _key(self, strike: Any) -> Tuple[int, int, int]:
+        return (
+            int(strike.timestamp // self.time_bucket_seconds),
+            int(round(strike.lat * self._scale)),
+            int(round(strike.lon * self._scale)),
+        )
+
+    def _seen_from_other(self, key: Tuple[int, int, int], source: str) -> bool:
+        bucket, lat, lon = key
+        seen = self._seen
+        for dt in (0, -1, 1):
+            for dy in (0, -1, 1):
+                for dx in (0, -1, 1):
+                    sources = seen.get((bucket + dt, lat + dy, lon + dx))
+                    if sources and (len(sources) > 1 or source not in sources):
+                        return True
+        return False
+
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.window_seconds
+        order = self._order
+        while order and order[0][0] < cutoff:
+            _, key, source = order.popleft()
+            sources = self._seen.get(key)
+            if sources is not None:
+                sources.discard(source)
+                if not sources:
+                    del self._seen[key]
+
+    def filter(self, source: str, strikes: Iterable[Any], now: Optional[float] = None) -> List[Any]:
+        """Devuelve sólo los rayos no vistos antes y actualiza los contadores de la fuente."""
+        now = time.time() if now is None else now
+        self._expire(now)
+        accepted: List[Any] = []
+        received = 0
+        for strike in strikes:
+            received += 1
+            key = self._key(strike)
+            if self._seen_from_other(key, source):
+                continue
+            self._seen.setdefault(key, set()).add(source)
+            self._order.append((now, key, source))
+            accepted.append(strike)
+        stats = self.sources.get(source)
+        if stats is None:
+            stats = SourceStats()
+            self.sources[source] = stats
+        stats.record(now, received, len(accepted))
+        return accepted
+
+    def describe(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = time.time() if now is None else now
+        return {
+            "window_seconds": self.window_seconds,
+            "tracked_keys": len(self._seen),
+            "sources": {name: stats.to_dict(now) for name, stats in self.sources.items()},
+        }
+
+
+__all__ = ["HISTORY_SOURCE", "SourceStats", "StrikeDeduplicator"]
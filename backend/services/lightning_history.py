@@ -0,0 +1,242 @@
+"""Histórico persistente de rayos en un log binario append-only.
+
+Cada rayo se guarda como un registro de tamaño fijo (ts/lat/lon/severity) en
+ficheros que rotan cada hora (``YYYYMMDDHH.bin``, hora UTC del rayo). La
+lectura se hace mapeando los ficheros en memoria con numpy, de modo que las
+consultas por rango temporal y bbox no deserializan nada.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RECORD_DTYPE = np.dtype([("ts", "<f8"), ("lat", "<f4"), ("lon", "<f4"), ("severity", "u1")])
+
+SEVERITY_CODES: Dict[Optional[str], int] = {None: 0, "weak": 1, "medium": 2, "strong": 3}
+SEVERITY_NAMES: Dict[int, Optional[str]] = {code: name for name, code in SEVERITY_CODES.items()}
+
+SECONDS_PER_FILE = 3600
+
+
+def default_history_dir() -> Path:
+    """Directorio por defecto del histórico dentro del estado de la aplicación."""
+    state_path = Path(os.getenv("PANTALLA_STATE_DIR", "/var/lib/pantalla-reloj"))
+    return Path(os.getenv("PANTALLA_LIGHTNING_HISTORY_DIR", state_path / "lightning"))
+
+
+def _hour_of(ts: float) -> int:
+    return int(ts // SECONDS_PER_FILE)
+
+
+def _file_name(hour: int) -> str:
+    return datetime.fromtimestamp(hour * SECONDS_PER_FILE, tz=timezone.utc).strftime("%Y%m%d%H") + ".bin"
+
+
+def _hour_from_name(name: str) -> Optional[int]:
+    try:
+        dt = datetime.strptime(name[:-4], "%Y%m%d%H").replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+    return _hour_of(dt.timestamp())
+
+
+class LightningHistoryLog:
+    """Log de rayos append-only con rotación horaria y lectura vía mmap."""
+
+    def __init__(self, directory: Optional[Path] = None, retention_hours: int = 24) -> None:
+        self.directory = Path(directory) if directory else default_history_dir()
+        self.retention_hours = max(1, int(retention_hours))
+        self._lock = threading.Lock()
+        self._handle: Optional[IO[bytes]] = None
+        self._handle_hour: Optional[int] = None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Ficheros caducados de ejecuciones anteriores (no esperan a la próxima rotación)
+        with self._lock:
+            self._prune_locked()
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+    def append(self, strikes: Iterable[Any]) -> int:
+        """Añade rayos al log. Devuelve el número de registros escritos."""
+        by_hour: Dict[int, List[Tuple[float, float, float, int]]] = {}
+        for strike in strikes:
+            code = SEVERITY_CODES.get(getattr(strike, "severity", None), 0)
+            by_hour.setdefault(_hour_of(strike.timestamp), []).append(
+                (strike.timestamp, strike.lat, strike.lon, code)
+            )
+        if not by_hour:
+            return 0
+
+        written = 0
+        with self._lock:
+            for hour in sorted(by_hour):
+                records = np.array(by_hour[hour], dtype=RECORD_DTYPE)
+                try:
+                    handle = self._handle_for_locked(hour)
+                    handle.write(records.tobytes())
+                    handle.flush()
+                    written += len(records)
+                except OSError as exc:
+                    logger.error("[Blitzortung] Failed to append lightning history: %s", exc)
+        return written
+
+    def _handle_for_locked(self, hour: int) -> IO[bytes]:
+        if self._handle is not None and self._handle_hour == hour:
+            return self._handle
+        rotating = self._handle_hour is not None and hour > self._handle_hour
+        self._close_handle_locked()
+        path = self.directory / _file_name(hour)
+        self._handle = open(path, "ab")
+        self._trim_partial_record(path, self._handle)
+        self._handle_hour = hour
+        if rotating:
+            self._prune_locked()
+        return self._handle
+
+    @staticmethod
+    def _trim_partial_record(path: Path, handle: IO[bytes]) -> None:
+        """Descarta un registro a medias al final (caída o disco lleno a mitad de escritura).
+
+        Sin esto, todo lo que se añadiera después quedaría desalineado.
+        """
+        size = os.fstat(handle.fileno()).st_size
+        partial = size % RECORD_DTYPE.itemsize
+        if partial:
+            logger.warning("[Blitzortung] Trimming %d trailing bytes from %s", partial, path)
+            handle.truncate(size - partial)
+
+    def _close_handle_locked(self) -> None:
+        if self._handle is not None:
+            try:
+                self._handle.close()
+            except OSError:
+                pass
+        self._handle = None
+        self._handle_hour = None
+
+    def _prune_locked(self) -> None:
+        oldest_hour = _hour_of(time.time()) - self.retention_hours
+        for hour, path in self._files():
+            if hour < oldest_hour:
+                try:
+                    path.unlink()
+                except OSError as exc:
+                    logger.warning("[Blitzortung] Failed to delete old history file %s: %s", path, exc)
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_handle_locked()
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+    def _files(self) -> List[Tuple[int, Path]]:
+        files = []
+        for path in self.directory.glob("*.bin"):
+            hour = _hour_from_name(path.name)
+            if hour is not None:
+                files.append((hour, path))
+        files.sort()
+        return files
+
+    @staticmethod
+    def _map(path: Path) -> Optional[np.ndarray]:
+        try:
+            count = path.stat().st_size // RECORD_DTYPE.itemsize
+        except OSError:
+            return None
+        if count <= 0:
+            return None
+        # Un registro a medio escribir al final queda fuera por la división entera
+        return np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(count,))
+
+    def query(
+        self,
+        start: float,
+        end: float,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        limit: Optional[int] = None,
+    ) -> np.ndarray:
+        """Devuelve los registros en [start, end], opcionalmente filtrados por bbox.
+
+        Args:
+            start: Timestamp Unix inicial
+            end: Timestamp Unix final
+            bbox: Opcional (min_lat, max_lat, min_lon, max_lon)
+            limit: Máximo de registros (se conservan los más recientes)
+
+        Returns:
+            Array estructurado con dtype ``RECORD_DTYPE`` ordenado por timestamp
+        """
+        first_hour, last_hour = _hour_of(start), _hour_of(end)
+        chunks = []
+        for hour, path in self._files():
+            if hour < first_hour or hour > last_hour:
+                continue
+            records = self._map(path)
+            if records is None:
+                continue
+            ts = records["ts"]
+            mask = (ts >= start) & (ts <= end)
+            if bbox:
+                lat = records["lat"]
+                lon = records["lon"]
+                mask &= (lat >= bbox[0]) & (lat <= bbox[1]) & (lon >= bbox[2]) & (lon <= bbox[3])
+            if mask.any():
+                chunks.append(np.array(records[mask]))
+        if not chunks:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        result = np.concatenate(chunks)
+        result = result[np.argsort(result["ts"], kind="stable")]
+        if limit is not None and limit > 0 and len(result) > limit:
+            result = result[-limit:]
+        return result
+
+    def load_recent(self, seconds: float, now: Optional[float] = None) -> np.ndarray:
+        """Registros de los últimos ``seconds`` segundos (para replay al arrancar)."""
+        end = now if now is not None else time.time()
+        return self.query(end - seconds, end)
+
+
+def records_to_geojson(records: np.ndarray) -> Dict[str, Any]:
+    """Convierte registros del histórico a GeoJSON FeatureCollection."""
+    features = []
+    for ts, lat, lon, severity in zip(
+        records["ts"].tolist(),
+        records["lat"].tolist(),
+        records["lon"].tolist(),
+        records["severity"].tolist(),
+    ):
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [round(lon, 5), round(lat, 5)]},
+                "properties": {
+                    "timestamp": ts,
+                    "timestamp_iso": datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(),
+                    "severity": SEVERITY_NAMES.get(severity),
+                },
+            }
+        )
+    return {"type": "FeatureCollection", "features": features}
+
+
+__all__ = [
+    "LightningHistoryLog",
+    "RECORD_DTYPE",
+    "SEVERITY_CODES",
+    "SEVERITY_NAMES",
+    "default_history_dir",
+    "records_to_geojson",
+]
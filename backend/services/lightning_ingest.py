@@ -0,0 +1,222 @@
+"""Ruta de ingesta por micro-lotes para mensajes de rayos (MQTT/WebSocket).
+
+Los callbacks de red sólo encolan el payload crudo; un hilo drena la cola cada
+``interval_ms`` milisegundos, decodifica todos los mensajes pendientes y los
+entrega al servicio en un único lote, que toma el lock del buffer una sola vez.
+El formato de las claves (``time``/``timestamp``/``t``...) se detecta una vez
+por fuente y se reutiliza mientras siga siendo válido. La cola está acotada:
+si el drenado se atasca se descartan los mensajes más antiguos y se cuentan.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+try:  # pragma: no cover - dependencia opcional, más rápida que json
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+TIME_KEYS = ("time", "timestamp", "t")
+LAT_KEYS = ("lat", "latitude")
+LON_KEYS = ("lon", "longitude", "lng")
+
+RawPayload = Union[bytes, bytearray, memoryview, str]
+Batch = List[Tuple[str, List[Any]]]
+
+DEFAULT_MAX_PENDING = 10000
+
+
+def loads(payload: RawPayload) -> Any:
+    """Decodifica JSON con orjson si está disponible."""
+    if orjson is not None:
+        return orjson.loads(payload)
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        payload = bytes(payload).decode("utf-8")
+    return json.loads(payload)
+
+
+@dataclass(frozen=True)
+class KeyMapping:
+    """Claves efectivas de un formato de payload."""
+
+    time: str
+    lat: str
+    lon: str
+
+
+def detect_mapping(item: Dict[str, Any]) -> Optional[KeyMapping]:
+    """Detecta qué variante de claves usa un objeto de rayo."""
+    time_key = next((key for key in TIME_KEYS if item.get(key) is not None), None)
+    lat_key = next((key for key in LAT_KEYS if item.get(key) is not None), None)
+    lon_key = next((key for key in LON_KEYS if item.get(key) is not None), None)
+    if time_key is None or lat_key is None or lon_key is None:
+        return None
+    return KeyMapping(time=time_key, lat=lat_key, lon=lon_key)
+
+
+class StrikeDecoder:
+    """Convierte payloads crudos en rayos con un mapeo de claves cacheado por fuente."""
+
+    def __init__(self, factory: Callable[..., Any]) -> None:
+        self._factory = factory
+        self._mappings: Dict[str, KeyMapping] = {}
+
+    def decode(self, source: str, payload: RawPayload) -> List[Any]:
+        data = loads(payload)
+        items = data if isinstance(data, list) else (data,)
+        mapping = self._mappings.get(source)
+        strikes: List[Any] = []
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            for _ in range(2):
+                if mapping is None:
+                    mapping = detect_mapping(item)
+                    if mapping is None:
+                        break
+                    self._mappings[source] = mapping
+                try:
+                    ts = item[mapping.time]
+                    lat = item[mapping.lat]
+                    lon = item[mapping.lon]
+                except KeyError:
+                    # El formato cambió: volver a detectar con este objeto
+                    mapping = None
+                    continue
+                if ts is None or lat is None or lon is None:
+                    break
+                try:
+                    strikes.append(
+                        self._factory(
+                            timestamp=float(ts),
+                            lat=float(lat),
+                            lon=float(lon),
+                            severity=item.get("severity"),
+                        )
+                    )
+                except (TypeError, ValueError):
+                    pass
+                break
+        return strikes
+
+    def mappings(self) -> Dict[str, Dict[str, str]]:
+        return {
+            source: {"time": m.time, "lat": m.lat, "lon": m.lon}
+            for source, m in self._mappings.items()
+        }
+
+
+class LightningIngestQueue:
+    """Cola de mensajes crudos drenada por micro-lotes en un hilo propio."""
+
+    def __init__(
+        self,
+        sink: Callable[[Batch], None],
+        factory: Callable[..., Any],
+        interval_ms: int = 50,
+        max_pending: int = DEFAULT_MAX_PENDING,
+    ) -> None:
+        self._sink = sink
+        self.decoder = StrikeDecoder(factory)
+        self.interval = max(1, int(interval_ms)) / 1000.0
+        self.max_pending = max(1, int(max_pending))
+        self._pending: Deque[Tuple[str, RawPayload]] = deque(maxlen=self.max_pending)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+        self.messages = 0
+        self.decode_errors = 0
+        self.max_batch = 0
+        self.dropped = 0
+
+    def submit(self, source: str, payload: RawPayload) -> None:
+        """Encola un payload crudo (seguro desde cualquier hilo).
+
+        Con la cola llena, ``deque(maxlen)`` descarta el mensaje más antiguo.
+        """
+        pending = self._pending
+        if len(pending) >= self.max_pending:
+            self.dropped += 1
+        pending.append((source, payload))
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="LightningIngest", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as exc:  # noqa: BLE001 - el hilo no debe morir
+                logger.error("[Blitzortung] Ingest batch failed: %s", exc)
+
+    def flush(self) -> int:
+        """Drena y procesa todo lo pendiente. Devuelve el número de mensajes."""
+        pending = self._pending
+        by_source: Dict[str, List[Any]] = {}
+        count = 0
+        while pending:
+            try:
+                source, payload = pending.popleft()
+            except IndexError:
+                break
+            count += 1
+            try:
+                strikes = self.decoder.decode(source, payload)
+            except ValueError as exc:
+                self.decode_errors += 1
+                logger.debug("[Blitzortung] Failed to decode message from %s: %s", source, exc)
+                continue
+            by_source.setdefault(source, []).extend(strikes)
+        if not count:
+            return 0
+        self.batches += 1
+        self.messages += count
+        self.max_batch = max(self.max_batch, count)
+        batch = [(source, strikes) for source, strikes in by_source.items() if strikes]
+        if batch:
+            self._sink(batch)
+        return count
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "interval_ms": int(self.interval * 1000),
+            "json_backend": "orjson" if orjson is not None else "json",
+            "pending": len(self._pending),
+            "max_pending": self.max_pending,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "messages": self.messages,
+            "decode_errors": self.decode_errors,
+            "max_batch": self.max_batch,
+            "avg_batch": round(self.messages / self.batches, 2) if self.batches else 0.0,
+            "key_mappings": self.decoder.mappings(),
+        }
+
+
+__all__ = [
+    "DEFAULT_MAX_PENDING",
+    "KeyMapping",
+    "LightningIngestQueue",
+    "StrikeDecoder",
+    "detect_mapping",
+    "loads",
+]
@@ -1,14 +1,17 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import random
 import threading
 import time
 from dataclasses import dataclass
-from typing import Optional
+from typing import Callable, Dict, NoReturn, Optional, Tuple
 
 import httpx
 
 from ..secret_store import SecretStore
+from .opensky_client import close_replaced_client
 
 DEFAULT_TOKEN_URL = (
     "https://auth.opensky-network.org/auth/realms/opensky-network/protocol/openid-connect/token"
@@ -24,6 +27,22 @@ class TokenInfo:
     scope: Optional[str]
 
 
+@dataclass(frozen=True)
+class RefreshSettings:
+    token_url: Optional[str] = None
+    scope: Optional[str] = None
+    fraction: float = 0.75
+    jitter_seconds: float = 30.0
+    # Capa de vuelos desactivada u otro proveedor: el refresco espera sin pedir tokens
+    idle: bool = False
+
+
+# Espera del refresco en reposo, sin credenciales o si falla la lectura de config
+REFRESH_IDLE_SECONDS = 60.0
+# Reintentos del refresco fallido sin backoff propio (respuesta inválida, etc.)
+REFRESH_RETRY_MAX_SECONDS = 900.0
+
+
 class OpenSkyAuthError(Exception):
     """Raised when authentication with OpenSky fails."""
 
@@ -52,6 +71,18 @@ class OpenSkyAuthenticator:
         self._last_error_at: Optional[float] = None
         timeout = httpx.Timeout(5.0, connect=5.0, read=5.0)
         self._http_client = http_client or httpx.Client(timeout=timeout)
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_lock: Optional[asyncio.Lock] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._refresh_stop: Optional[threading.Event] = None
+        self._refresh_settings: Optional[RefreshSettings] = None
+        self._next_refresh_at: Optional[float] = None
+        self._last_refresh_at: Optional[float] = None
+        self._refresh_failures = 0
+        self._rng = random.Random()
+        self._jitter = 0.0
+        self._jitter_token: Optional[float] = None
 
     def close(self) -> None:
         self._http_client.close()
@@ -86,35 +117,199 @@ class OpenSkyAuthenticator:
         if not self.credentials_configured():
             return None
         now = time.time()
-        if now < self._backoff_until:
-            raise OpenSkyAuthError("backoff_active", retry_after=int(self._backoff_until - now))
+        self._check_backoff(now)
         with self._lock:
-            resolved_url = (token_url or DEFAULT_TOKEN_URL).strip() or DEFAULT_TOKEN_URL
-            resolved_scope = scope.strip() if isinstance(scope, str) and scope.strip() else None
-            if self._token_info and (
-                self._token_info.token_url != resolved_url
-                or self._token_info.scope != resolved_scope
-            ):
-                self._token_info = None
-            if not force_refresh and self._token_info:
-                if self._token_info.expires_at - 60 > now:
-                    return self._token_info.token
+            resolved_url, resolved_scope = self._resolve(token_url, scope)
+            cached = None if force_refresh else self._cached_token(resolved_url, resolved_scope, now)
+            if cached:
+                return cached
             try:
-                token = self._perform_token_request(resolved_url, resolved_scope)
+                response = self._http_client.post(resolved_url, data=self._token_request_data(resolved_scope))
+                token = self._handle_token_response(response, resolved_url, resolved_scope)
             except OpenSkyAuthError:
                 raise
             except Exception as exc:  # noqa: BLE001
-                self._logger.warning("[opensky] token request failed: %s", exc)
-                self._last_error = str(exc)
-                self._last_error_at = now
-                self._schedule_backoff()
-                raise OpenSkyAuthError("token_request_failed") from exc
-            self._last_error = None
-            self._last_error_at = None
-            self._reset_backoff()
+                self._token_request_failed(exc, now)
+            self._token_request_succeeded()
             return token
 
-    def _perform_token_request(self, token_url: str, scope: Optional[str]) -> str:
+    async def get_token_async(
+        self,
+        *,
+        token_url: Optional[str] = None,
+        scope: Optional[str] = None,
+        force_refresh: bool = False,
+    ) -> Optional[str]:
+        """Como :meth:`get_token` pero sin bloquear el event loop.
+
+        Las peticiones concurrentes comparten una única renovación: la primera
+        pide el token y las demás esperan al lock y reutilizan el resultado.
+        """
+
+        if not self.credentials_configured():
+            return None
+        now = time.time()
+        self._check_backoff(now)
+        resolved_url, resolved_scope = self._resolve(token_url, scope)
+        if not force_refresh:
+            cached = self._cached_token(resolved_url, resolved_scope, now)
+            if cached:
+                return cached
+        lock, client = self._async_resources()
+        async with lock:
+            info = self._token_info
+            # Otro coroutine lo ha renovado mientras se esperaba el lock
+            if not force_refresh or (info is not None and info.obtained_at >= now):
+                cached = self._cached_token(resolved_url, resolved_scope, time.time())
+                if cached:
+                    return cached
+            now = time.time()
+            self._check_backoff(now)
+            try:
+                response = await client.post(resolved_url, data=self._token_request_data(resolved_scope))
+                token = self._handle_token_response(response, resolved_url, resolved_scope)
+            except OpenSkyAuthError:
+                raise
+            except Exception as exc:  # noqa: BLE001
+                self._token_request_failed(exc, now)
+            self._token_request_succeeded()
+            return token
+
+    def _async_resources(self) -> Tuple[asyncio.Lock, httpx.AsyncClient]:
+        # Lock y cliente quedan ligados al loop en el que se crean
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop or self._async_lock is None or self._async_client is None:
+            if self._async_client is not None:
+                close_replaced_client(self._async_client, self._async_loop)
+            timeout = httpx.Timeout(5.0, connect=5.0, read=5.0)
+            self._async_lock = asyncio.Lock()
+            self._async_client = httpx.AsyncClient(timeout=timeout)
+            self._async_loop = loop
+        return self._async_lock, self._async_client
+
+    async def aclose(self) -> None:
+        client, self._async_client, self._async_loop = self._async_client, None, None
+        if client is not None:
+            await client.aclose()
+
+    # Background refresh
+    def start_refresher(self, settings_reader: Callable[[], RefreshSettings]) -> None:
+        """Renueva el token antes de que caduque para que ninguna petición espere.
+
+        El token se pide de nuevo al consumir ``fraction`` de su vida, adelantado
+        un tiempo aleatorio de hasta ``jitter_seconds`` para que varias
+        instancias no renueven a la vez.
+        """
+
+        with self._lock:
+            if self._refresh_thread and self._refresh_thread.is_alive():
+                return
+            stop_event = threading.Event()
+            thread = threading.Thread(
+                target=self._refresh_loop,
+                args=(settings_reader, stop_event),
+                name="OpenSkyTokenRefresh",
+                daemon=True,
+            )
+            self._refresh_thread = thread
+            self._refresh_stop = stop_event
+            thread.start()
+
+    def stop_refresher(self) -> None:
+        with self._lock:
+            thread, stop_event = self._refresh_thread, self._refresh_stop
+            self._refresh_thread = None
+            self._refresh_stop = None
+        if stop_event:
+            stop_event.set()
+        if thread and thread.is_alive():
+            thread.join(timeout=5)
+        self._next_refresh_at = None
+
+    def next_refresh_at(self, settings: RefreshSettings, now: float) -> float:
+        """Instante de la próxima renovación según el token actual."""
+
+        info = self._token_info
+        if info is None:
+            return now
+        lifetime = max(0.0, info.expires_at - info.obtained_at)
+        # El margen aleatorio se sortea una vez por token, no en cada consulta
+        if self._jitter_token != info.obtained_at:
+            self._jitter_token = info.obtained_at
+            self._jitter = self._rng.uniform(0.0, 1.0)
+        jitter = self._jitter * max(0.0, settings.jitter_seconds)
+        target = info.obtained_at + lifetime * settings.fraction - jitter
+        # Nunca después del margen en el que get_token lo da por caducado
+        return max(now, min(target, info.expires_at - 60))
+
+    def _refresh_loop(self, settings_reader: Callable[[], RefreshSettings], stop_event: threading.Event) -> None:
+        while not stop_event.is_set():
+            try:
+                settings = settings_reader()
+            except Exception as exc:  # noqa: BLE001
+                self._logger.warning("[opensky] token refresher could not read settings: %s", exc)
+                stop_event.wait(REFRESH_IDLE_SECONDS)
+                continue
+            self._refresh_settings = settings
+            if settings.idle or not self.credentials_configured():
+                self._next_refresh_at = None
+                stop_event.wait(REFRESH_IDLE_SECONDS)
+                continue
+            now = time.time()
+            due = max(self.next_refresh_at(settings, now), self._backoff_until)
+            self._next_refresh_at = due
+            if due > now:
+                # Se despierta también si se invalida el token o cambia la config
+                stop_event.wait(min(due - now, REFRESH_IDLE_SECONDS))
+                continue
+            try:
+                self.get_token(token_url=settings.token_url, scope=settings.scope, force_refresh=True)
+            except OpenSkyAuthError as exc:
+                self._refresh_failures += 1
+                self._logger.warning("[opensky] proactive token refresh failed: %s", exc)
+                stop_event.wait(self._refresh_retry_delay(time.time()))
+                continue
+            self._last_refresh_at = time.time()
+            self._refresh_failures = 0
+
+    def _refresh_retry_delay(self, now: float) -> float:
+        """Espera tras un refresco fallido: el backoff de auth o, si no lo hay, exponencial."""
+
+        exponential = min(REFRESH_IDLE_SECONDS * 2 ** max(0, self._refresh_failures - 1), REFRESH_RETRY_MAX_SECONDS)
+        return max(exponential, self._backoff_until - now)
+
+    def _check_backoff(self, now: float) -> None:
+        if now < self._backoff_until:
+            raise OpenSkyAuthError("backoff_active", retry_after=int(self._backoff_until - now))
+
+    @staticmethod
+    def _resolve(token_url: Optional[str], scope: Optional[str]) -> Tuple[str, Optional[str]]:
+        resolved_url = (token_url or DEFAULT_TOKEN_URL).strip() or DEFAULT_TOKEN_URL
+        resolved_scope = scope.strip() if isinstance(scope, str) and scope.strip() else None
+        return resolved_url, resolved_scope
+
+    def _cached_token(self, token_url: str, scope: Optional[str], now: float) -> Optional[str]:
+        info = self._token_info
+        if info and (info.token_url != token_url or info.scope != scope):
+            self._token_info = None
+            return None
+        if info and info.expires_at - 60 > now:
+            return info.token
+        return None
+
+    def _token_request_failed(self, exc: Exception, now: float) -> NoReturn:
+        self._logger.warning("[opensky] token request failed: %s", exc)
+        self._last_error = str(exc)
+        self._last_error_at = now
+        self._schedule_backoff()
+        raise OpenSkyAuthError("token_request_failed") from exc
+
+    def _token_request_succeeded(self) -> None:
+        self._last_error = None
+        self._last_error_at = None
+        self._reset_backoff()
+
+    def _token_request_data(self, scope: Optional[str]) -> Dict[str, str]:
         client_id = self._secret_store.get_secret("opensky_client_id")
         client_secret = self._secret_store.get_secret("opensky_client_secret")
         if not client_id or not client_secret:
@@ -126,7 +321,9 @@ class OpenSkyAuthenticator:
         }
         if scope:
             data["scope"] = scope
-        response = self._http_client.post(token_url, data=data)
+        return data
+
+    def _handle_token_response(self, response: httpx.Response, token_url: str, scope: Optional[str]) -> str:
         if response.status_code >= 500:
             self._logger.warning("[opensky] auth upstream error %s", response.status_code)
             self._schedule_backoff()
@@ -169,11 +366,22 @@ class OpenSkyAuthenticator:
             remaining = max(0, int(self._token_info.expires_at - now))
             info["token_cached"] = remaining > 0
             info["expires_in_sec"] = remaining if remaining > 0 else 0
+        thread = self._refresh_thread
+        settings = self._refresh_settings
+        info["refresh"] = {
+            "active": bool(thread and thread.is_alive()),
+            "next_in_sec": max(0, int(self._next_refresh_at - now)) if self._next_refresh_at else None,
+            "fraction": settings.fraction if settings else None,
+            "jitter_sec": settings.jitter_seconds if settings else None,
+            "last_refresh_at": self._last_refresh_at,
+            "failures": self._refresh_failures,
+        }
         return info
 
 
 __all__ = [
     "OpenSkyAuthenticator",
     "OpenSkyAuthError",
+    "RefreshSettings",
     "TokenInfo",
 ]
@@ -1,11 +1,40 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-import time
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 import httpx
 
+from .opensky_columns import StateColumns
+
+
+# Cierres pendientes de clientes sustituidos (referencia fuerte hasta terminar)
+_CLOSING: Set["asyncio.Future[Any]"] = set()
+
+
+def close_replaced_client(client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """Cierra un ``AsyncClient`` que se sustituye porque cambió el event loop.
+
+    Sus conexiones pertenecen a ``loop``: si sigue en marcha se cierra allí; si
+    ya terminó se intenta en el loop actual sin propagar errores.
+    """
+
+    async def _aclose() -> None:
+        try:
+            await client.aclose()
+        except Exception:  # noqa: BLE001 - los sockets del loop cerrado ya no sirven
+            pass
+
+    if loop is not None and loop.is_running() and not loop.is_closed():
+        future: "asyncio.Future[Any]" = asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(_aclose(), loop)
+        )
+    else:
+        future = asyncio.get_running_loop().create_task(_aclose())
+    _CLOSING.add(future)
+    future.add_done_callback(_CLOSING.discard)
+
 
 class OpenSkyClientError(Exception):
     def __init__(self, message: str, status: Optional[int] = None) -> None:
@@ -13,6 +42,61 @@ class OpenSkyClientError(Exception):
         self.status = status
 
 
+def _build_request(
+    bbox: Optional[Tuple[float, float, float, float]],
+    extended: int,
+    token: Optional[str],
+) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    params: Dict[str, Any] = {}
+    if bbox:
+        lamin, lamax, lomin, lomax = bbox
+        params.update({
+            "lamin": lamin,
+            "lamax": lamax,
+            "lomin": lomin,
+            "lomax": lomax,
+        })
+    if extended:
+        params["extended"] = 1
+    headers = {}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    return params, headers
+
+
+def _parse_response(response: httpx.Response, logger: logging.Logger) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    remaining_header = response.headers.get("X-Rate-Limit-Remaining")
+    headers_out = {}
+    if remaining_header is not None:
+        headers_out["X-Rate-Limit-Remaining"] = remaining_header
+    if response.status_code == 429:
+        logger.warning("[opensky] rate limit reached (429)")
+        raise OpenSkyClientError("rate_limit", status=429)
+    if response.status_code in {401, 403}:
+        logger.warning(
+            "[opensky] unauthorized response from states endpoint (status %s)",
+            response.status_code,
+        )
+        raise OpenSkyClientError("unauthorized", status=response.status_code)
+    if response.status_code >= 500:
+        logger.warning(
+            "[opensky] upstream error from states endpoint (status %s)",
+            response.status_code,
+        )
+        raise OpenSkyClientError("upstream_error", status=response.status_code)
+    if response.status_code >= 400:
+        logger.warning(
+            "[opensky] client error from states endpoint (status %s)",
+            response.status_code,
+        )
+        raise OpenSkyClientError("client_error", status=response.status_code)
+    payload = response.json()
+    if not isinstance(payload, dict):
+        logger.warning("[opensky] invalid payload received from states endpoint")
+        raise OpenSkyClientError("invalid_payload")
+    return payload, headers_out
+
+
 class OpenSkyClient:
     """HTTP client for OpenSky state vector API."""
 
@@ -32,112 +116,65 @@ class OpenSkyClient:
         extended: int,
         token: Optional[str],
     ) -> Tuple[Dict[str, Any], Dict[str, str]]:
-        params = {}
-        if bbox:
-            lamin, lamax, lomin, lomax = bbox
-            params.update({
-                "lamin": lamin,
-                "lamax": lamax,
-                "lomin": lomin,
-                "lomax": lomax,
-            })
-        if extended:
-            params["extended"] = 1
-        headers = {}
-        if token:
-            headers["Authorization"] = f"Bearer {token}"
+        params, headers = _build_request(bbox, extended, token)
         try:
             response = self._client.get("/states/all", params=params, headers=headers)
         except httpx.HTTPError as exc:  # pragma: no cover - network errors are rare but important
             self._logger.warning("[opensky] fetch failed due to network error: %s", exc)
             raise OpenSkyClientError("network_error") from exc
-        remaining_header = response.headers.get("X-Rate-Limit-Remaining")
-        headers_out = {}
-        if remaining_header is not None:
-            headers_out["X-Rate-Limit-Remaining"] = remaining_header
-        if response.status_code == 429:
-            self._logger.warning("[opensky] rate limit reached (429)")
-            raise OpenSkyClientError("rate_limit", status=429)
-        if response.status_code in {401, 403}:
-            self._logger.warning(
-                "[opensky] unauthorized response from states endpoint (status %s)",
-                response.status_code,
-            )
-            raise OpenSkyClientError("unauthorized", status=response.status_code)
-        if response.status_code >= 500:
-            self._logger.warning(
-                "[opensky] upstream error from states endpoint (status %s)",
-                response.status_code,
-            )
-            raise OpenSkyClientError("upstream_error", status=response.status_code)
-        if response.status_code >= 400:
-            self._logger.warning(
-                "[opensky] client error from states endpoint (status %s)",
-                response.status_code,
-            )
-            raise OpenSkyClientError("client_error", status=response.status_code)
-        payload = response.json()
-        if not isinstance(payload, dict):
-            self._logger.warning("[opensky] invalid payload received from states endpoint")
-            raise OpenSkyClientError("invalid_payload")
-        return payload, headers_out
+        return _parse_response(response, self._logger)
 
     @staticmethod
     def sanitize_states(
         payload: Dict[str, Any],
         max_aircraft: int,
     ) -> Tuple[int, int, List[Dict[str, Any]]]:
-        ts = int(payload.get("time", int(time.time())))
-        states = payload.get("states")
-        if not isinstance(states, Iterable):
-            return ts, 0, []
-        items: List[Dict[str, any]] = []
-        for entry in states:
-            if not isinstance(entry, list) or len(entry) < 17:
-                continue
-            icao24 = (entry[0] or "").strip().lower()
-            callsign = (entry[1] or "").strip()
-            origin_country = (entry[2] or "").strip()
-            time_position = entry[3]
-            last_contact = entry[4]
-            longitude = entry[5]
-            latitude = entry[6]
-            baro_altitude = entry[7]
-            on_ground = bool(entry[8]) if entry[8] is not None else False
-            velocity = entry[9]
-            true_track = entry[10]
-            vertical_rate = entry[11]
-            geo_altitude = entry[13] if len(entry) > 13 else None
-            squawk = entry[14] if len(entry) > 14 else None
-            category = entry[17] if len(entry) > 17 else None
-
-            if latitude is None or longitude is None:
-                continue
-            if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
-                continue
-
-            altitude = geo_altitude if geo_altitude is not None else baro_altitude
-            timestamp = int(last_contact or time_position or ts)
-            item = {
-                "id": icao24 or callsign or f"unknown-{len(items)}",
-                "icao24": icao24 or None,
-                "callsign": callsign or None,
-                "origin_country": origin_country or None,
-                "lon": float(longitude),
-                "lat": float(latitude),
-                "alt": float(altitude) if altitude is not None else None,
-                "velocity": float(velocity) if velocity is not None else None,
-                "vertical_rate": float(vertical_rate) if vertical_rate is not None else None,
-                "track": float(true_track) if true_track is not None else None,
-                "on_ground": on_ground,
-                "squawk": squawk,
-                "category": category,
-                "last_contact": timestamp,
-            }
-            items.append(item)
-        if max_aircraft > 0 and len(items) > max_aircraft:
-            items = items[:max_aircraft]
-        return ts, len(items), items
-
-
-__all__ = ["OpenSkyClient", "OpenSkyClientError"]
+        columns = StateColumns.from_payload(payload, max_aircraft)
+        return columns.ts, len(columns), columns.to_items()
+
+
+class AsyncOpenSkyClient:
+    """Versión asíncrona de :class:`OpenSkyClient` sobre ``httpx.AsyncClient``.
+
+    El ``AsyncClient`` queda ligado al event loop en el que se crea, así que se
+    crea en el primer uso y se recrea si cambia el loop (p. ej. en tests).
+    """
+
+    BASE_URL = OpenSkyClient.BASE_URL
+
+    def __init__(self, logger: Optional[logging.Logger] = None) -> None:
+        self._logger = logger or logging.getLogger("pantalla.backend.opensky.client")
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            if self._client is not None:
+                close_replaced_client(self._client, self._loop)
+            timeout = httpx.Timeout(2.5, connect=2.5, read=2.5)
+            self._client = httpx.AsyncClient(base_url=self.BASE_URL, timeout=timeout)
+            self._loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        client, self._client, self._loop = self._client, None, None
+        if client is not None:
+            await client.aclose()
+
+    async def fetch_states(
+        self,
+        bbox: Optional[Tuple[float, float, float, float]],
+        extended: int,
+        token: Optional[str],
+    ) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        params, headers = _build_request(bbox, extended, token)
+        try:
+            response = await self._get_client().get("/states/all", params=params, headers=headers)
+        except httpx.HTTPError as exc:  # pragma: no cover - network errors are rare but important
+            self._logger.warning("[opensky] fetch failed due to network error: %s", exc)
+            raise OpenSkyClientError("network_error") from exc
+        return _parse_response(response, self._logger)
+
+
+__all__ = ["AsyncOpenSkyClient", "OpenSkyClient", "OpenSkyClientError", "close_replaced_client"]
@@ -0,0 +1,339 @@
+"""Representación columnar de los vectores de estado de OpenSky.
+
+``/states/all`` devuelve una lista de listas; recorrerla fila a fila y montar
+un dict de 15 claves por aeronave es caro en modo global (miles de aeronaves
+cada 5 s). Aquí se transpone una sola vez a arrays numpy por campo y el
+filtrado de posiciones inválidas, el recorte y las conversiones se hacen
+vectorizados. Los items y las features GeoJSON se generan directamente desde
+las columnas.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from itertools import islice, zip_longest
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Índices de /states/all
+_ICAO24, _CALLSIGN, _COUNTRY, _TIME_POSITION, _LAST_CONTACT = 0, 1, 2, 3, 4
+_LON, _LAT, _BARO_ALT, _ON_GROUND, _VELOCITY, _TRACK, _VRATE = 5, 6, 7, 8, 9, 10, 11
+_GEO_ALT, _SQUAWK, _CATEGORY = 13, 14, 17
+_STATE_WIDTH = 18
+_MIN_STATE_LEN = 17
+
+ITEM_KEYS = (
+    "id",
+    "icao24",
+    "callsign",
+    "origin_country",
+    "lon",
+    "lat",
+    "alt",
+    "velocity",
+    "vertical_rate",
+    "track",
+    "on_ground",
+    "squawk",
+    "category",
+    "last_contact",
+)
+
+BBox = Tuple[float, float, float, float]  # (lamin, lamax, lomin, lomax)
+
+
+def _float_column(values: Sequence[Any]) -> np.ndarray:
+    """Columna numérica con ``None``/basura como NaN."""
+
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        result = np.full(len(values), np.nan)
+        for index, value in enumerate(values):
+            try:
+                result[index] = float(value)
+            except (TypeError, ValueError):
+                pass
+        return result
+
+
+def _text_column(values: Sequence[Any]) -> List[str]:
+    try:
+        return [(value or "").strip() for value in values]
+    except AttributeError:
+        return [value.strip() if isinstance(value, str) else "" for value in values]
+
+
+def _object_array(values: Sequence[Any]) -> np.ndarray:
+    result = np.empty(len(values), dtype=object)
+    result[:] = values
+    return result
+
+
+def _nullable(values: np.ndarray) -> List[Optional[float]]:
+    return [None if value != value else value for value in values.tolist()]
+
+
+@dataclass(frozen=True)
+class StateColumns:
+    """Aeronaves válidas de un snapshot, una columna por campo."""
+
+    ts: int
+    icao24: np.ndarray
+    callsign: np.ndarray
+    origin_country: np.ndarray
+    lat: np.ndarray
+    lon: np.ndarray
+    alt: np.ndarray
+    velocity: np.ndarray
+    vertical_rate: np.ndarray
+    track: np.ndarray
+    on_ground: np.ndarray
+    squawk: np.ndarray
+    category: np.ndarray
+    last_contact: np.ndarray
+
+    def __len__(self) -> int:
+        return int(self.lat.shape[0])
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any], max_aircraft: int = 0) -> "StateColumns":
+        ts = int(payload.get("time", int(time.time())))
+        states = payload.get("states")
+        if not isinstance(states, Iterable):
+            return cls.empty(ts)
+        rows = [entry for entry in states if isinstance(entry, list) and len(entry) >= _MIN_STATE_LEN]
+        if not rows:
+            return cls.empty(ts)
+        columns = list(islice(zip_longest(*rows), _STATE_WIDTH))
+        # ``category`` sólo viene con extended=1
+        columns.extend([(None,) * len(rows)] * (_STATE_WIDTH - len(columns)))
+
+        lat = _float_column(columns[_LAT])
+        lon = _float_column(columns[_LON])
+        valid = (
+            np.isfinite(lat)
+            & np.isfinite(lon)
+            & (lat >= -90.0)
+            & (lat <= 90.0)
+            & (lon >= -180.0)
+            & (lon <= 180.0)
+        )
+        index = np.flatnonzero(valid)
+        if max_aircraft > 0 and index.shape[0] > max_aircraft:
+            index = index[:max_aircraft]
+
+        selected = None if index.shape[0] == len(rows) else index.tolist()
+
+        def numeric(position: int) -> np.ndarray:
+            column = _float_column(columns[position])
+            return column if selected is None else column[index]
+
+        def values(position: int) -> Sequence[Any]:
+            column = columns[position]
+            return column if selected is None else [column[row] for row in selected]
+
+        geo_alt, baro_alt = numeric(_GEO_ALT), numeric(_BARO_ALT)
+        last_contact, time_position = numeric(_LAST_CONTACT), numeric(_TIME_POSITION)
+        # Igual que ``last_contact or time_position or ts``: 0 y None no cuentan
+        contact = np.where(
+            np.isfinite(last_contact) & (last_contact != 0),
+            last_contact,
+            np.where(np.isfinite(time_position) & (time_position != 0), time_position, float(ts)),
+        )
+        track = numeric(_TRACK)
+        on_ground = np.nan_to_num(numeric(_ON_GROUND), nan=0.0) != 0.0
+
+        return cls(
+            ts=ts,
+            icao24=_object_array([value.lower() for value in _text_column(values(_ICAO24))]),
+            callsign=_object_array(_text_column(values(_CALLSIGN))),
+            origin_country=_object_array(_text_column(values(_COUNTRY))),
+            lat=lat if selected is None else lat[index],
+            lon=lon if selected is None else lon[index],
+            alt=np.where(np.isfinite(geo_alt), geo_alt, baro_alt),
+            velocity=numeric(_VELOCITY),
+            vertical_rate=numeric(_VRATE),
+            track=np.where(np.isfinite(track), np.mod(track, 360.0), np.nan),
+            on_ground=on_ground,
+            squawk=_object_array(values(_SQUAWK)),
+            category=_object_array(values(_CATEGORY)),
+            last_contact=contact.astype(np.int64),
+        )
+
+    @classmethod
+    def from_items(cls, items: Sequence[Dict[str, Any]], ts: int) -> "StateColumns":
+        """Columnas alineadas con items ya saneados (p. ej. fusionados de varios proveedores)."""
+
+        if not items:
+            return cls.empty(ts)
+
+        def numeric(key: str) -> np.ndarray:
+            return _float_column([item.get(key) for item in items])
+
+        def texts(key: str) -> np.ndarray:
+            return _object_array([item.get(key) or "" for item in items])
+
+        return cls(
+            ts=ts,
+            icao24=texts("icao24"),
+            callsign=texts("callsign"),
+            origin_country=texts("origin_country"),
+            lat=numeric("lat"),
+            lon=numeric("lon"),
+            alt=numeric("alt"),
+            velocity=numeric("velocity"),
+            vertical_rate=numeric("vertical_rate"),
+            track=numeric("track"),
+            on_ground=np.array([bool(item.get("on_ground")) for item in items], dtype=bool),
+            squawk=_object_array([item.get("squawk") for item in items]),
+            category=_object_array([item.get("category") for item in items]),
+            last_contact=np.array([int(item.get("last_contact") or ts) for item in items], dtype=np.int64),
+        )
+
+    @classmethod
+    def empty(cls, ts: int = 0) -> "StateColumns":
+        text = np.empty(0, dtype=object)
+        number = np.empty(0, dtype=np.float64)
+        return cls(
+            ts=ts,
+            icao24=text,
+            callsign=text,
+            origin_country=text,
+            lat=number,
+            lon=number,
+            alt=number,
+            velocity=number,
+            vertical_rate=number,
+            track=number,
+            on_ground=np.empty(0, dtype=bool),
+            squawk=text,
+            category=text,
+            last_contact=np.empty(0, dtype=np.int64),
+        )
+
+    def take(self, index: Any) -> "StateColumns":
+        """Subconjunto por índices o máscara booleana (mantiene el orden)."""
+
+        return StateColumns(
+            ts=self.ts,
+            **{
+                name: getattr(self, name)[index]
+                for name in (
+                    "icao24",
+                    "callsign",
+                    "origin_country",
+                    "lat",
+                    "lon",
+                    "alt",
+                    "velocity",
+                    "vertical_rate",
+                    "track",
+                    "on_ground",
+                    "squawk",
+                    "category",
+                    "last_contact",
+                )
+            },
+        )
+
+    def within(self, bbox: BBox) -> "StateColumns":
+        lamin, lamax, lomin, lomax = bbox
+        return self.take((self.lat >= lamin) & (self.lat <= lamax) & (self.lon >= lomin) & (self.lon <= lomax))
+
+    def to_items(self) -> List[Dict[str, Any]]:
+        """Items en el formato histórico de ``sanitize_states``."""
+
+        icao24 = self.icao24.tolist()
+        callsign = self.callsign.tolist()
+        ids = [
+            code or sign or f"unknown-{position}"
+            for position, (code, sign) in enumerate(zip(icao24, callsign))
+        ]
+        # Dict literal por fila: bastante más rápido que dict(zip(ITEM_KEYS, row))
+        return [
+            {
+                "id": item_id,
+                "icao24": code or None,
+                "callsign": sign or None,
+                "origin_country": country or None,
+                "lon": lon,
+                "lat": lat,
+                "alt": alt,
+                "velocity": velocity,
+                "vertical_rate": vertical_rate,
+                "track": track,
+                "on_ground": on_ground,
+                "squawk": squawk,
+                "category": category,
+                "last_contact": last_contact,
+            }
+            for (
+                item_id,
+                code,
+                sign,
+                country,
+                lon,
+                lat,
+                alt,
+                velocity,
+                vertical_rate,
+                track,
+                on_ground,
+                squawk,
+                category,
+                last_contact,
+            ) in zip(
+                ids,
+                icao24,
+                callsign,
+                self.origin_country.tolist(),
+                self.lon.tolist(),
+                self.lat.tolist(),
+                _nullable(self.alt),
+                _nullable(self.velocity),
+                _nullable(self.vertical_rate),
+                _nullable(self.track),
+                self.on_ground.tolist(),
+                self.squawk.tolist(),
+                self.category.tolist(),
+                self.last_contact.tolist(),
+            )
+        ]
+
+
+def features_from_columns(
+    columns: StateColumns,
+    items: Sequence[Dict[str, Any]],
+    lat: Optional[np.ndarray] = None,
+    lon: Optional[np.ndarray] = None,
+    dr_seconds: Optional[np.ndarray] = None,
+) -> List[Dict[str, Any]]:
+    """Features GeoJSON con coordenadas tomadas de las columnas.
+
+    ``items`` son los dicts de ``to_items`` (alineados con las columnas) y se
+    usan tal cual como ``properties``; sólo se copian los que llevan posición
+    estimada, para añadir ``dr_seconds`` sin tocar el snapshot cacheado.
+    """
+
+    lat_values = (columns.lat if lat is None else lat).tolist()
+    lon_values = (columns.lon if lon is None else lon).tolist()
+    if dr_seconds is None:
+        return [
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": [x, y]}, "properties": item}
+            for x, y, item in zip(lon_values, lat_values, items)
+        ]
+    applied = dr_seconds.tolist()
+    return [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [x, y]},
+            "properties": dict(item, dr_seconds=int(seconds)) if seconds > 0 else item,
+        }
+        for x, y, seconds, item in zip(lon_values, lat_values, applied, items)
+    ]
+
+
+__all__ = ["ITEM_KEYS", "StateColumns", "features_from_columns"]
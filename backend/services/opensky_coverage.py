@@ -0,0 +1,207 @@
+"""Reutilización de snapshots OpenSky que cubren la zona pedida.
+
+Cada bbox distinta del frontend (y la de transporte cercano) tenía su propia
+clave de caché y su propia llamada a OpenSky. Aquí se guardan los snapshots
+recientes junto con un índice en rejilla de sus aeronaves: si la zona pedida
+cae dentro de un área aún vigente se recorta en local consultando sólo las
+celdas que la tocan, y sólo se va a OpenSky cuando no hay nada que la cubra.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from dataclasses import replace
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .opensky_service import Snapshot
+
+BBox = Tuple[float, float, float, float]  # (lamin, lamax, lomin, lomax)
+
+DEFAULT_CELL_DEG = 1.0
+DEFAULT_MAX_ENTRIES = 8
+
+
+def bbox_contains(outer: Optional[BBox], inner: Optional[BBox]) -> bool:
+    """``None`` representa el mundo entero."""
+
+    if outer is None:
+        return True
+    if inner is None:
+        return False
+    return outer[0] <= inner[0] and inner[1] <= outer[1] and outer[2] <= inner[2] and inner[3] <= outer[3]
+
+
+class CoverageEntry:
+    """Snapshot de un área con sus aeronaves indexadas por celda."""
+
+    __slots__ = ("snapshot", "area", "extended", "expires_at", "complete", "cell_deg", "_cells")
+
+    def __init__(
+        self,
+        snapshot: "Snapshot",
+        area: Optional[BBox],
+        extended: int,
+        expires_at: float,
+        complete: bool = True,
+        cell_deg: float = DEFAULT_CELL_DEG,
+    ) -> None:
+        self.snapshot = snapshot
+        self.area = area
+        self.extended = extended
+        self.expires_at = expires_at
+        # Un snapshot recortado a max_aircraft no sirve para sub-zonas
+        self.complete = complete
+        self.cell_deg = cell_deg
+        # Celda -> posiciones en payload["items"] (y en las columnas, si las hay)
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        for position, item in enumerate(snapshot.payload.get("items") or []):
+            self._cells.setdefault(self._cell_of(item["lat"], item["lon"]), []).append(position)
+
+    def _cell_of(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def covers(self, bbox: Optional[BBox], extended: int, now: float) -> bool:
+        return now < self.expires_at and extended <= self.extended and bbox_contains(self.area, bbox)
+
+    def indices_in(self, bbox: BBox) -> List[int]:
+        """Posiciones de las aeronaves dentro de ``bbox``, en su orden original."""
+
+        lamin, lamax, lomin, lomax = bbox
+        items = self.snapshot.payload.get("items") or []
+        row_lo, col_lo = self._cell_of(lamin, lomin)
+        row_hi, col_hi = self._cell_of(lamax, lomax)
+        result: List[int] = []
+        if (row_hi - row_lo + 1) * (col_hi - col_lo + 1) > len(self._cells):
+            # Zona grande frente a las celdas ocupadas: se recorren éstas
+            candidates = [
+                bucket
+                for (row, col), bucket in self._cells.items()
+                if row_lo <= row <= row_hi and col_lo <= col <= col_hi
+            ]
+        else:
+            candidates = [
+                self._cells[(row, col)]
+                for row in range(row_lo, row_hi + 1)
+                for col in range(col_lo, col_hi + 1)
+                if (row, col) in self._cells
+            ]
+        for bucket in candidates:
+            for position in bucket:
+                item = items[position]
+                if lamin <= item["lat"] <= lamax and lomin <= item["lon"] <= lomax:
+                    result.append(position)
+        result.sort()
+        return result
+
+    def items_in(self, bbox: BBox) -> List[Dict[str, Any]]:
+        items = self.snapshot.payload.get("items") or []
+        return [items[position] for position in self.indices_in(bbox)]
+
+    def filtered(self, bbox: Optional[BBox], max_aircraft: int = 0) -> "Snapshot":
+        """Snapshot nuevo recortado a ``bbox`` (el original no se toca)."""
+
+        all_items = self.snapshot.payload.get("items") or []
+        if bbox is None or bbox == self.area:
+            indices: List[int] = list(range(len(all_items)))
+        else:
+            indices = self.indices_in(bbox)
+        if max_aircraft > 0 and len(indices) > max_aircraft:
+            indices = indices[:max_aircraft]
+        items = [all_items[position] for position in indices]
+        columns = self.snapshot.columns
+        if columns is not None:
+            columns = columns.take(indices)
+        payload = dict(self.snapshot.payload, items=items, count=len(items))
+        mode = "global" if bbox is None else "bbox"
+        return replace(self.snapshot, payload=payload, polled=False, mode=mode, bbox=bbox, columns=columns)
+
+
+class CoverageIndex:
+    """Últimos snapshots por área, para responder sub-zonas sin ir a OpenSky."""
+
+    def __init__(self, cell_deg: float = DEFAULT_CELL_DEG, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.cell_deg = float(cell_deg)
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[Optional[BBox], int], CoverageEntry] = {}
+        self.hits = 0
+        self.covered = 0
+        self.misses = 0
+
+    def add(
+        self,
+        snapshot: "Snapshot",
+        area: Optional[BBox],
+        extended: int,
+        ttl_seconds: float,
+        complete: bool = True,
+    ) -> CoverageEntry:
+        entry = CoverageEntry(
+            snapshot,
+            area,
+            extended,
+            snapshot.fetched_at + max(0.0, ttl_seconds),
+            complete=complete,
+            cell_deg=self.cell_deg,
+        )
+        with self._lock:
+            self._entries[(area, extended)] = entry
+            now = time.time()
+            for key in [key for key, value in self._entries.items() if value.expires_at <= now]:
+                del self._entries[key]
+            while len(self._entries) > self.max_entries:
+                oldest = min(self._entries, key=lambda key: self._entries[key].snapshot.fetched_at)
+                del self._entries[oldest]
+        return entry
+
+    def lookup(
+        self,
+        bbox: Optional[BBox],
+        extended: int,
+        max_aircraft: int = 0,
+        now: Optional[float] = None,
+    ) -> Optional["Snapshot"]:
+        """Recorta el snapshot vigente más reciente que cubra ``bbox``."""
+
+        now = time.time() if now is None else now
+        with self._lock:
+            candidates = [
+                entry
+                for entry in self._entries.values()
+                if entry.complete and entry.area != bbox and entry.covers(bbox, extended, now)
+            ]
+        if not candidates:
+            return None
+        best = max(candidates, key=lambda entry: entry.snapshot.fetched_at)
+        return best.filtered(bbox, max_aircraft)
+
+    def record(self, outcome: str) -> None:
+        """Contabiliza una petición: ``hit`` (misma clave), ``covered`` o ``miss``."""
+
+        with self._lock:
+            if outcome == "hit":
+                self.hits += 1
+            elif outcome == "covered":
+                self.covered += 1
+            else:
+                self.misses += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def describe(self) -> Dict[str, Any]:
+        total = self.hits + self.covered + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "covered": self.covered,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.covered) / total, 3) if total else None,
+        }
+
+
+__all__ = ["CoverageEntry", "CoverageIndex", "bbox_contains"]
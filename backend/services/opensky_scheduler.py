@@ -0,0 +1,197 @@
+"""Planificación del sondeo de OpenSky según los créditos disponibles.
+
+OpenSky asigna un cupo diario de créditos que se reinicia a las 00:00 UTC y
+cada consulta a ``/states/all`` cuesta de 1 a 4 créditos según el área. El
+intervalo base reparte los créditos restantes (``X-Rate-Limit-Remaining``)
+entre las consultas que caben hasta el reinicio; sobre él se aplican factores
+de actividad: más rápido con el mapa a la vista o mucho tráfico, más lento de
+noche o con la pantalla inactiva. Como el reparto se recalcula con cada
+respuesta, lo que se gasta de más mientras el mapa está visible se compensa
+solo después.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+BBox = Tuple[float, float, float, float]  # (lamin, lamax, lomin, lomax)
+
+# Peticiones de la capa recientes => el mapa se está mostrando
+VISIBLE_WINDOW_SECONDS = 90
+# Sin peticiones durante este tiempo => pantalla inactiva
+IDLE_AFTER_SECONDS = 900
+DENSE_TRAFFIC_AIRCRAFT = 300
+
+FACTORS: Dict[str, float] = {
+    "visible": 0.5,
+    "dense": 0.75,
+    "night": 3.0,
+    "idle": 4.0,
+}
+
+
+def credit_cost(bbox: Optional[BBox]) -> int:
+    """Créditos por consulta a ``/states/all`` según el área (en grados²)."""
+
+    if bbox is None:
+        return 4
+    lamin, lamax, lomin, lomax = bbox
+    area = abs(lamax - lamin) * abs(lomax - lomin)
+    if area <= 25:
+        return 1
+    if area <= 100:
+        return 2
+    if area <= 400:
+        return 3
+    return 4
+
+
+def seconds_until_reset(now: float) -> float:
+    current = datetime.fromtimestamp(now, tz=timezone.utc)
+    reset = (current + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(1.0, (reset - current).total_seconds())
+
+
+def parse_remaining(value: Optional[str]) -> Optional[int]:
+    try:
+        return max(0, int(str(value).strip()))
+    except (TypeError, ValueError):
+        return None
+
+
+def in_hours(hour: int, window: Sequence[int]) -> bool:
+    """``window`` es ``(inicio, fin)`` en horas locales; admite cruzar medianoche."""
+
+    start, end = window
+    if start == end:
+        return False
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+@dataclass(frozen=True)
+class PollDecision:
+    interval: float
+    reason: str
+    remaining: Optional[int] = None
+    cost: int = 1
+    budget_interval: Optional[float] = None
+    factor: float = 1.0
+    signals: Tuple[str, ...] = field(default_factory=tuple)
+    decided_at: float = 0.0
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "interval": round(self.interval, 1),
+            "reason": self.reason,
+            "remaining_credits": self.remaining,
+            "credits_per_poll": self.cost,
+            "budget_interval": round(self.budget_interval, 1) if self.budget_interval is not None else None,
+            "activity_factor": self.factor,
+            "signals": list(self.signals),
+            "decided_at": self.decided_at,
+        }
+
+
+class PollScheduler:
+    """Decide cada cuánto sondear; sin estado salvo la última decisión."""
+
+    def __init__(self, reserve: float = 0.1) -> None:
+        # Parte del cupo que se deja para consultas bajo demanda (zonas no cubiertas)
+        self.reserve = min(0.9, max(0.0, float(reserve)))
+        self.last: Optional[PollDecision] = None
+
+    def decide(
+        self,
+        *,
+        min_interval: float,
+        max_interval: float,
+        remaining: Optional[int],
+        cost: int,
+        last_view_at: Optional[float],
+        aircraft: Optional[int],
+        local_hour: Optional[int],
+        night_hours: Sequence[int] = (0, 6),
+        now: Optional[float] = None,
+    ) -> PollDecision:
+        now = time.time() if now is None else now
+        max_interval = max(min_interval, max_interval)
+        until_reset = seconds_until_reset(now)
+
+        if remaining is not None and remaining < cost:
+            # Sin créditos: esperar al reinicio (revisando de vez en cuando)
+            interval = min(until_reset, max(max_interval, 3600.0))
+            decision = PollDecision(
+                interval=interval,
+                reason=f"no credits left; waiting {int(interval)}s for the daily reset",
+                remaining=remaining,
+                cost=cost,
+                decided_at=now,
+            )
+            self.last = decision
+            return decision
+
+        budget_interval: Optional[float] = None
+        if remaining is not None:
+            usable = remaining * (1.0 - self.reserve)
+            polls = max(1.0, usable / max(1, cost))
+            budget_interval = until_reset / polls
+
+        signals = []
+        idle = last_view_at is None or now - last_view_at > IDLE_AFTER_SECONDS
+        if idle:
+            signals.append("idle")
+        elif now - last_view_at <= VISIBLE_WINDOW_SECONDS:
+            signals.append("visible")
+        if aircraft is not None and aircraft >= DENSE_TRAFFIC_AIRCRAFT:
+            signals.append("dense")
+        if local_hour is not None and in_hours(local_hour, night_hours):
+            signals.append("night")
+        factor = 1.0
+        for signal in signals:
+            factor *= FACTORS[signal]
+
+        base = budget_interval if budget_interval is not None else min_interval
+        raw = base * factor
+        interval = min(max(raw, min_interval), max_interval)
+
+        if budget_interval is not None:
+            reason = (
+                f"{remaining} credits at {cost}/poll over {int(until_reset)}s to reset "
+                f"-> every {budget_interval:.0f}s"
+            )
+        else:
+            reason = f"credits unknown -> base {min_interval:.0f}s"
+        if signals:
+            reason += f"; {', '.join(signals)} x{factor:g}"
+        if raw < min_interval:
+            reason += f"; clamped to minimum {min_interval:.0f}s"
+        elif raw > max_interval:
+            reason += f"; clamped to maximum {max_interval:.0f}s"
+
+        decision = PollDecision(
+            interval=interval,
+            reason=reason,
+            remaining=remaining,
+            cost=cost,
+            budget_interval=budget_interval,
+            factor=factor,
+            signals=tuple(signals),
+            decided_at=now,
+        )
+        self.last = decision
+        return decision
+
+
+__all__ = [
+    "PollDecision",
+    "PollScheduler",
+    "credit_cost",
+    "in_hours",
+    "parse_remaining",
+    "seconds_until_reset",
+]
@@ -1,18 +1,25 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import threading
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 from urllib.parse import urlparse
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from ..models import AppConfig, OpenSkyProviderConfig
 from ..secret_store import SecretStore
 from .cache import TTLCache
-from .opensky_auth import DEFAULT_TOKEN_URL, OpenSkyAuthError, OpenSkyAuthenticator
-from .opensky_client import OpenSkyClient, OpenSkyClientError
+from .flight_ingest import FlightIngestor
+from .flight_tracks import FlightTrackStore, track_to_feature
+from .opensky_auth import DEFAULT_TOKEN_URL, OpenSkyAuthError, OpenSkyAuthenticator, RefreshSettings
+from .opensky_client import AsyncOpenSkyClient, OpenSkyClient, OpenSkyClientError
+from .opensky_columns import StateColumns
+from .opensky_coverage import CoverageEntry, CoverageIndex
+from .opensky_scheduler import PollDecision, PollScheduler, credit_cost, parse_remaining, seconds_until_reset
 
 
 @dataclass
@@ -24,6 +31,29 @@ class Snapshot:
     polled: bool = False
     mode: str = "bbox"
     bbox: Optional[Tuple[float, float, float, float]] = None
+    # Columnas numpy alineadas con payload["items"] (si el snapshot viene de OpenSky)
+    columns: Optional[StateColumns] = None
+
+
+BBox = Tuple[float, float, float, float]  # (lamin, lamax, lomin, lomax)
+
+# Espera del poller mientras la capa está desactivada
+DISABLED_POLL_SECONDS = 30
+# Margen de vida del snapshot publicado sobre el siguiente sondeo previsto; si
+# el poller no lo renueva a tiempo las peticiones vuelven a consultar por su cuenta
+PUBLISH_GRACE_SECONDS = 30
+
+
+@dataclass(frozen=True)
+class _Request:
+    bbox: Optional[BBox]
+    extended: int
+    max_aircraft: int
+    poll_seconds: int
+    has_token: bool
+    mode: str
+    effective_mode: str
+    cache_key: str
 
 
 class OpenSkyService:
@@ -38,6 +68,9 @@ class OpenSkyService:
         self._secret_store = secret_store
         self._auth = OpenSkyAuthenticator(secret_store, self._logger)
         self._client = OpenSkyClient(self._logger)
+        self._async_client = AsyncOpenSkyClient(self._logger)
+        self._async_lock: Optional[asyncio.Lock] = None
+        self._async_lock_loop: Optional[asyncio.AbstractEventLoop] = None
         self._cache: TTLCache[Snapshot] = TTLCache()
         self._snapshots: Dict[str, Snapshot] = {}
         self._lock = threading.Lock()
@@ -48,6 +81,23 @@ class OpenSkyService:
         self._backoff_until: float = 0.0
         self._backoff_step: int = 0
         self._last_rate_limit_hint: Optional[str] = None
+        self._poller_lock = threading.Lock()
+        self._poller_thread: Optional[threading.Thread] = None
+        self._poller_stop: Optional[threading.Event] = None
+        self._published: Optional[CoverageEntry] = None
+        self._coverage = CoverageIndex()
+        self._next_poll_at: Optional[float] = None
+        self._scheduler = PollScheduler()
+        # Última petición de la capa (frontend o transporte): indica si el mapa está a la vista
+        self._last_view_at: Optional[float] = None
+        self._tracks = FlightTrackStore()
+        self._tracks_enabled = True
+        self._tracks_lock = threading.Lock()
+        self._ingestor: Optional[FlightIngestor] = None
+        self._publish_lock = threading.RLock()
+        self._published_request: Optional[_Request] = None
+        self._publish_listener: Optional[Callable[[List[str]], None]] = None
+        self._published_codes: Set[str] = set()
 
     def _build_key(self, bbox: Optional[Tuple[float, float, float, float]], extended: int, max_aircraft: int) -> str:
         bbox_part = "global" if not bbox else ",".join(f"{value:.4f}" for value in bbox)
@@ -83,167 +133,627 @@ class OpenSkyService:
         self._backoff_step = 0
         self._backoff_until = 0.0
 
-    def get_snapshot(
+    def _resolve_request(
         self,
         config: AppConfigV2,
         bbox: Optional[Tuple[float, float, float, float]],
         extended_override: Optional[int] = None,
-    ) -> Snapshot:
+    ) -> Optional[_Request]:
+        """Normaliza los parámetros de una petición (``None`` si la capa está desactivada)."""
+
         layers = getattr(config, "layers", None)
         flights_config = getattr(layers, "flights", None) if layers else None
         if not flights_config or not flights_config.enabled or flights_config.provider != "opensky":
-            print(f"[DEBUG_OPENSKY] Disabled or wrong provider. Enabled={flights_config.enabled if flights_config else 'None'}, Provider={flights_config.provider if flights_config else 'None'}")
-            return Snapshot(payload={"count": 0, "disabled": True}, fetched_at=time.time(), stale=False)
+            return None
         opensky_cfg = flights_config.opensky or OpenSkyProviderConfig()
-        max_aircraft = getattr(flights_config, "max_items_global", 2000)
+        max_aircraft = int(getattr(flights_config, "max_items_global", 2000))
+        self._configure_tracks(flights_config)
         poll_seconds, has_token = self._compute_poll_seconds(config)
         extended_default = getattr(opensky_cfg, "extended", 0)
         extended = int(extended_override if extended_override is not None else extended_default)
         extended = 1 if extended else 0
         bbox_to_use = bbox
         mode = getattr(opensky_cfg, "mode", "bbox")
-        if mode == "bbox" and not bbox_to_use:
-            area = getattr(opensky_cfg, "bbox", None)
-            if area:
-                bbox_to_use = (
-                    float(area.lamin),
-                    float(area.lamax),
-                    float(area.lomin),
-                    float(area.lomax),
-                )
-            else:
-                bbox_to_use = (36.0, 44.0, -10.0, 5.0)
+        # ``mode`` es el modo de autenticación; una bbox configurada también
+        # delimita las peticiones sin zona (y el área del poller)
+        if not bbox_to_use and (mode == "bbox" or getattr(opensky_cfg, "bbox", None)):
+            bbox_to_use = self._configured_area(opensky_cfg)
         elif mode == "global":
             bbox_to_use = None
-        
+
         # print(f"[DEBUG_OPENSKY] Mode={mode}, BBox={bbox_to_use}, Extended={extended}")
 
         effective_mode = "global" if bbox_to_use is None else "bbox"
-        cache_key = self._build_key(bbox_to_use, extended, int(max_aircraft))
-        cached = self._cache.get(cache_key)
+        return _Request(
+            bbox=bbox_to_use,
+            extended=extended,
+            max_aircraft=max_aircraft,
+            poll_seconds=poll_seconds,
+            has_token=has_token,
+            mode=mode,
+            effective_mode=effective_mode,
+            cache_key=self._build_key(bbox_to_use, extended, max_aircraft),
+        )
+
+    def _configure_tracks(self, flights_config: Any) -> None:
+        points = int(getattr(flights_config, "track_points", 64))
+        self._tracks_enabled = points > 0
+        with self._tracks_lock:
+            if not self._tracks_enabled:
+                self._tracks.clear()
+                return
+            max_aircraft = int(getattr(flights_config, "track_max_aircraft", 2000))
+            expire_seconds = 60.0 * int(getattr(flights_config, "track_expire_minutes", 10))
+            if (points, max_aircraft, expire_seconds) != (
+                self._tracks.max_points,
+                self._tracks.max_aircraft,
+                self._tracks.expire_seconds,
+            ):
+                self._tracks.configure(points, max_aircraft, expire_seconds)
+
+    def get_track(self, icao24: str) -> Optional[Dict[str, Any]]:
+        """Historial reciente de una aeronave como Feature LineString (``None`` si no hay)."""
+
+        icao24 = icao24.strip().lower()
+        with self._tracks_lock:
+            points = self._tracks.get(icao24, since=time.time() - self._tracks.expire_seconds)
+        if not points:
+            return None
+        return track_to_feature(icao24, points)
+
+    def get_trails(self, icao24s: Any, max_points: Optional[int] = None) -> Dict[str, List[Tuple[float, ...]]]:
+        """Puntos ``(ts, lat, lon, alt)`` de varias aeronaves de una vez."""
+
+        with self._tracks_lock:
+            # Mismo corte que get_track: una estela no debe mostrar lo que /track ya no da
+            return self._tracks.get_many(icao24s, max_points, since=time.time() - self._tracks.expire_seconds)
+
+    @staticmethod
+    def _configured_area(opensky_cfg: Any) -> Tuple[float, float, float, float]:
+        area = getattr(opensky_cfg, "bbox", None)
+        if area:
+            return (
+                float(area.lamin),
+                float(area.lamax),
+                float(area.lomin),
+                float(area.lomax),
+            )
+        return (36.0, 44.0, -10.0, 5.0)
+
+    def get_snapshot(
+        self,
+        config: AppConfigV2,
+        bbox: Optional[Tuple[float, float, float, float]],
+        extended_override: Optional[int] = None,
+    ) -> Snapshot:
+        self._last_view_at = time.time()
+        request = self._resolve_request(config, bbox, extended_override)
+        answer = self._answer_without_fetch(config, request)
+        if answer is not None:
+            return answer
+        with self._lock:
+            cached = self._cache.get(request.cache_key)
+            if cached:
+                return cached
+            return self._fetch_locked(config, request, time.time())
+
+    async def get_snapshot_async(
+        self,
+        config: AppConfigV2,
+        bbox: Optional[Tuple[float, float, float, float]],
+        extended_override: Optional[int] = None,
+    ) -> Snapshot:
+        """Como :meth:`get_snapshot`, pero la consulta a OpenSky no bloquea el loop.
+
+        Un lock asyncio hace de single-flight: las peticiones que llegan
+        mientras otra consulta la misma zona esperan y reutilizan su resultado.
+        El poller y :meth:`get_snapshot` consultan con ``self._lock`` tomado, así
+        que antes de salir a OpenSky se vuelve a mirar con ese lock (fuera del
+        loop), esperando a la consulta síncrona que esté en curso.
+        """
+
+        self._last_view_at = time.time()
+        request = self._resolve_request(config, bbox, extended_override)
+        answer = self._answer_without_fetch(config, request)
+        if answer is not None:
+            return answer
+        async with self._get_async_lock():
+            answer = await asyncio.to_thread(self._recheck_synchronized, request)
+            if answer is not None:
+                return answer
+            return await self._fetch_async(config, request, time.time())
+
+    def _recheck_synchronized(self, request: _Request) -> Optional[Snapshot]:
+        with self._lock:
+            published = self._published_for(request)
+            if published is not None:
+                return published
+            return self._cache.get(request.cache_key)
+
+    def _get_async_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._async_lock is None or self._async_lock_loop is not loop:
+            self._async_lock = asyncio.Lock()
+            self._async_lock_loop = loop
+        return self._async_lock
+
+    def _answer_without_fetch(self, config: AppConfigV2, request: Optional[_Request]) -> Optional[Snapshot]:
+        """Respuesta sin ir a OpenSky (desactivado, publicado, caché, backoff) o ``None``."""
+
+        if request is None:
+            layers = getattr(config, "layers", None)
+            flights_config = getattr(layers, "flights", None) if layers else None
+            print(f"[DEBUG_OPENSKY] Disabled or wrong provider. Enabled={flights_config.enabled if flights_config else 'None'}, Provider={flights_config.provider if flights_config else 'None'}")
+            return Snapshot(payload={"count": 0, "disabled": True}, fetched_at=time.time(), stale=False)
+
+        # Con el poller activo las peticiones sólo leen el snapshot publicado
+        published = self._published_for(request)
+        if published is not None:
+            self._coverage.record("covered")
+            return published
+
+        cached = self._cache.get(request.cache_key)
         if cached:
             # print("[DEBUG_OPENSKY] Returning cached valid snapshot")
             cached.stale = False
             cached.payload["stale"] = False
             cached.polled = False
+            self._coverage.record("hit")
             return cached
+        # Zona contenida en un área más grande aún vigente: se recorta en local
+        covered = self._coverage.lookup(request.bbox, request.extended, request.max_aircraft)
+        if covered is not None:
+            self._coverage.record("covered")
+            return covered
+        self._coverage.record("miss")
         now = time.time()
         if now < self._backoff_until:
             print(f"[DEBUG_OPENSKY] In backoff until {self._backoff_until - now:.1f}s")
-            snapshot = self._snapshots.get(cache_key)
+            snapshot = self._snapshots.get(request.cache_key)
             if snapshot:
                 snapshot.stale = True
                 snapshot.polled = False
                 snapshot.payload["stale"] = True
                 return snapshot
             payload = {"count": 0, "items": [], "stale": True, "ts": int(now)}
-            return Snapshot(payload=payload, fetched_at=now, stale=True, mode=effective_mode, bbox=bbox_to_use)
+            return Snapshot(payload=payload, fetched_at=now, stale=True, mode=request.effective_mode, bbox=request.bbox)
+        return None
+
+    def _fetch_locked(self, config: AppConfigV2, request: _Request, now: float) -> Snapshot:
+        """Consulta OpenSky y guarda el resultado. Requiere ``self._lock``."""
+
+        snapshot = self._snapshots.get(request.cache_key)
+        try:
+            token = None
+            if request.has_token:
+                try:
+                    token = self._auth.get_token(**self._oauth_params(config))
+                except OpenSkyAuthError as exc:
+                    return self._auth_failed(exc, snapshot, now)
+
+            print(f"[DEBUG_OPENSKY] Fetching states from client... Token present: {bool(token)}")
+            payload, headers = self._client.fetch_states(request.bbox, request.extended, token)
+        except OpenSkyClientError as exc:
+            return self._client_failed(exc, snapshot, now, request.has_token)
+        except OpenSkyAuthError:
+            raise
+        except Exception as exc:  # noqa: BLE001
+            return self._fetch_failed(exc, snapshot, now)
+        return self._store_result(request, payload, headers, now)
+
+    async def _fetch_async(self, config: AppConfigV2, request: _Request, now: float) -> Snapshot:
+        """Versión asíncrona de :meth:`_fetch_locked` (requiere el lock asíncrono)."""
+
+        snapshot = self._snapshots.get(request.cache_key)
+        try:
+            token = None
+            if request.has_token:
+                try:
+                    token = await self._get_token_async(**self._oauth_params(config))
+                except OpenSkyAuthError as exc:
+                    return self._auth_failed(exc, snapshot, now)
+
+            payload, headers = await self._async_client.fetch_states(request.bbox, request.extended, token)
+        except OpenSkyClientError as exc:
+            return self._client_failed(exc, snapshot, now, request.has_token)
+        except OpenSkyAuthError:
+            raise
+        except Exception as exc:  # noqa: BLE001
+            return self._fetch_failed(exc, snapshot, now)
+        # Saneado, items, estelas y cobertura de miles de estados: fuera del loop
+        return await asyncio.to_thread(self._store_result_synchronized, request, payload, headers, now)
+
+    async def _get_token_async(self, **kwargs: Any) -> Optional[str]:
+        get_token_async = getattr(self._auth, "get_token_async", None)
+        if get_token_async is None:
+            # Autenticadores sólo síncronos: fuera del event loop
+            return await asyncio.to_thread(lambda: self._auth.get_token(**kwargs))
+        return await get_token_async(**kwargs)
+
+    @staticmethod
+    def _oauth_params(config: AppConfigV2) -> Dict[str, Optional[str]]:
+        oauth_cfg = getattr(getattr(config, "opensky", None), "oauth2", None)
+        return {
+            "token_url": getattr(oauth_cfg, "token_url", None) if oauth_cfg else None,
+            "scope": getattr(oauth_cfg, "scope", None) if oauth_cfg else None,
+        }
+
+    @staticmethod
+    def _mark_stale(snapshot: Snapshot) -> Snapshot:
+        snapshot.stale = True
+        snapshot.polled = False
+        snapshot.payload["stale"] = True
+        return snapshot
+
+    def _auth_failed(self, exc: OpenSkyAuthError, snapshot: Optional[Snapshot], now: float) -> Snapshot:
+        print(f"[DEBUG_OPENSKY] Auth error: {exc}")
+        self._last_error = f"auth:{exc}" if exc.status else str(exc)
+        self._last_error_at = now
+        self._schedule_backoff(override=15 if exc.status in {401, 403} else None)
+        if snapshot:
+            return self._mark_stale(snapshot)
+        raise exc
+
+    def _client_failed(
+        self,
+        exc: OpenSkyClientError,
+        snapshot: Optional[Snapshot],
+        now: float,
+        has_token: bool,
+    ) -> Snapshot:
+        print(f"[DEBUG_OPENSKY] Client Error: {exc}, Status: {exc.status}")
+        self._last_fetch_ok = False
+        self._last_fetch_at = now
+        self._last_error = f"client:{exc.status}" if exc.status else str(exc)
+        self._last_error_at = now
+        if exc.status == 429:
+            self._last_rate_limit_hint = "0"
+        if exc.status == 429:
+            self._schedule_backoff(override=30)
+        elif exc.status in {401, 403} and has_token:
+            self._auth.invalidate()
+            self._schedule_backoff(override=15)
+        else:
+            self._schedule_backoff()
+        if snapshot:
+            self._mark_stale(snapshot)
+            if exc.status == 429:
+                snapshot.remaining = "0"
+            return snapshot
+        raise exc
+
+    def _fetch_failed(self, exc: Exception, snapshot: Optional[Snapshot], now: float) -> Snapshot:
+        print(f"[DEBUG_OPENSKY] Unexpected Error: {exc}")
+        self._last_fetch_ok = False
+        self._last_fetch_at = now
+        self._last_error = str(exc)
+        self._last_error_at = now
+        self._schedule_backoff()
+        if snapshot:
+            return self._mark_stale(snapshot)
+        raise exc
+
+    def _store_result_synchronized(
+        self,
+        request: _Request,
+        payload: Dict[str, Any],
+        headers: Dict[str, str],
+        now: float,
+    ) -> Snapshot:
+        """:meth:`_store_result` desde un hilo que no tiene ``self._lock`` (camino asíncrono)."""
+
         with self._lock:
-            cached = self._cache.get(cache_key)
+            cached = self._cache.get(request.cache_key)
             if cached:
+                # El poller trajo la misma zona mientras se consultaba: se reutiliza
                 return cached
-            snapshot = self._snapshots.get(cache_key)
-            try:
-                token = None
-                oauth_cfg = getattr(getattr(config, "opensky", None), "oauth2", None)
-                token_endpoint = getattr(oauth_cfg, "token_url", None) if oauth_cfg else None
-                scope_value = getattr(oauth_cfg, "scope", None) if oauth_cfg else None
-                if has_token:
-                    try:
-                        token = self._auth.get_token(
-                            token_url=token_endpoint,
-                            scope=scope_value,
-                        )
-                    except OpenSkyAuthError as exc:
-                        print(f"[DEBUG_OPENSKY] Auth error: {exc}")
-                        self._last_error = f"auth:{exc}" if exc.status else str(exc)
-                        self._last_error_at = now
-                        self._schedule_backoff(override=15 if exc.status in {401, 403} else None)
-                        if snapshot:
-                            snapshot.stale = True
-                            snapshot.polled = False
-                            snapshot.payload["stale"] = True
-                            return snapshot
-                        raise
-                
-                print(f"[DEBUG_OPENSKY] Fetching states from client... Token present: {bool(token)}")
-                payload, headers = self._client.fetch_states(bbox_to_use, extended, token)
-            except OpenSkyClientError as exc:
-                print(f"[DEBUG_OPENSKY] Client Error: {exc}, Status: {exc.status}")
-                self._last_fetch_ok = False
-                self._last_fetch_at = now
-                self._last_error = f"client:{exc.status}" if exc.status else str(exc)
-                self._last_error_at = now
-                if exc.status == 429:
-                    self._last_rate_limit_hint = "0"
-                if exc.status == 429:
-                    self._schedule_backoff(override=30)
-                elif exc.status in {401, 403} and has_token:
-                    self._auth.invalidate()
-                    self._schedule_backoff(override=15)
-                else:
-                    self._schedule_backoff()
-                if snapshot:
-                    snapshot.stale = True
-                    snapshot.polled = False
-                    snapshot.payload["stale"] = True
-                    if exc.status == 429:
-                        snapshot.remaining = "0"
-                    return snapshot
-                raise
-            except OpenSkyAuthError:
-                raise
-            except Exception as exc:  # noqa: BLE001
-                print(f"[DEBUG_OPENSKY] Unexpected Error: {exc}")
-                self._last_fetch_ok = False
-                self._last_fetch_at = now
-                self._last_error = str(exc)
-                self._last_error_at = now
-                self._schedule_backoff()
-                if snapshot:
-                    snapshot.stale = True
-                    snapshot.polled = False
-                    snapshot.payload["stale"] = True
-                    return snapshot
-                raise
-            
-            ts, count, items = OpenSkyClient.sanitize_states(payload, int(max_aircraft))
-            print(f"[DEBUG_OPENSKY] Fetch success. Count={count}")
-            
-            result_payload: Dict[str, object] = {
-                "count": count,
-                "items": items,
-                "stale": False,
-                "ts": ts,
-            }
-            ttl = self._ttl_for(poll_seconds, has_token)
-            remaining = headers.get("X-Rate-Limit-Remaining")
-            self._last_rate_limit_hint = remaining or self._last_rate_limit_hint
-            snapshot = Snapshot(
-                payload=result_payload,
-                fetched_at=now,
-                stale=False,
-                remaining=remaining,
-                polled=True,
-                mode=effective_mode,
-                bbox=bbox_to_use,
-            )
-            self._cache.set(cache_key, snapshot, ttl)
-            self._snapshots[cache_key] = snapshot
-            self._last_fetch_ok = True
-            self._last_fetch_at = now
-            self._last_error = None
-            self._last_error_at = None
-            self._reset_backoff()
+            return self._store_result(request, payload, headers, now)
+
+    def _store_result(
+        self,
+        request: _Request,
+        payload: Dict[str, Any],
+        headers: Dict[str, str],
+        now: float,
+    ) -> Snapshot:
+        """Guarda un resultado correcto en caché, cobertura y estelas. Requiere ``self._lock``."""
+
+        cache_key = request.cache_key
+        has_token = request.has_token
+        bbox_to_use = request.bbox
+        columns = StateColumns.from_payload(payload, request.max_aircraft)
+        ts, count, items = columns.ts, len(columns), columns.to_items()
+        print(f"[DEBUG_OPENSKY] Fetch success. Count={count}")
+
+        result_payload: Dict[str, object] = {
+            "count": count,
+            "items": items,
+            "stale": False,
+            "ts": ts,
+        }
+        ttl = self._ttl_for(request.poll_seconds, has_token)
+        remaining = headers.get("X-Rate-Limit-Remaining")
+        self._last_rate_limit_hint = remaining or self._last_rate_limit_hint
+        snapshot = Snapshot(
+            payload=result_payload,
+            fetched_at=now,
+            stale=False,
+            remaining=remaining,
+            polled=True,
+            mode=request.effective_mode,
+            bbox=bbox_to_use,
+            columns=columns,
+        )
+        self._cache.set(cache_key, snapshot, ttl)
+        self._snapshots[cache_key] = snapshot
+        self._coverage.add(
+            replace(snapshot, payload=dict(result_payload)),
+            bbox_to_use,
+            request.extended,
+            ttl,
+            complete=not (request.max_aircraft > 0 and count >= request.max_aircraft),
+        )
+        self._last_fetch_ok = True
+        self._last_fetch_at = now
+        self._last_error = None
+        self._last_error_at = None
+        self._reset_backoff()
+        if self._tracks_enabled:
+            with self._tracks_lock:
+                self._tracks.add_columns(columns)
+                self._tracks.expire(now)
         self._logger.info(
             "[opensky] fetched %d aircraft (mode=%s, bbox=%s, ttl=%ds)",
             count,
-            mode,
+            request.mode,
             "global" if bbox_to_use is None else bbox_to_use,
             ttl,
         )
         return snapshot
 
+    # ------------------------------------------------------------------
+    # Background poller
+    # ------------------------------------------------------------------
+    def start_poller(self, config_reader: Callable[[], AppConfigV2]) -> None:
+        """Refresca el área configurada en segundo plano cada ``poll_seconds``.
+
+        Las peticiones que caen dentro de esa área dejan de llamar a OpenSky y
+        sólo leen el último snapshot publicado (inmutable).
+        """
+
+        with self._poller_lock:
+            if self._poller_thread and self._poller_thread.is_alive():
+                return
+            stop_event = threading.Event()
+            thread = threading.Thread(
+                target=self._poll_loop,
+                args=(config_reader, stop_event),
+                name="OpenSkyPoller",
+                daemon=True,
+            )
+            self._poller_thread = thread
+            self._poller_stop = stop_event
+            self._logger.info("[opensky] starting background poller")
+            thread.start()
+
+    def start_token_refresher(self, config_reader: Callable[[], AppConfigV2]) -> None:
+        """Arranca la renovación proactiva del token OAuth2 (si el autenticador la soporta)."""
+
+        start = getattr(self._auth, "start_refresher", None)
+        if start is not None:
+            start(lambda: self._refresh_settings(config_reader()))
+
+    @staticmethod
+    def _refresh_settings(config: AppConfigV2) -> RefreshSettings:
+        top_level = getattr(config, "opensky", None)
+        oauth_cfg = getattr(top_level, "oauth2", None)
+        flights_config = getattr(getattr(config, "layers", None), "flights", None)
+        params = OpenSkyService._oauth_params(config)
+        return RefreshSettings(
+            token_url=params["token_url"],
+            scope=params["scope"],
+            fraction=float(getattr(oauth_cfg, "refresh_fraction", 0.75) or 0.75),
+            jitter_seconds=float(getattr(oauth_cfg, "refresh_jitter_seconds", 30) or 0),
+            idle=not (
+                flights_config
+                and flights_config.enabled
+                and flights_config.provider == "opensky"
+                and getattr(top_level, "enabled", True)
+            ),
+        )
+
+    def stop_poller(self) -> None:
+        with self._poller_lock:
+            thread, stop_event = self._poller_thread, self._poller_stop
+            self._poller_thread = None
+            self._poller_stop = None
+        if stop_event:
+            stop_event.set()
+        if thread and thread.is_alive():
+            thread.join(timeout=5)
+        self._published = None
+
+    @property
+    def poller_active(self) -> bool:
+        thread = self._poller_thread
+        return bool(thread and thread.is_alive())
+
+    def _poll_loop(self, config_reader: Callable[[], AppConfigV2], stop_event: threading.Event) -> None:
+        while not stop_event.is_set():
+            try:
+                delay = self._poll_once(config_reader())
+            except Exception as exc:  # noqa: BLE001 - el poller no debe morir
+                self._logger.warning("[opensky] background poll failed: %s", exc)
+                delay = 10.0
+            self._next_poll_at = time.time() + delay
+            stop_event.wait(delay)
+
+    def _poll_once(self, config: AppConfigV2) -> float:
+        """Una iteración del poller; devuelve los segundos hasta la siguiente."""
+
+        request = self._resolve_request(config, None)
+        if request is None:
+            self._published = None
+            return float(DISABLED_POLL_SECONDS)
+        now = time.time()
+        if now < self._backoff_until:
+            return max(1.0, self._backoff_until - now)
+        if self._last_rate_limit_hint == "0":
+            if not self._adaptive(config):
+                # Sin créditos: se espera bastante más antes de volver a intentarlo
+                wait = float(max(request.poll_seconds * 6, 60))
+                elapsed = now - (self._last_fetch_at or 0.0)
+                if elapsed < wait:
+                    return wait - elapsed
+            elif not self._credits_reset_since(self._last_fetch_at, now):
+                return self._plan_next_poll(config, request).interval
+        with self._lock:
+            snapshot = self._fetch_locked(config, request, now)
+        if snapshot.polled:
+            self._publish(snapshot, request)
+        elif self._published is not None:
+            published = self._published
+            stale = replace(published.snapshot, stale=True, payload=dict(published.snapshot.payload, stale=True))
+            self._published = CoverageEntry(
+                stale, published.area, published.extended, published.expires_at, published.complete
+            )
+        if not self._adaptive(config):
+            delay = float(request.poll_seconds)
+        else:
+            delay = self._plan_next_poll(config, request).interval
+        if snapshot.polled:
+            self._renew_published(time.time() + delay + PUBLISH_GRACE_SECONDS)
+        return delay
+
+    @staticmethod
+    def _credits_reset_since(moment: Optional[float], now: float) -> bool:
+        """True si ha pasado un reinicio diario de créditos (00:00 UTC) desde ``moment``."""
+
+        return moment is None or now - moment >= seconds_until_reset(moment)
+
+    @staticmethod
+    def _adaptive(config: AppConfigV2) -> bool:
+        return bool(getattr(getattr(config, "opensky", None), "adaptive_polling", False))
+
+    def _plan_next_poll(self, config: AppConfigV2, request: _Request) -> PollDecision:
+        """Intervalo hasta el siguiente sondeo según créditos y actividad."""
+
+        cfg = getattr(config, "opensky", None)
+        self._scheduler.reserve = float(getattr(cfg, "credit_reserve", self._scheduler.reserve))
+        published = self._published
+        aircraft = int(published.snapshot.payload.get("count") or 0) if published is not None else None
+        return self._scheduler.decide(
+            min_interval=float(request.poll_seconds),
+            max_interval=float(getattr(cfg, "max_poll_seconds", 600)),
+            remaining=parse_remaining(self._last_rate_limit_hint),
+            cost=credit_cost(request.bbox),
+            last_view_at=self._last_view_at,
+            aircraft=aircraft,
+            local_hour=self._local_hour(config),
+            night_hours=(int(getattr(cfg, "night_start_hour", 0)), int(getattr(cfg, "night_end_hour", 6))),
+        )
+
+    @staticmethod
+    def _local_hour(config: AppConfigV2) -> Optional[int]:
+        name = getattr(getattr(config, "display", None), "timezone", None)
+        if not name:
+            return None
+        try:
+            return datetime.now(ZoneInfo(name)).hour
+        except (ZoneInfoNotFoundError, ValueError):
+            return None
+
+    def _publish(self, snapshot: Snapshot, request: _Request) -> None:
+        # Copia propia: los snapshots del camino síncrono se marcan "stale" in situ
+        frozen = replace(snapshot, payload=dict(snapshot.payload), polled=False)
+        count = int(frozen.payload.get("count") or 0)
+        with self._publish_lock:
+            # El poller lo renueva en cada sondeo correcto (``_renew_published``)
+            self._published = CoverageEntry(
+                frozen,
+                request.bbox,
+                request.extended,
+                frozen.fetched_at + request.poll_seconds + PUBLISH_GRACE_SECONDS,
+                complete=not (request.max_aircraft > 0 and count >= request.max_aircraft),
+            )
+            self._published_request = request
+            if self._ingestor is not None:
+                merged = self._ingestor.merge_primary(
+                    frozen.payload.get("items") or [], frozen.fetched_at, request.bbox, request.max_aircraft
+                )
+                if merged is not None:
+                    self._publish_merged(merged, int(frozen.payload.get("ts") or frozen.fetched_at))
+        self._announce_codes(frozen)
+
+    def set_publish_listener(self, listener: Optional[Callable[[List[str]], None]]) -> None:
+        """Avisa con los icao24 de cada snapshot que publica el poller, los nuevos primero.
+
+        Se llama desde el hilo del poller: el listener no debe bloquear.
+        """
+
+        self._publish_listener = listener
+
+    def _announce_codes(self, snapshot: Snapshot) -> None:
+        listener = self._publish_listener
+        if listener is None:
+            return
+        if snapshot.columns is not None:
+            codes = [code for code in snapshot.columns.icao24.tolist() if code]
+        else:
+            codes = [item.get("icao24") for item in snapshot.payload.get("items") or [] if item.get("icao24")]
+        previous, self._published_codes = self._published_codes, set(codes)
+        if not codes:
+            return
+        ordered = [code for code in codes if code not in previous] + [code for code in codes if code in previous]
+        try:
+            listener(ordered)
+        except Exception:  # noqa: BLE001 - un listener roto no debe parar el poller
+            self._logger.debug("OpenSky publish listener failed", exc_info=True)
+
+    def _renew_published(self, expires_at: float) -> None:
+        with self._publish_lock:
+            if self._published is not None:
+                self._published.expires_at = expires_at
+
+    def attach_ingestor(self, ingestor: FlightIngestor) -> None:
+        """Fusiona en el snapshot publicado los vuelos de otros proveedores."""
+
+        self._ingestor = ingestor
+        ingestor.set_publisher(self._publish_merged)
+
+    def _publish_merged(self, items: List[Dict[str, Any]], ts: int) -> None:
+        """Sustituye el snapshot publicado por la fusión OpenSky + proveedores secundarios."""
+
+        with self._publish_lock:
+            published, request = self._published, self._published_request
+            if published is None or request is None:
+                return
+            columns = StateColumns.from_items(items, ts)
+            payload = dict(published.snapshot.payload, items=items, count=len(items))
+            merged = replace(published.snapshot, payload=payload, columns=columns, fetched_at=time.time())
+            self._published = CoverageEntry(
+                merged,
+                published.area,
+                published.extended,
+                published.expires_at,
+                complete=not (request.max_aircraft > 0 and len(items) >= request.max_aircraft),
+            )
+        if self._tracks_enabled:
+            with self._tracks_lock:
+                self._tracks.add_columns(columns)
+
+    def _published_for(self, request: _Request) -> Optional[Snapshot]:
+        published = self._published
+        if published is None or not self.poller_active:
+            return None
+        if not published.covers(request.bbox, request.extended, time.time()):
+            return None
+        if request.bbox == published.area:
+            return published.snapshot
+        if not published.complete:
+            return None
+        return published.filtered(request.bbox, request.max_aircraft)
+
     def get_status(self, config: AppConfigV2) -> Dict[str, object]:
         now = time.time()
         auth_info = self._auth.describe()
@@ -281,6 +791,7 @@ class OpenSkyService:
             "has_credentials": has_credentials,
             "token_cached": bool(auth_info.get("token_cached")),
             "expires_in_sec": auth_info.get("expires_in_sec"),
+            "refresh": auth_info.get("refresh"),
         }
         configured_poll = getattr(top_level, "poll_seconds", poll_seconds) if top_level else poll_seconds
         mode = getattr(flights_provider, "mode", None) or getattr(top_level, "mode", "bbox") if top_level else "bbox"
@@ -305,10 +816,47 @@ class OpenSkyService:
             "has_credentials": has_credentials,
             "token_cached": bool(auth_info.get("token_cached")),
             "expires_in": auth_block.get("expires_in_sec"),
+            "poller": {
+                "active": self.poller_active,
+                "next_poll_in": (
+                    max(0, int(self._next_poll_at - now)) if self.poller_active and self._next_poll_at else None
+                ),
+                "published_age": (
+                    int(now - self._published.snapshot.fetched_at) if self._published is not None else None
+                ),
+            },
+            "coverage": self._coverage.describe(),
+            "scheduler": self._describe_scheduler(config),
+            "tracks": self._describe_tracks(),
+            "ingest": self._ingestor.describe() if self._ingestor is not None else None,
+        }
+
+    def _describe_tracks(self) -> Dict[str, object]:
+        with self._tracks_lock:
+            return dict(self._tracks.describe(), enabled=self._tracks_enabled)
+
+    def _describe_scheduler(self, config: AppConfigV2) -> Dict[str, object]:
+        decision = self._scheduler.last
+        return {
+            "adaptive": self._adaptive(config),
+            "last_view_age": int(time.time() - self._last_view_at) if self._last_view_at else None,
+            "decision": decision.describe() if decision is not None else None,
         }
 
     def close(self) -> None:
+        self.stop_poller()
+        stop_refresher = getattr(self._auth, "stop_refresher", None)
+        if stop_refresher is not None:
+            stop_refresher()
         self._client.close()
+
+    async def aclose(self) -> None:
+        """Cierra los clientes asíncronos (desde el event loop de la app)."""
+
+        await self._async_client.aclose()
+        auth_aclose = getattr(self._auth, "aclose", None)
+        if auth_aclose is not None:
+            await auth_aclose()
         self._auth.close()
 
     @staticmethod
@@ -491,6 +1039,9 @@ class OpenSkyService:
         }
 
     def get_last_snapshot(self) -> Optional[Snapshot]:
+        published = self._published
+        if published is not None:
+            return published.snapshot
         with self._lock:
             if not self._snapshots:
                 return None
@@ -502,6 +1053,11 @@ class OpenSkyService:
             self._cache.clear()
             self._snapshots.clear()
             self._last_rate_limit_hint = None
+        self._published = None
+        self._scheduler.last = None
+        self._coverage.clear()
+        with self._tracks_lock:
+            self._tracks.clear()
         self._auth.invalidate()
 
     def force_refresh_token(
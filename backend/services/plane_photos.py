@@ -0,0 +1,277 @@
+"""Caché persistente de fotos de aeronaves (Planespotters) por icao24.
+
+Las peticiones a la API nunca se hacen desde la respuesta: ``get`` sólo lee
+la caché y ``warm`` lanza en segundo plano la búsqueda de las aeronaves que
+faltan, con concurrencia acotada. Cada resultado caduca según su tipo: foto
+encontrada (días), sin foto (horas) o error de red/servidor (minutos), de modo
+que un fallo puntual no deja a una aeronave sin foto para siempre. La caché se
+guarda en JSON en el directorio de caché y sobrevive a reinicios.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import httpx
+
+PHOTO_URL = "https://api.planespotters.net/pub/photos/hex/{icao24}"
+# Planespotters rechaza peticiones sin User-Agent de navegador
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+
+POSITIVE_TTL_SECONDS = 7 * 86400
+NEGATIVE_TTL_SECONDS = 12 * 3600
+ERROR_TTL_SECONDS = 600
+DEFAULT_CONCURRENCY = 4
+DEFAULT_CAPACITY = 5000
+
+STATUS_FOUND = "found"
+STATUS_MISSING = "missing"
+STATUS_ERROR = "error"
+
+
+class PlanePhotoCache:
+    """Fotos por icao24 con TTL positivo/negativo y resolución asíncrona en lote.
+
+    Las entradas (``{"url", "status", "checked_at"}``) se sustituyen, nunca se
+    mutan, así que ``get`` no necesita bloquear más que un instante.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        capacity: int = DEFAULT_CAPACITY,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        positive_ttl: float = POSITIVE_TTL_SECONDS,
+        negative_ttl: float = NEGATIVE_TTL_SECONDS,
+        error_ttl: float = ERROR_TTL_SECONDS,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.path = path
+        self.capacity = max(1, int(capacity))
+        self.concurrency = max(1, int(concurrency))
+        self._ttls = {
+            STATUS_FOUND: float(positive_ttl),
+            STATUS_MISSING: float(negative_ttl),
+            STATUS_ERROR: float(error_ttl),
+        }
+        self._logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._in_flight: Set[str] = set()
+        self._tasks: Set["asyncio.Task[Any]"] = set()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._dirty = False
+        self.lookups = 0
+        self.errors = 0
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ------------------------------------------------------------------
+    # Lectura (nunca bloquea en red)
+    # ------------------------------------------------------------------
+    def get(self, icao24: str) -> Optional[str]:
+        """URL de la foto si está en caché (aunque haya caducado)."""
+
+        entry = self._entries.get(icao24.strip().lower())
+        return entry.get("url") if entry else None
+
+    def needs_lookup(self, icao24: str, now: Optional[float] = None) -> bool:
+        entry = self._entries.get(icao24)
+        if entry is None:
+            return True
+        now = time.time() if now is None else now
+        ttl = self._ttls.get(entry.get("status"), self._ttls[STATUS_ERROR])
+        return now - float(entry.get("checked_at") or 0) >= ttl
+
+    # ------------------------------------------------------------------
+    # Resolución
+    # ------------------------------------------------------------------
+    def warm(self, icao24s: Iterable[str], limit: int = 20) -> int:
+        """Busca en segundo plano las fotos que faltan; devuelve cuántas se lanzan.
+
+        Debe llamarse desde el event loop. ``icao24s`` va por prioridad (p. ej.
+        por distancia) y sólo se lanzan las ``limit`` primeras pendientes.
+        """
+
+        pending = self._pending(icao24s)[: max(0, int(limit))]
+        if not pending:
+            return 0
+        with self._lock:
+            self._in_flight.update(pending)
+        task = asyncio.get_running_loop().create_task(self._resolve(pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return len(pending)
+
+    async def resolve_many(self, icao24s: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Resuelve (esperando) las que falten y devuelve las URLs de todas."""
+
+        codes = list(dict.fromkeys(code.strip().lower() for code in icao24s if code))
+        pending = self._pending(codes)
+        if pending:
+            with self._lock:
+                self._in_flight.update(pending)
+            await self._resolve(pending)
+        return {code: self.get(code) for code in codes}
+
+    def _pending(self, icao24s: Iterable[str]) -> List[str]:
+        now = time.time()
+        result: List[str] = []
+        seen: Set[str] = set()
+        for code in icao24s:
+            if not code:
+                continue
+            code = code.strip().lower()
+            if code in seen or code in self._in_flight or not self.needs_lookup(code, now):
+                continue
+            seen.add(code)
+            result.append(code)
+        return result
+
+    async def _resolve(self, codes: List[str]) -> None:
+        try:
+            await asyncio.gather(*(self._resolve_one(code) for code in codes))
+        finally:
+            with self._lock:
+                self._in_flight.difference_update(codes)
+            if self._dirty:
+                await asyncio.to_thread(self.save)
+
+    async def _resolve_one(self, code: str) -> None:
+        _, semaphore = self._loop_resources()
+        async with semaphore:
+            status, url = await self._fetch(code)
+        self._store(code, status, url)
+
+    async def _fetch(self, code: str) -> Tuple[str, Optional[str]]:
+        client, _ = self._loop_resources()
+        self.lookups += 1
+        try:
+            response = await client.get(PHOTO_URL.format(icao24=code))
+        except httpx.HTTPError as exc:
+            self.errors += 1
+            self._logger.debug("[photos] lookup failed for %s: %s", code, exc)
+            return STATUS_ERROR, None
+        if response.status_code == 404:
+            return STATUS_MISSING, None
+        if response.status_code != 200:
+            # 429 y 5xx: se reintenta cuando caduque el TTL de error
+            self.errors += 1
+            return STATUS_ERROR, None
+        try:
+            photos = response.json().get("photos") or []
+        except (ValueError, AttributeError):
+            self.errors += 1
+            return STATUS_ERROR, None
+        for photo in photos:
+            # "thumbnail_large": calidad suficiente sin descargar el original
+            src = ((photo or {}).get("thumbnail_large") or {}).get("src")
+            if src:
+                return STATUS_FOUND, src
+        return STATUS_MISSING, None
+
+    def _store(self, code: str, status: str, url: Optional[str]) -> None:
+        with self._lock:
+            previous = self._entries.get(code)
+            if status == STATUS_ERROR and previous and previous.get("url"):
+                # Un error no borra una foto ya conocida
+                url = previous["url"]
+            self._entries[code] = {"url": url, "status": status, "checked_at": time.time()}
+            self._entries.move_to_end(code)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def _loop_resources(self) -> Tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        # El cliente y el semáforo quedan ligados al loop en el que se crean
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._semaphore is None or self._loop is not loop:
+            timeout = httpx.Timeout(4.0, connect=3.0)
+            self._client = httpx.AsyncClient(timeout=timeout, headers={"User-Agent": USER_AGENT})
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._loop = loop
+        return self._client, self._semaphore
+
+    async def aclose(self) -> None:
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        client, self._client, self._semaphore, self._loop = self._client, None, None, None
+        if client is not None:
+            await client.aclose()
+        self.save()
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+    def save(self) -> bool:
+        """Escribe el fichero si hay cambios pendientes (escritura atómica)."""
+
+        if self.path is None:
+            return False
+        with self._lock:
+            if not self._dirty:
+                return False
+            data = dict(self._entries)
+            self._dirty = False
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        try:
+            tmp_path.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+        except OSError as exc:
+            self._logger.warning("Could not persist plane photo cache to %s: %s", self.path, exc)
+            with self._lock:
+                self._dirty = True
+            return False
+        return True
+
+    def describe(self) -> Dict[str, Any]:
+        counts = {STATUS_FOUND: 0, STATUS_MISSING: 0, STATUS_ERROR: 0}
+        for entry in list(self._entries.values()):
+            status = entry.get("status")
+            if status in counts:
+                counts[status] += 1
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "in_flight": len(self._in_flight),
+            "lookups": self.lookups,
+            "errors": self.errors,
+            **counts,
+            "path": str(self.path) if self.path else None,
+        }
+
+    def _load(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            self._logger.warning("Ignoring unreadable plane photo cache %s: %s", self.path, exc)
+            return
+        if not isinstance(data, dict):
+            return
+        # El fichero conserva el orden LRU (el más reciente al final)
+        for code, entry in list(data.items())[-self.capacity:]:
+            if isinstance(entry, dict) and entry.get("status") in self._ttls:
+                self._entries[str(code)] = entry
+
+
+__all__ = ["PlanePhotoCache"]
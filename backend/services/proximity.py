@@ -0,0 +1,151 @@
+"""Vecinos más cercanos sobre posiciones en movimiento (aviones, barcos).
+
+Las posiciones de cada fuente se guardan como arrays numpy junto con la
+versión del snapshot del que salen. Una consulta calcula la distancia
+haversine a todos los puntos de una vez y selecciona los ``k`` más cercanos
+con ``argpartition`` (sin ordenar el resto). El resultado se cachea por
+(versión, centro, radio, k, bbox) hasta que llega un snapshot con otra
+versión, así que las peticiones repetidas entre sondeos no recalculan nada.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+DEFAULT_MAX_CACHED = 64
+
+BBox = Tuple[float, float, float, float]  # (lamin, lamax, lomin, lomax)
+
+
+def haversine_km(lat0: float, lon0: float, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Distancia en km desde ``(lat0, lon0)`` a cada punto (NaN si falta la posición)."""
+
+    phi0 = np.radians(lat0)
+    phi = np.radians(lat)
+    dphi = phi - phi0
+    dlambda = np.radians(lon - lon0)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi0) * np.cos(phi) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def top_k(distances: np.ndarray, k: int) -> np.ndarray:
+    """Índices de las ``k`` distancias menores, de menor a mayor (ignora NaN/inf)."""
+
+    candidates = np.flatnonzero(np.isfinite(distances))
+    if k <= 0 or candidates.shape[0] == 0:
+        return candidates[:0]
+    if k < candidates.shape[0]:
+        candidates = candidates[np.argpartition(distances[candidates], k - 1)[:k]]
+    return candidates[np.argsort(distances[candidates], kind="stable")]
+
+
+def coordinates(
+    items: Sequence[Any],
+    lat_keys: Sequence[str] = ("lat", "latitude"),
+    lon_keys: Sequence[str] = ("lon", "longitude"),
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Arrays lat/lon a partir de dicts (NaN donde falte o no sea numérico)."""
+
+    lat = np.full(len(items), np.nan)
+    lon = np.full(len(items), np.nan)
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+        y = next((item[key] for key in lat_keys if item.get(key) is not None), None)
+        x = next((item[key] for key in lon_keys if item.get(key) is not None), None)
+        try:
+            if y is not None and x is not None:
+                lat[index], lon[index] = float(y), float(x)
+        except (TypeError, ValueError):
+            pass
+    return lat, lon
+
+
+class ProximityIndex:
+    """Posiciones de una fuente con resultados cacheados por versión."""
+
+    def __init__(self, max_cached: int = DEFAULT_MAX_CACHED) -> None:
+        self.max_cached = max(1, int(max_cached))
+        self._lock = threading.Lock()
+        self._version: Optional[Hashable] = None
+        self._lat = np.empty(0)
+        self._lon = np.empty(0)
+        self._results: "OrderedDict[Tuple[Any, ...], Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return int(self._lat.shape[0])
+
+    @property
+    def version(self) -> Optional[Hashable]:
+        return self._version
+
+    def search(
+        self,
+        version: Optional[Hashable],
+        positions: Callable[[], Tuple[Any, Any]],
+        lat: float,
+        lon: float,
+        k: int,
+        radius_km: Optional[float] = None,
+        bbox: Optional[BBox] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """``(índices, distancias_km)`` de los ``k`` puntos más cercanos.
+
+        ``positions`` devuelve ``(lat, lon)`` de la fuente y sólo se llama si
+        ``version`` cambia (``None`` = sin caché). ``radius_km`` descarta los
+        puntos más lejanos y ``bbox`` los que caen fuera de la caja.
+        """
+
+        key = (version, round(lat, 5), round(lon, 5), int(k), radius_km, bbox)
+        with self._lock:
+            if version is None or version != self._version:
+                point_lat, point_lon = positions()
+                self._lat = np.asarray(point_lat, dtype=np.float64)
+                self._lon = np.asarray(point_lon, dtype=np.float64)
+                self._version = version
+                self._results.clear()
+            elif key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return self._results[key]
+            self.misses += 1
+            # Referencias locales: otro snapshot puede sustituirlas mientras se calcula
+            point_lat, point_lon = self._lat, self._lon
+
+        distances = haversine_km(lat, lon, point_lat, point_lon)
+        if radius_km is not None:
+            distances = np.where(distances <= radius_km, distances, np.inf)
+        if bbox is not None:
+            lamin, lamax, lomin, lomax = bbox
+            inside = (point_lat >= lamin) & (point_lat <= lamax) & (point_lon >= lomin) & (point_lon <= lomax)
+            distances = np.where(inside, distances, np.inf)
+        indices = top_k(distances, k)
+        result = (indices, distances[indices])
+
+        if version is not None:
+            with self._lock:
+                if self._version == version:
+                    self._results[key] = result
+                    while len(self._results) > self.max_cached:
+                        self._results.popitem(last=False)
+        return result
+
+    def describe(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "points": len(self),
+            "cached": len(self._results),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else None,
+        }
+
+
+__all__ = ["ProximityIndex", "coordinates", "haversine_km", "top_k"]
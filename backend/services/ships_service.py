@@ -1,17 +1,25 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import json
 import logging
 import threading
 import time
 import ssl
-from copy import deepcopy
-from typing import Any, Dict, Optional
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
 
 from ..cache import CacheStore
 from ..models import ShipsLayerConfig
 from ..secret_store import SecretStore
+from .dead_reckoning import KNOTS_TO_MS, extrapolate
+from .ais_subscription import DEFAULT_BOXES, SubscriptionStats, normalize_boxes
+from .ais_static import STATIC_MESSAGE_TYPES, VesselStaticCache, parse_static_message
+from .ais_throttle import AISIngestThrottle
+from .vessel_store import DEFAULT_MAX_VESSELS, VesselRecord, VesselStore
+from .vessel_tracks import VesselTrackStore, track_to_feature
 
 try:  # pragma: no cover - optional dependency provided by uvicorn[standard]
     import websockets
@@ -25,7 +33,45 @@ except Exception:  # pragma: no cover - fallback when websockets is unavailable
 
 
 DEFAULT_STREAM_URL = "wss://stream.aisstream.io/v0/stream"
+# Hilo propio (threading.Event) o tarea en el bucle de la app (asyncio.Event)
+StopEvent = Union[threading.Event, asyncio.Event]
 SECRET_NAME = "aisstream_api_key"
+# Copia en CacheStore: sólo si alguien ha leído desde la última y como mucho cada minuto
+SNAPSHOT_PERSIST_SECONDS = 60
+# Valores AIS de "no disponible": Sog 102.3 nudos y Cog 360
+AIS_SOG_UNAVAILABLE = 102.2
+AIS_COG_UNAVAILABLE = 360.0
+
+
+@dataclass(frozen=True)
+class ShipsSnapshot:
+    """Snapshot inmutable publicado periódicamente.
+
+    Los lectores obtienen la referencia sin copiar ni bloquear; ``body`` es el
+    FeatureCollection ya serializado, para servirlo tal cual. ``etag`` depende
+    del estado de los barcos y de las posiciones estimadas que lleva el cuerpo,
+    pero no de ``built_at``: con la flota parada (o sin estimación) no cambia
+    mientras no llegue nada nuevo.
+    Las features se comparten entre lectores y no deben modificarse.
+    """
+
+    features: Tuple[Dict[str, Any], ...]
+    meta: Mapping[str, Any]
+    body: bytes
+    etag: str
+    built_at: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"type": "FeatureCollection", "features": list(self.features), "meta": dict(self.meta)}
+
+
+EMPTY_SNAPSHOT = ShipsSnapshot(
+    features=(),
+    meta=MappingProxyType({}),
+    body=b'{"type":"FeatureCollection","features":[]}',
+    etag='"empty"',
+    built_at=0.0,
+)
 
 
 class AISStreamService:
@@ -44,19 +90,35 @@ class AISStreamService:
         self._lock = threading.Lock()
         self._thread: Optional[threading.Thread] = None
         self._thread_stop: Optional[threading.Event] = None
+        # Modo "event_loop": la ingesta es una tarea supervisada del bucle de FastAPI
+        self._ingest_mode = "thread"
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._task_stop: Optional[asyncio.Event] = None
 
         self._provider_enabled = False
         self._ws_url = DEFAULT_STREAM_URL
         self._update_interval = 10
         self._ttl_seconds = 180
-        self._last_snapshot = 0.0
-        self._snapshot: Dict[str, Any] = {"type": "FeatureCollection", "features": []}
-        self._vessels: Dict[str, Dict[str, Any]] = {}
+        self._dr_max_seconds = 120
+        self._published: ShipsSnapshot = EMPTY_SNAPSHOT
+        self._builder_active = False
+        self._persisted_at = 0.0
+        self._read_since_persist = False
+        self._vessels = VesselStore(DEFAULT_MAX_VESSELS)
+        self._throttle = AISIngestThrottle()
+        self._tracks = VesselTrackStore()
+        self._tracks_enabled = True
+        self._static = VesselStaticCache(cache_store.cache_dir / "ais_static.json", logger=self._logger)
         self._ws_connected = False
         self._last_message_ts: Optional[float] = None
         self._last_error: Optional[str] = None
         # Default BBox (Spain/Iberian Peninsula)
         self._bbox = [[[36.0, -10.0], [44.0, 5.0]]]
+        self._config_boxes = normalize_boxes(DEFAULT_BOXES)
+        self._view_boxes: Optional[List[List[List[float]]]] = None
+        self._subscription_version = 0
+        self._subscription_stats = SubscriptionStats()
 
     # ------------------------------------------------------------------
     # Public API
@@ -69,21 +131,49 @@ class AISStreamService:
             self._update_interval = max(1, int(ships_config.refresh_seconds))
             ttl_from_config = max(ships_config.max_age_seconds, self._update_interval * 6)
             self._ttl_seconds = max(60, ttl_from_config)
+            self._dr_max_seconds = int(ships_config.dead_reckoning_max_seconds)
+            ingest_mode = ships_config.aisstream.ingest_mode if ships_config.aisstream else "thread"
+            if ingest_mode != self._ingest_mode:
+                # Cambio de modo: se para la ingesta actual y se arranca en el nuevo
+                self._stop_thread_locked()
+                self._ingest_mode = ingest_mode
 
-            ws_url = (ships_config.aisstream.ws_url or "").strip()
+            ws_url = (ships_config.aisstream.ws_url or "").strip() if ships_config.aisstream else ""
             self._ws_url = ws_url or DEFAULT_STREAM_URL
+            if ships_config.aisstream:
+                self._vessels.set_capacity(ships_config.aisstream.max_vessels)
+                self._throttle.configure(
+                    ships_config.aisstream.min_report_interval_seconds,
+                    ships_config.aisstream.min_report_move_meters,
+                )
+                self._tracks_enabled = ships_config.aisstream.track_points > 0
+                if self._tracks_enabled:
+                    self._tracks.configure(
+                        ships_config.aisstream.track_points,
+                        ships_config.aisstream.track_max_total_points,
+                    )
+                else:
+                    self._tracks.clear()
 
             # Update BBox from config
             # CRÍTICO: Formato [[[Lat1, Lon1], [Lat2, Lon2]]]
-            if ships_config.aisstream and ships_config.aisstream.bbox:
+            # Varias cajas (p. ej. franjas costeras) tienen prioridad sobre bbox
+            if ships_config.aisstream and ships_config.aisstream.bboxes:
+                boxes = [
+                    [[float(b.lamin), float(b.lomin)], [float(b.lamax), float(b.lomax)]]
+                    for b in ships_config.aisstream.bboxes
+                ]
+            elif ships_config.aisstream and ships_config.aisstream.bbox:
                 bbox = ships_config.aisstream.bbox
                 # Asegurar que son floats y estructura correcta
                 p1 = [float(bbox.lamin), float(bbox.lomin)]
                 p2 = [float(bbox.lamax), float(bbox.lomax)]
-                self._bbox = [[p1, p2]]
+                boxes = [[p1, p2]]
             else:
                 # Fallback to Spain defaults
-                self._bbox = [[[36.0, -10.0], [44.0, 5.0]]]
+                boxes = [[[36.0, -10.0], [44.0, 5.0]]]
+            self._config_boxes = normalize_boxes(boxes)
+            self._refresh_subscription_locked()
 
             if not self._provider_enabled:
                 self._stop_thread_locked()
@@ -119,74 +209,128 @@ class AISStreamService:
         with self._lock:
             self._stop_thread_locked()
             self._reset_state_locked()
+        self._static.save()
+
+    def set_view_bboxes(self, boxes: Optional[List[List[List[float]]]]) -> None:
+        """Sustituye temporalmente las cajas de configuración (``None`` las restaura).
+
+        Si hay conexión abierta la nueva suscripción se envía por el mismo
+        socket, sin reconectar.
+        """
+
+        with self._lock:
+            self._view_boxes = normalize_boxes(boxes) if boxes else None
+            self._refresh_subscription_locked()
+
+    @property
+    def runs_in_event_loop(self) -> bool:
+        """``True`` si la ingesta corre como tarea en el bucle de eventos actual.
+
+        En ese caso las consultas deben hacerse desde el propio bucle (sin
+        threadpool) para que el lock nunca tenga contención entre hilos.
+        """
+
+        if self._task is None or self._task.done():
+            return False
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
 
     def get_snapshot(self) -> Optional[Dict[str, Any]]:
         """Devuelve un FeatureCollection con los barcos en memoria."""
 
-        with self._lock:
-            if not self._provider_enabled:
-                return None
-            if websockets is None:
-                return None
-            now = time.time()
-            if now - self._last_snapshot >= max(1, self._update_interval):
-                self._build_snapshot_locked(now)
-
-            snapshot = deepcopy(self._snapshot)
-            meta = snapshot.setdefault("meta", {})
-            meta.update(
-                {
-                    "provider": "aisstream",
-                    "ws_connected": self._ws_connected,
-                    "buffer_size": len(self._vessels),
-                    "last_message_ts": self._last_message_ts,
-                    "update_interval": self._update_interval,
-                    "ok": self._ws_connected and len(self._vessels) > 0,
-                }
-            )
-            self._logger.info(f"get_snapshot: {len(self._vessels)} vessels, connected={self._ws_connected}")
-            return snapshot
+        published = self.get_published_snapshot()
+        if published is None:
+            return None
+        return published.to_dict()
 
-    def get_ships_in_bbox(self, bbox_str: Optional[str] = None, max_items: Optional[int] = None) -> Dict[str, Any]:
+    def get_published_snapshot(self) -> Optional[ShipsSnapshot]:
+        """Devuelve el último snapshot inmutable publicado, sin copiarlo.
+
+        Lo publica la tarea de fondo cada ``update_interval``; mientras la ingesta
+        esté viva nunca se construye en la petición, aunque aún no haya nada
+        publicado. Sólo sin ingesta (p. ej. hilo parado) se reconstruye bajo demanda.
+        """
+
+        if not self._provider_enabled or websockets is None:
+            return None
+        self._read_since_persist = True
+        published = self._published
+        if self._builder_active or (self._task is not None and not self._task.done()):
+            return published
+        now = time.time()
+        if published is EMPTY_SNAPSHOT or now - published.built_at >= max(1, self._update_interval):
+            self._apply_deferred(now)
+            published = self._publish_snapshot(now)
+        return published
+
+    def get_ships_in_bbox(
+        self,
+        bbox_str: Optional[str] = None,
+        max_items: Optional[int] = None,
+        priority: str = "recent",
+        tracks: bool = False,
+    ) -> Dict[str, Any]:
         """
         Devuelve barcos filtrados por bounding box.
         bbox_str: "minLon,minLat,maxLon,maxLat"
+
+        Usa el índice en rejilla del almacén; si hay que recortar a ``max_items``
+        se conservan los de mayor prioridad (``recent`` o ``speed``). Con
+        ``tracks`` cada feature incluye su estela en ``properties.track``.
         """
-        snapshot = self.get_snapshot()
-        if not snapshot:
-             return {"type": "FeatureCollection", "features": []}
-        
-        if not bbox_str:
-            return snapshot
-            
-        try:
-            parts = [float(x) for x in bbox_str.split(",")]
-            if len(parts) != 4:
-                return snapshot
-            
-            min_lon, min_lat, max_lon, max_lat = parts
-            
-            filtered = []
-            for f in snapshot.get("features", []):
-                geo = f.get("geometry", {})
-                coords = geo.get("coordinates")
-                if not coords or len(coords) < 2:
-                    continue
-                lon, lat = coords
-                if min_lon <= lon <= max_lon and min_lat <= lat <= max_lat:
-                    filtered.append(f)
-            
-            # Limit items if needed (simple slice)
-            if max_items and len(filtered) > max_items:
-                filtered = filtered[:max_items]
-                
-            snapshot["features"] = filtered
-            snapshot["meta"] = snapshot.get("meta", {})
-            snapshot["meta"]["filtered_count"] = len(filtered)
-            return snapshot
-            
-        except Exception:
-            return snapshot
+        published = self.get_published_snapshot()
+        if published is None:
+            return {"type": "FeatureCollection", "features": []}
+
+        bounds = None
+        if bbox_str:
+            try:
+                parts = [float(x) for x in bbox_str.split(",")]
+            except ValueError:
+                parts = []
+            if len(parts) == 4:
+                bounds = parts
+        if bounds is None:
+            if not max_items and not tracks:
+                return published.to_dict()
+            bounds = [-180.0, -90.0, 180.0, 90.0]
+
+        min_lon, min_lat, max_lon, max_lat = bounds
+        now = time.time()
+        with self._lock:
+            records, total = self._vessels.query_bbox(
+                min_lat,
+                max_lat,
+                min_lon,
+                max_lon,
+                limit=max_items,
+                priority=priority,
+                min_ts=now - self._ttl_seconds,
+            )
+            since = now - self._ttl_seconds
+            track_points = (
+                {record.mmsi: self._tracks.get(record.mmsi, since=since) for record in records} if tracks else {}
+            )
+
+        meta = dict(published.meta)
+        meta.update({"filtered_count": len(records), "in_bbox": total, "priority": priority})
+        features = []
+        for record, feature in zip(records, self._features_for(records, now)):
+            if tracks:
+                feature["properties"]["track"] = [[lon, lat] for _, lat, lon in track_points[record.mmsi]]
+            features.append(feature)
+        return {"type": "FeatureCollection", "features": features, "meta": meta}
+
+    def get_track(self, mmsi: str) -> Optional[Dict[str, Any]]:
+        """Estela reciente de un barco como Feature LineString (``None`` si no hay)."""
+
+        with self._lock:
+            points = self._tracks.get(mmsi, since=time.time() - self._ttl_seconds)
+        if not points:
+            return None
+        return track_to_feature(mmsi, points)
 
     def get_status(self) -> Dict[str, Any]:
         """Información de estado para healthcheck."""
@@ -199,6 +343,18 @@ class AISStreamService:
                 "last_message_ts": self._last_message_ts,
                 "update_interval": self._update_interval,
                 "ttl_seconds": self._ttl_seconds,
+                "ingest_mode": "event_loop" if self._task is not None and not self._task.done() else (
+                    "thread" if self._thread is not None else None
+                ),
+                "store": self._vessels.describe(),
+                "ingest": self._throttle.describe(),
+                "static": self._static.describe(),
+                "tracks": self._tracks.describe(),
+                "subscription": dict(
+                    self._subscription_stats.describe(),
+                    boxes=self._bbox,
+                    view_override=self._view_boxes is not None,
+                ),
                 "has_api_key": self._secret_store.has_secret(SECRET_NAME),
                 "last_error": self._last_error,
             }
@@ -207,6 +363,8 @@ class AISStreamService:
     # Thread lifecycle
     # ------------------------------------------------------------------
     def _start_thread_locked(self) -> None:
+        if self._ingest_mode == "event_loop" and self._start_task_locked():
+            return
         if self._thread and self._thread.is_alive():
             return
         stop_event = threading.Event()
@@ -222,6 +380,7 @@ class AISStreamService:
         thread.start()
 
     def _stop_thread_locked(self) -> None:
+        self._stop_task_locked()
         if not self._thread:
             return
         stop_event = self._thread_stop
@@ -234,6 +393,69 @@ class AISStreamService:
             thread.join(timeout=5)
         self._ws_connected = False
 
+    def _start_task_locked(self) -> bool:
+        """Arranca la ingesta en el bucle de eventos; ``False`` si no hay bucle."""
+
+        if self._task is not None and not self._task.done():
+            return True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = self._loop
+        if loop is None or loop.is_closed():
+            self._logger.warning("AISStream event_loop mode requested without a running loop; using a thread")
+            return False
+        self._loop = loop
+        stop_event = asyncio.Event()
+        self._task_stop = stop_event
+
+        def _create() -> None:
+            self._task = loop.create_task(self._supervise(stop_event), name="AISStreamService")
+
+        self._logger.info("Starting AISStream ingest task in the application event loop")
+        if _on_loop_thread(loop):
+            _create()
+        else:
+            loop.call_soon_threadsafe(_create)
+        return True
+
+    def _stop_task_locked(self) -> None:
+        task, stop_event, loop = self._task, self._task_stop, self._loop
+        self._task = None
+        self._task_stop = None
+        if task is None or loop is None or loop.is_closed():
+            return
+
+        def _stop() -> None:
+            # Parada cooperativa: los bucles comprueban el evento; cancel() corta
+            # las esperas largas (recv) sin tener que esperar al timeout
+            if stop_event is not None:
+                stop_event.set()
+            task.cancel()
+
+        if _on_loop_thread(loop):
+            _stop()
+        else:
+            loop.call_soon_threadsafe(_stop)
+        self._ws_connected = False
+
+    async def _supervise(self, stop_event: asyncio.Event) -> None:
+        """Mantiene viva la ingesta dentro del bucle: si falla, se reinicia."""
+
+        backoff = 1.0
+        while not stop_event.is_set():
+            try:
+                await self._run_async(stop_event)
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa: BLE001 - log unexpected errors
+                self._logger.exception("AISStream ingest task failed; restarting")
+                with self._lock:
+                    self._last_error = "task-crashed"
+                    self._ws_connected = False
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+
     # ------------------------------------------------------------------
     # Background thread
     # ------------------------------------------------------------------
@@ -246,7 +468,62 @@ class AISStreamService:
                 self._last_error = "thread-crashed"
                 self._ws_connected = False
 
-    async def _run_async(self, stop_event: threading.Event) -> None:
+    async def _snapshot_loop(self, stop_event: StopEvent) -> None:
+        """Publica snapshots periódicamente para que las peticiones sólo lean referencias.
+
+        En modo ``event_loop`` los registros se copian aquí, en el bucle (lock
+        sin contención), y la serialización va a un hilo que no toca el lock.
+        En modo ``thread`` este bucle ya es el del hilo de ingesta: sin saltos.
+        """
+
+        in_app_loop = isinstance(stop_event, asyncio.Event)
+        self._builder_active = True
+        try:
+            while not stop_event.is_set():
+                try:
+                    now = time.time()
+                    self._apply_deferred(now)
+                    if in_app_loop:
+                        records, meta = self._collect_snapshot(now)
+                        await asyncio.to_thread(self._render_snapshot, records, meta, now)
+                    else:
+                        self._publish_snapshot(now)
+                except Exception:  # noqa: BLE001
+                    self._logger.exception("Failed to publish ships snapshot")
+                await asyncio.sleep(max(1, self._update_interval))
+        finally:
+            self._builder_active = False
+
+    async def _expiry_loop(self, stop_event: StopEvent) -> None:
+        """Expira barcos antiguos aunque nadie pida snapshots."""
+
+        while not stop_event.is_set():
+            await asyncio.sleep(max(1, min(30, self._ttl_seconds // 4)))
+            with self._lock:
+                before = time.time() - self._ttl_seconds
+                removed = self._vessels.expire(before)
+                self._tracks.expire(before)
+            if removed:
+                self._logger.debug("Expired %d AIS vessels", removed)
+            await asyncio.to_thread(self._static.save)
+
+    async def _run_async(self, stop_event: StopEvent) -> None:
+        tasks = [
+            asyncio.create_task(self._snapshot_loop(stop_event)),
+            asyncio.create_task(self._expiry_loop(stop_event)),
+        ]
+        try:
+            await self._run_connection_loop(stop_event)
+        finally:
+            for task in tasks:
+                task.cancel()
+            for task in tasks:
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+    async def _run_connection_loop(self, stop_event: StopEvent) -> None:
         backoff = 1.0
         while not stop_event.is_set():
             if not self._provider_enabled:
@@ -299,45 +576,91 @@ class AISStreamService:
         self,
         ws: WebSocketClientProtocol,
         api_key: str,
-        stop_event: threading.Event,
+        stop_event: StopEvent,
     ) -> None:
-        # Construcción de suscripción simplificada y robusta (Verified Script Logic)
-        subscription = {
-            "APIKey": api_key,
-            "BoundingBoxes": self._bbox, # Formato [[[lat,lon], [lat,lon]]]
-            "FilterMessageTypes": ["PositionReport", "StandardClassBPositionReport"]
-        }
-        
-        payload_str = json.dumps(subscription)
-        await ws.send(payload_str)
-        self._logger.info("Subscribed to AISStream with bbox: %s", self._bbox)
+        version = await self._send_subscription(ws, api_key, live=False)
 
         with self._lock:
             self._ws_connected = True
             self._last_error = None
 
-        while not stop_event.is_set():
+        watcher = asyncio.create_task(self._watch_subscription(ws, api_key, version, stop_event))
+        try:
+            while not stop_event.is_set():
+                try:
+                    message = await asyncio.wait_for(ws.recv(), timeout=60)
+                    if isinstance(message, bytes):
+                        message = message.decode("utf-8", errors="ignore")
+
+                    self._subscription_stats.count()
+                    self._handle_message(message)
+
+                except asyncio.TimeoutError:
+                    self._logger.warning("AISStream read timeout")
+                    break
+                except Exception as e:
+                    self._logger.error("AISStream read error: %s", e)
+                    break
+        finally:
+            watcher.cancel()
             try:
-                message = await asyncio.wait_for(ws.recv(), timeout=60)
-                if isinstance(message, bytes):
-                    message = message.decode("utf-8", errors="ignore")
-                
-                self._handle_message(message)
-                
-            except asyncio.TimeoutError:
-                self._logger.warning("AISStream read timeout")
-                break
-            except Exception as e:
-                self._logger.error("AISStream read error: %s", e)
-                break
-        
+                await watcher
+            except asyncio.CancelledError:
+                pass
+
         with self._lock:
             self._ws_connected = False
 
+    async def _send_subscription(self, ws: WebSocketClientProtocol, api_key: str, live: bool) -> int:
+        # Construcción de suscripción simplificada y robusta (Verified Script Logic)
+        with self._lock:
+            boxes = self._bbox
+            version = self._subscription_version
+        subscription = {
+            "APIKey": api_key,
+            "BoundingBoxes": boxes,  # Formato [[[lat,lon], [lat,lon]]]
+            "FilterMessageTypes": ["PositionReport", "StandardClassBPositionReport", *STATIC_MESSAGE_TYPES],
+        }
+        await ws.send(json.dumps(subscription))
+        self._subscription_stats.start(boxes, live=live)
+        self._logger.info(
+            "%s AISStream with %d bbox(es): %s", "Re-subscribed" if live else "Subscribed to", len(boxes), boxes
+        )
+        return version
+
+    async def _watch_subscription(
+        self,
+        ws: WebSocketClientProtocol,
+        api_key: str,
+        sent_version: int,
+        stop_event: StopEvent,
+    ) -> None:
+        """Reenvía la suscripción por el socket abierto cuando cambian las cajas."""
+
+        while not stop_event.is_set():
+            await asyncio.sleep(1)
+            if self._subscription_version != sent_version:
+                sent_version = await self._send_subscription(ws, api_key, live=True)
+
     # ------------------------------------------------------------------
     # Message handling
     # ------------------------------------------------------------------
     def _handle_message(self, payload: str) -> None:
+        # Aplazamiento barato de informes repetidos antes de parsear el JSON
+        now = time.time()
+        if not self._throttle.admit(payload, now):
+            return
+        self._apply_message(payload, now)
+
+    def _apply_deferred(self, now: float) -> int:
+        """Aplica el último informe aplazado de cada barco cuyo intervalo ha vencido."""
+
+        ready = self._throttle.due(now)
+        for payload, received_at in ready:
+            self._apply_message(payload, received_at)
+        return len(ready)
+
+    def _apply_message(self, payload: str, received_at: float) -> None:
         try:
             data = json.loads(payload)
         except json.JSONDecodeError:
@@ -348,6 +671,14 @@ class AISStreamService:
         if not isinstance(msg_container, dict):
             return
 
+        for static_type in STATIC_MESSAGE_TYPES:
+            static_body = msg_container.get(static_type)
+            if isinstance(static_body, dict):
+                parsed = parse_static_message(static_type, static_body)
+                if parsed is not None:
+                    self._static.update(*parsed)
+                return
+
         # Buscar reporte de posición (Class A o B)
         report = msg_container.get("PositionReport")
         if not report:
@@ -386,41 +717,23 @@ class AISStreamService:
             cog = float(report.get("Cog", 0))
             heading = float(report.get("TrueHeading", 0))
             
-            # Construir feature
-            properties = {
-                "mmsi": mmsi,
-                "speed": sog,
-                "course": cog,
-                "heading": heading,
-                "source": "aisstream",
-                "timestamp": int(time.time())
-            }
-
             # Enriquecer con MetaData si existe
+            name = None
+            ship_type = None
             meta = data.get("MetaData")
             if isinstance(meta, dict):
                 if "ShipName" in meta:
-                    properties["name"] = str(meta["ShipName"]).strip()
+                    name = str(meta["ShipName"]).strip()
                 if "ShipTypeName" in meta:
-                    properties["shipType"] = str(meta["ShipTypeName"])
-
-            feature = {
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [lon, lat]
-                },
-                "properties": properties
-            }
+                    ship_type = str(meta["ShipTypeName"])
 
-            # Actualizar estado
-            now = time.time()
+            # Actualizar estado (la feature GeoJSON se genera al serializar)
+            record = VesselRecord(mmsi, lat, lon, sog, cog, heading, received_at, name, ship_type)
             with self._lock:
-                self._vessels[mmsi] = {
-                    "feature": feature, 
-                    "received_at": now
-                }
-                self._last_message_ts = now
+                self._vessels.upsert(record)
+                if self._tracks_enabled:
+                    self._tracks.add(mmsi, received_at, lat, lon)
+                self._last_message_ts = max(self._last_message_ts or 0.0, received_at)
 
         except (ValueError, TypeError):
             # Ignorar errores de conversión
@@ -429,39 +742,131 @@ class AISStreamService:
     # ------------------------------------------------------------------
     # Helpers
     # ------------------------------------------------------------------
+    def _refresh_subscription_locked(self) -> None:
+        boxes = self._view_boxes or self._config_boxes
+        if boxes != self._bbox:
+            self._bbox = boxes
+            self._subscription_version += 1
+
     def _reset_state_locked(self) -> None:
         self._vessels.clear()
-        self._snapshot = {"type": "FeatureCollection", "features": []}
-        self._last_snapshot = 0.0
+        self._tracks.clear()
+        self._throttle.reset()
+        self._published = EMPTY_SNAPSHOT
         self._ws_connected = False
         self._last_message_ts = None
 
-    def _build_snapshot_locked(self, now: float) -> None:
-        expire_before = now - self._ttl_seconds
-        features = []
-        to_remove = []
-        for key, entry in self._vessels.items():
-            feature = entry.get("feature")
-            received_at = float(entry.get("received_at", now))
-            props = feature.get("properties", {}) if isinstance(feature, dict) else {}
-            ts_value = props.get("timestamp")
-            if isinstance(ts_value, (int, float)):
-                received_at = float(ts_value)
-            if received_at < expire_before:
-                to_remove.append(key)
-                continue
-            features.append(feature)
+    def _build_snapshot_locked(self, now: float) -> Tuple[List[VesselRecord], Dict[str, Any]]:
+        self._vessels.expire(now - self._ttl_seconds)
+        # Los registros se sustituyen (no se mutan) en cada mensaje: basta con
+        # copiar las referencias y materializar las features fuera del lock
+        records = list(self._vessels)
+
+        meta = {
+            "provider": "aisstream",
+            "ws_connected": self._ws_connected,
+            "buffer_size": len(self._vessels),
+            "last_message_ts": self._last_message_ts,
+            "update_interval": self._update_interval,
+            "ok": self._ws_connected and len(self._vessels) > 0,
+            "built_at": now,
+        }
+        return records, meta
+
+    def _features_for(self, records: List[VesselRecord], now: float) -> List[Dict[str, Any]]:
+        """Materializa features con datos estáticos y posición estimada a ``now``."""
+
+        static = self._static
+        if not records or self._dr_max_seconds <= 0:
+            return [record.to_feature(static.get(record.mmsi)) for record in records]
+        lat, lon, applied = extrapolate(
+            [record.lat for record in records],
+            [record.lon for record in records],
+            [record.sog * KNOTS_TO_MS if record.sog < AIS_SOG_UNAVAILABLE else float("nan") for record in records],
+            [record.cog if record.cog < AIS_COG_UNAVAILABLE else float("nan") for record in records],
+            [now - record.ts for record in records],
+            self._dr_max_seconds,
+        )
+        return [
+            record.to_feature(static.get(record.mmsi), (float(lat[i]), float(lon[i]), float(applied[i])))
+            for i, record in enumerate(records)
+        ]
 
-        for key in to_remove:
-            self._vessels.pop(key, None)
+    def _publish_snapshot(self, now: float) -> ShipsSnapshot:
+        """Construye y publica un snapshot inmutable con su JSON pre-serializado."""
 
-        snapshot = {"type": "FeatureCollection", "features": features}
-        self._snapshot = snapshot
-        self._last_snapshot = now
-        try:
-            self._cache_store.store("ships_stream", snapshot)
-        except Exception:  # noqa: BLE001 - errores de escritura no deben interrumpir el servicio
-            self._logger.debug("Failed to persist AISStream snapshot", exc_info=True)
+        records, meta = self._collect_snapshot(now)
+        return self._render_snapshot(records, meta, now)
+
+    def _collect_snapshot(self, now: float) -> Tuple[List[VesselRecord], Dict[str, Any]]:
+        with self._lock:
+            return self._build_snapshot_locked(now)
+
+    def _render_snapshot(self, records: List[VesselRecord], meta: Dict[str, Any], now: float) -> ShipsSnapshot:
+        # Sin lock: la ingesta no espera por la serialización
+        features = tuple(self._features_for(records, now))
+        collection = {"type": "FeatureCollection", "features": features, "meta": meta}
+        body = json.dumps(collection, separators=(",", ":")).encode("utf-8")
+        etag = self._state_etag(records, meta, features)
+        published = ShipsSnapshot(
+            features=features,
+            meta=MappingProxyType(meta),
+            body=body,
+            etag=etag,
+            built_at=now,
+        )
+        self._published = published
+        self._logger.debug("Published ships snapshot: %d vessels", len(features))
+        if self._read_since_persist and now - self._persisted_at >= SNAPSHOT_PERSIST_SECONDS:
+            self._read_since_persist = False
+            self._persisted_at = now
+            try:
+                self._cache_store.store("ships_stream", {"type": "FeatureCollection", "features": list(features)})
+            except Exception:  # noqa: BLE001 - errores de escritura no deben interrumpir el servicio
+                self._logger.debug("Failed to persist AISStream snapshot", exc_info=True)
+        return published
+
+    def _state_etag(
+        self,
+        records: List[VesselRecord],
+        meta: Mapping[str, Any],
+        features: Tuple[Dict[str, Any], ...],
+    ) -> str:
+        """Hash de los datos recibidos y de las posiciones estimadas (meta sin ``built_at``)."""
+
+        digest = hashlib.blake2b(digest_size=12)
+        stable = {key: value for key, value in meta.items() if key != "built_at"}
+        digest.update(json.dumps(stable, sort_keys=True).encode("utf-8"))
+        static = self._static
+        for record in records:
+            digest.update(
+                repr(
+                    (
+                        record.mmsi,
+                        record.ts,
+                        record.lat,
+                        record.lon,
+                        record.sog,
+                        record.cog,
+                        record.heading,
+                        record.name,
+                        record.ship_type,
+                        static.get(record.mmsi),
+                    )
+                ).encode("utf-8")
+            )
+        for feature in features:
+            # Sólo las estimadas difieren de lo recibido; cambian con cada publicación
+            if "dr_seconds" in feature["properties"]:
+                digest.update(repr(feature["geometry"]["coordinates"]).encode("utf-8"))
+        return '"' + digest.hexdigest() + '"'
+
+
+def _on_loop_thread(loop: asyncio.AbstractEventLoop) -> bool:
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
 
 
 def _to_float(value: Any) -> Optional[float]:
@@ -0,0 +1,264 @@
+"""Seguimiento incremental de la proximidad de tormentas a la ubicación configurada.
+
+El tracker se alimenta con los rayos a medida que llegan (callback de
+``BlitzortungService``) y mantiene agregados por minuto: número de rayos,
+suma de coordenadas y distancia mínima. Consultar el estado sólo recorre los
+buckets de la ventana (p. ej. 30), nunca los rayos individuales, así que el
+endpoint puede sondearse cada segundo.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON_EQUATOR = 111.32
+
+# Por debajo de esta velocidad radial se considera que la tormenta no se mueve
+STATIONARY_KMH = 3.0
+# Mínimo de buckets con rayos y de intervalo cubierto para estimar tendencia
+MIN_TREND_BUCKETS = 3
+MIN_TREND_SPAN_SECONDS = 300.0
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bearing_deg(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dlambda = math.radians(lon2 - lon1)
+    x = math.sin(dlambda) * math.cos(phi2)
+    y = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dlambda)
+    return (math.degrees(math.atan2(x, y)) + 360.0) % 360.0
+
+
+def _weighted_slope(points: List[Tuple[float, float, float]]) -> Optional[float]:
+    """Pendiente de mínimos cuadrados ponderados para (t, valor, peso)."""
+    total_w = sum(w for _, _, w in points)
+    if total_w <= 0:
+        return None
+    mean_t = sum(t * w for t, _, w in points) / total_w
+    mean_v = sum(v * w for _, v, w in points) / total_w
+    var_t = sum(w * (t - mean_t) ** 2 for t, _, w in points)
+    if var_t <= 0:
+        return None
+    cov = sum(w * (t - mean_t) * (v - mean_v) for t, v, w in points)
+    return cov / var_t
+
+
+@dataclass
+class _Bucket:
+    count: int = 0
+    sum_lat: float = 0.0
+    sum_lon: float = 0.0
+    sum_ts: float = 0.0
+    min_distance_km: float = math.inf
+    nearest_lat: float = 0.0
+    nearest_lon: float = 0.0
+    nearest_ts: float = 0.0
+
+
+class StormProximityTracker:
+    """Distancia a la tormenta más cercana y velocidad de aproximación."""
+
+    def __init__(
+        self,
+        lat: float,
+        lon: float,
+        radius_km: float = 150.0,
+        window_seconds: int = 1800,
+        bucket_seconds: int = 60,
+    ) -> None:
+        self.lat = float(lat)
+        self.lon = float(lon)
+        self.radius_km = float(radius_km)
+        self.window_seconds = int(window_seconds)
+        self.bucket_seconds = int(bucket_seconds)
+        self._lock = threading.Lock()
+        self._buckets: Dict[int, _Bucket] = {}
+        self._version = 0
+        self._cached: Optional[Tuple[int, int, Dict[str, Any]]] = None
+        self.ignored_far = 0
+
+    def add_strikes(self, strikes: Iterable[Any]) -> None:
+        """Incorpora rayos nuevos (compatible con el callback de BlitzortungService)."""
+        lat0, lon0 = self.lat, self.lon
+        radius = self.radius_km
+        cos_lat0 = math.cos(math.radians(lat0))
+        # Cota rápida en grados para descartar sin trigonometría
+        max_dlat = radius / KM_PER_DEG_LAT
+        max_dlon = radius / max(1e-6, KM_PER_DEG_LON_EQUATOR * cos_lat0)
+        oldest = time.time() - self.window_seconds
+        with self._lock:
+            changed = False
+            for strike in strikes:
+                if strike.timestamp < oldest:
+                    continue
+                if abs(strike.lat - lat0) > max_dlat or abs(strike.lon - lon0) > max_dlon:
+                    self.ignored_far += 1
+                    continue
+                distance = haversine_km(lat0, lon0, strike.lat, strike.lon)
+                if distance > radius:
+                    self.ignored_far += 1
+                    continue
+                index = int(strike.timestamp // self.bucket_seconds)
+                bucket = self._buckets.get(index)
+                if bucket is None:
+                    bucket = _Bucket()
+                    self._buckets[index] = bucket
+                bucket.count += 1
+                bucket.sum_lat += strike.lat
+                bucket.sum_lon += strike.lon
+                bucket.sum_ts += strike.timestamp
+                if distance < bucket.min_distance_km:
+                    bucket.min_distance_km = distance
+                    bucket.nearest_lat = strike.lat
+                    bucket.nearest_lon = strike.lon
+                    bucket.nearest_ts = strike.timestamp
+                changed = True
+            if changed:
+                self._version += 1
+
+    def set_location(self, lat: float, lon: float) -> None:
+        """Cambia la ubicación de referencia (descarta el estado acumulado)."""
+        with self._lock:
+            if (float(lat), float(lon)) == (self.lat, self.lon):
+                return
+            self.lat = float(lat)
+            self.lon = float(lon)
+            self._buckets.clear()
+            self._version += 1
+
+    def _expire_locked(self, now: float) -> None:
+        first_valid = int((now - self.window_seconds) // self.bucket_seconds)
+        for index in [i for i in self._buckets if i < first_valid]:
+            del self._buckets[index]
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Estado actual. Se recalcula como mucho una vez por segundo y versión."""
+        now = time.time() if now is None else now
+        second = int(now)
+        with self._lock:
+            cached = self._cached
+            if cached and cached[0] == self._version and cached[1] == second:
+                return cached[2]
+            self._expire_locked(now)
+            buckets = sorted(self._buckets.items())
+            version = self._version
+            result = self._compute(buckets, now)
+            self._cached = (version, second, result)
+            return result
+
+    def _compute(self, buckets: List[Tuple[int, _Bucket]], now: float) -> Dict[str, Any]:
+        base: Dict[str, Any] = {
+            "location": {"lat": self.lat, "lon": self.lon},
+            "radius_km": self.radius_km,
+            "window_seconds": self.window_seconds,
+            "ts": now,
+        }
+        total = sum(b.count for _, b in buckets)
+        if not total:
+            base.update({"active": False, "status": "none", "strike_count": 0, "summary": "Sin tormentas cerca"})
+            return base
+
+        nearest = min((b for _, b in buckets), key=lambda b: b.min_distance_km)
+        sum_lat = sum(b.sum_lat for _, b in buckets)
+        sum_lon = sum(b.sum_lon for _, b in buckets)
+        centroid_lat, centroid_lon = sum_lat / total, sum_lon / total
+        centroid_distance = haversine_km(self.lat, self.lon, centroid_lat, centroid_lon)
+
+        # Rayos en los últimos 5 minutos (ritmo actual de la tormenta)
+        recent_from = now - 300
+        recent = sum(b.count for i, b in buckets if (i + 1) * self.bucket_seconds > recent_from)
+
+        approach_kmh: Optional[float] = None
+        movement: Optional[Dict[str, float]] = None
+        active_buckets = [b for _, b in buckets if b.count]
+        if len(active_buckets) >= MIN_TREND_BUCKETS:
+            times = [b.sum_ts / b.count for b in active_buckets]
+            if times[-1] - times[0] >= MIN_TREND_SPAN_SECONDS:
+                cos_lat0 = math.cos(math.radians(self.lat))
+                dist_points, x_points, y_points = [], [], []
+                for t, b in zip(times, active_buckets):
+                    c_lat, c_lon = b.sum_lat / b.count, b.sum_lon / b.count
+                    dist_points.append((t, haversine_km(self.lat, self.lon, c_lat, c_lon), b.count))
+                    x_points.append((t, (c_lon - self.lon) * KM_PER_DEG_LON_EQUATOR * cos_lat0, b.count))
+                    y_points.append((t, (c_lat - self.lat) * KM_PER_DEG_LAT, b.count))
+                slope = _weighted_slope(dist_points)
+                vx = _weighted_slope(x_points)
+                vy = _weighted_slope(y_points)
+                if slope is not None:
+                    approach_kmh = -slope * 3600.0
+                if vx is not None and vy is not None:
+                    vx_kmh, vy_kmh = vx * 3600.0, vy * 3600.0
+                    movement = {
+                        "speed_kmh": round(math.hypot(vx_kmh, vy_kmh), 1),
+                        "heading_deg": round((math.degrees(math.atan2(vx_kmh, vy_kmh)) + 360.0) % 360.0, 1),
+                        "east_kmh": round(vx_kmh, 1),
+                        "north_kmh": round(vy_kmh, 1),
+                    }
+
+        if approach_kmh is None:
+            status = "unknown"
+        elif approach_kmh > STATIONARY_KMH:
+            status = "approaching"
+        elif approach_kmh < -STATIONARY_KMH:
+            status = "receding"
+        else:
+            status = "stationary"
+
+        eta_minutes = None
+        if status == "approaching" and approach_kmh:
+            eta_minutes = round(nearest.min_distance_km / approach_kmh * 60.0)
+
+        nearest_km = round(nearest.min_distance_km, 1)
+        summary = f"Tormenta a {nearest_km:.0f} km"
+        if status == "approaching":
+            summary += f", acercándose a {approach_kmh:.0f} km/h"
+        elif status == "receding":
+            summary += f", alejándose a {-approach_kmh:.0f} km/h"
+        elif status == "stationary":
+            summary += ", estacionaria"
+
+        base.update(
+            {
+                "active": True,
+                "status": status,
+                "summary": summary,
+                "strike_count": total,
+                "strikes_last_5min": recent,
+                "nearest": {
+                    "distance_km": nearest_km,
+                    "lat": nearest.nearest_lat,
+                    "lon": nearest.nearest_lon,
+                    "ts": nearest.nearest_ts,
+                    "age_seconds": max(0, int(now - nearest.nearest_ts)),
+                    "bearing_deg": round(bearing_deg(self.lat, self.lon, nearest.nearest_lat, nearest.nearest_lon), 1),
+                },
+                "centroid": {
+                    "lat": round(centroid_lat, 5),
+                    "lon": round(centroid_lon, 5),
+                    "distance_km": round(centroid_distance, 1),
+                    "bearing_deg": round(bearing_deg(self.lat, self.lon, centroid_lat, centroid_lon), 1),
+                },
+                "approach_kmh": round(approach_kmh, 1) if approach_kmh is not None else None,
+                "eta_minutes": eta_minutes,
+                "movement": movement,
+            }
+        )
+        return base
+
+
+__all__ = ["StormProximityTracker", "bearing_deg", "haversine_km"]
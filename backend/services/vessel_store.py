@@ -0,0 +1,268 @@
+"""Almacén compacto y acotado de barcos AIS.
+
+Cada barco se guarda como un ``VesselRecord`` con ``__slots__`` (sin dict por
+instancia ni GeoJSON anidado); la feature sólo se materializa al serializar el
+snapshot. El orden del ``OrderedDict`` es el de ``ts`` (última recepción), así que la
+expulsión por capacidad (LRU) y la expiración por TTL sólo tocan la cabeza.
+
+Además se mantiene un índice en rejilla (celdas de ``cell_deg`` grados) que se
+actualiza con cada posición, de modo que las consultas por bbox sólo recorren
+las celdas que solapan.
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+DEFAULT_MAX_VESSELS = 10000
+DEFAULT_CELL_DEG = 0.5
+
+# Criterios de prioridad para recortar resultados: mayor valor = se conserva antes
+PRIORITY_KEYS: Dict[str, Callable[["VesselRecord"], float]] = {
+    "recent": lambda record: record.ts,
+    "speed": lambda record: record.sog,
+}
+
+Cell = Tuple[int, int]
+
+
+class VesselRecord:
+    __slots__ = ("mmsi", "lat", "lon", "sog", "cog", "heading", "ts", "name", "ship_type")
+
+    def __init__(
+        self,
+        mmsi: str,
+        lat: float,
+        lon: float,
+        sog: float,
+        cog: float,
+        heading: float,
+        ts: float,
+        name: Optional[str] = None,
+        ship_type: Optional[str] = None,
+    ) -> None:
+        self.mmsi = mmsi
+        self.lat = lat
+        self.lon = lon
+        self.sog = sog
+        self.cog = cog
+        self.heading = heading
+        self.ts = ts
+        self.name = name
+        self.ship_type = ship_type
+
+    def to_feature(
+        self,
+        static: Optional[Mapping[str, Any]] = None,
+        position: Optional[Tuple[float, float, float]] = None,
+    ) -> Dict[str, Any]:
+        """Feature GeoJSON; ``static`` añade los datos estáticos/de viaje del barco.
+
+        ``position`` es ``(lat, lon, segundos)`` estimada por navegación a estima;
+        si se indica, sustituye a la última posición recibida.
+        """
+
+        properties: Dict[str, Any] = {
+            "mmsi": self.mmsi,
+            "speed": self.sog,
+            "course": self.cog,
+            "heading": self.heading,
+            "source": "aisstream",
+            "timestamp": int(self.ts),
+        }
+        if self.name is not None:
+            properties["name"] = self.name
+        if self.ship_type is not None:
+            properties["shipType"] = self.ship_type
+        if static:
+            for key, value in static.items():
+                properties.setdefault(key, value)
+        lat, lon = self.lat, self.lon
+        if position is not None and position[2] > 0:
+            lat, lon = position[0], position[1]
+            properties["dr_seconds"] = int(position[2])
+        return {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            "properties": properties,
+        }
+
+
+class VesselStore:
+    """Barcos por MMSI con capacidad máxima y expulsión LRU por última recepción.
+
+    No es thread-safe: el servicio lo protege con su propio lock.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_MAX_VESSELS, cell_deg: float = DEFAULT_CELL_DEG) -> None:
+        self.capacity = max(1, int(capacity))
+        self.cell_deg = float(cell_deg)
+        self._records: "OrderedDict[str, VesselRecord]" = OrderedDict()
+        self._cells: Dict[Cell, Dict[str, VesselRecord]] = {}
+        self.evicted = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[VesselRecord]:
+        return iter(self._records.values())
+
+    def get(self, mmsi: str) -> Optional[VesselRecord]:
+        return self._records.get(mmsi)
+
+    def upsert(self, record: VesselRecord) -> None:
+        """Inserta o sustituye el registro manteniendo el orden por ``ts``.
+
+        Los informes diferidos llegan con un ``ts`` anterior a los ya aplicados;
+        se colocan detrás de los más nuevos para que ``expire`` y la expulsión
+        LRU puedan seguir mirando sólo la cabeza.
+        """
+
+        records = self._records
+        previous = records.get(record.mmsi)
+        if previous is not None:
+            # Conservar datos de MetaData que no vienen en todos los mensajes
+            if record.name is None:
+                record.name = previous.name
+            if record.ship_type is None:
+                record.ship_type = previous.ship_type
+            self._unindex(previous)
+        records[record.mmsi] = record
+        records.move_to_end(record.mmsi)
+        newer: List[str] = []
+        for mmsi in reversed(records):
+            if mmsi == record.mmsi:
+                continue
+            if records[mmsi].ts <= record.ts:
+                break
+            newer.append(mmsi)
+        for mmsi in reversed(newer):
+            records.move_to_end(mmsi)
+        self._cells.setdefault(self._cell_of(record.lat, record.lon), {})[record.mmsi] = record
+        while len(records) > self.capacity:
+            _, evicted = records.popitem(last=False)
+            self._unindex(evicted)
+            self.evicted += 1
+
+    def expire(self, before: float) -> int:
+        """Elimina los barcos no vistos desde ``before``. Coste O(expirados)."""
+
+        records = self._records
+        removed = 0
+        while records:
+            mmsi, record = next(iter(records.items()))
+            if record.ts >= before:
+                break
+            del records[mmsi]
+            self._unindex(record)
+            removed += 1
+        self.expired += removed
+        return removed
+
+    def set_capacity(self, capacity: int) -> None:
+        self.capacity = max(1, int(capacity))
+        while len(self._records) > self.capacity:
+            _, evicted = self._records.popitem(last=False)
+            self._unindex(evicted)
+            self.evicted += 1
+
+    def clear(self) -> None:
+        self._records.clear()
+        self._cells.clear()
+
+    def query_bbox(
+        self,
+        min_lat: float,
+        max_lat: float,
+        min_lon: float,
+        max_lon: float,
+        limit: Optional[int] = None,
+        priority: str = "recent",
+        min_ts: Optional[float] = None,
+    ) -> Tuple[List[VesselRecord], int]:
+        """Barcos dentro del bbox y total encontrado antes de recortar.
+
+        Si ``min_lon > max_lon`` el bbox cruza el antimeridiano. Con ``limit`` se
+        conservan los de mayor prioridad (``recent``: vistos más recientemente,
+        ``speed``: más rápidos), ordenados de mayor a menor.
+        """
+
+        if min_lat > max_lat:
+            min_lat, max_lat = max_lat, min_lat
+        if min_lon <= max_lon:
+            lon_ranges = [(min_lon, max_lon)]
+        else:
+            lon_ranges = [(min_lon, 180.0), (-180.0, max_lon)]
+
+        found: List[VesselRecord] = []
+        for lo_lon, hi_lon in lon_ranges:
+            for cell in self._cells_overlapping(min_lat, max_lat, lo_lon, hi_lon):
+                for record in cell.values():
+                    if min_ts is not None and record.ts < min_ts:
+                        continue
+                    if min_lat <= record.lat <= max_lat and lo_lon <= record.lon <= hi_lon:
+                        found.append(record)
+
+        total = len(found)
+        key = PRIORITY_KEYS.get(priority, PRIORITY_KEYS["recent"])
+        if limit is not None and 0 < limit < total:
+            return heapq.nlargest(limit, found, key=key), total
+        found.sort(key=key, reverse=True)
+        return found, total
+
+    def features(self) -> List[Dict[str, Any]]:
+        return [record.to_feature() for record in self._records.values()]
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._records),
+            "capacity": self.capacity,
+            "cells": len(self._cells),
+            "cell_deg": self.cell_deg,
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
+
+    # ------------------------------------------------------------------
+    # Índice en rejilla
+    # ------------------------------------------------------------------
+    def _cell_of(self, lat: float, lon: float) -> Cell:
+        return (int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg)))
+
+    def _unindex(self, record: VesselRecord) -> None:
+        key = self._cell_of(record.lat, record.lon)
+        cell = self._cells.get(key)
+        if cell is None:
+            return
+        if cell.get(record.mmsi) is record:
+            del cell[record.mmsi]
+            if not cell:
+                del self._cells[key]
+
+    def _cells_overlapping(
+        self, min_lat: float, max_lat: float, min_lon: float, max_lon: float
+    ) -> Iterable[Dict[str, VesselRecord]]:
+        row0, col0 = self._cell_of(min_lat, min_lon)
+        row1, col1 = self._cell_of(max_lat, max_lon)
+        wanted = (row1 - row0 + 1) * (col1 - col0 + 1)
+        if wanted >= len(self._cells):
+            # bbox muy grande: más barato recorrer sólo las celdas ocupadas
+            return [
+                cell
+                for (row, col), cell in self._cells.items()
+                if row0 <= row <= row1 and col0 <= col <= col1
+            ]
+        cells = []
+        for row in range(row0, row1 + 1):
+            for col in range(col0, col1 + 1):
+                cell = self._cells.get((row, col))
+                if cell:
+                    cells.append(cell)
+        return cells
+
+
+__all__ = ["DEFAULT_CELL_DEG", "DEFAULT_MAX_VESSELS", "PRIORITY_KEYS", "VesselRecord", "VesselStore"]
@@ -0,0 +1,198 @@
+"""Estelas recientes por barco en anillos compactos.
+
+Cada MMSI guarda sus últimas posiciones en un ``array('d')`` plano
+``[ts, lat, lon, ts, lat, lon, ...]`` usado como anillo de ``max_points``.
+Para que un rumbo recto no llene el anillo se submuestrea: se ignoran los
+desplazamientos menores que ``min_distance_m`` y, mientras el rumbo no cambie
+más de ``min_turn_deg``, se mueve el último punto en lugar de añadir otro.
+El total de puntos de todos los barcos está acotado; al superarlo se descartan
+las estelas actualizadas hace más tiempo. Un informe demasiado cercano no
+añade punto pero sí renueva la hora del último, para que un barco amarrado que
+sigue emitiendo no vea caducar su estela.
+"""
+
+from __future__ import annotations
+
+import math
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+METERS_PER_DEG = 111_320.0
+STRIDE = 3
+
+
+def _offset_m(lat1: float, lon1: float, lat2: float, lon2: float) -> tuple:
+    dy = (lat2 - lat1) * METERS_PER_DEG
+    dx = (lon2 - lon1) * METERS_PER_DEG * math.cos(math.radians((lat1 + lat2) / 2))
+    return dx, dy
+
+
+def _turn_deg(a: float, b: float) -> float:
+    diff = abs(a - b) % 360.0
+    return 360.0 - diff if diff > 180.0 else diff
+
+
+class _Track:
+    __slots__ = ("data", "start", "bearing")
+
+    def __init__(self) -> None:
+        self.data = array("d")
+        self.start = 0
+        # Rumbo del último segmento, para decidir si el punto nuevo lo prolonga
+        self.bearing: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self.data) // STRIDE
+
+    def _slot(self, index: int, max_points: int) -> int:
+        return ((self.start + index) % max_points) * STRIDE
+
+    def last(self, max_points: int) -> tuple:
+        offset = self._slot(len(self) - 1, max_points)
+        return self.data[offset], self.data[offset + 1], self.data[offset + 2]
+
+    def points(self, max_points: int) -> List[tuple]:
+        result = []
+        for index in range(len(self)):
+            offset = self._slot(index, max_points)
+            result.append((self.data[offset], self.data[offset + 1], self.data[offset + 2]))
+        return result
+
+
+class VesselTrackStore:
+    """Anillos de posiciones recientes por MMSI con límite global de memoria.
+
+    No es thread-safe: el servicio lo protege con su propio lock.
+    """
+
+    def __init__(
+        self,
+        max_points: int = 32,
+        min_distance_m: float = 150.0,
+        min_turn_deg: float = 8.0,
+        max_total_points: int = 200_000,
+    ) -> None:
+        self.max_points = max(2, int(max_points))
+        self.min_distance_m = float(min_distance_m)
+        self.min_turn_deg = float(min_turn_deg)
+        self.max_total_points = max(self.max_points, int(max_total_points))
+        self._tracks: "OrderedDict[str, _Track]" = OrderedDict()
+        self._total_points = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    @property
+    def total_points(self) -> int:
+        return self._total_points
+
+    def configure(self, max_points: int, max_total_points: int) -> None:
+        max_points = max(2, int(max_points))
+        if max_points != self.max_points:
+            # Cambiar el tamaño del anillo invalida la disposición de los datos
+            self._tracks.clear()
+            self._total_points = 0
+            self.max_points = max_points
+        self.max_total_points = max(self.max_points, int(max_total_points))
+        self._enforce_budget()
+
+    def add(self, mmsi: str, ts: float, lat: float, lon: float) -> None:
+        track = self._tracks.get(mmsi)
+        if track is None:
+            track = _Track()
+            self._tracks[mmsi] = track
+        else:
+            self._tracks.move_to_end(mmsi)
+
+        count = len(track)
+        if count:
+            _, last_lat, last_lon = track.last(self.max_points)
+            dx, dy = _offset_m(last_lat, last_lon, lat, lon)
+            if dx * dx + dy * dy < self.min_distance_m * self.min_distance_m:
+                offset = track._slot(count - 1, self.max_points)
+                track.data[offset] = max(track.data[offset], ts)
+                return
+            bearing = math.degrees(math.atan2(dx, dy)) % 360.0
+            if count >= 2 and track.bearing is not None and _turn_deg(bearing, track.bearing) < self.min_turn_deg:
+                # Rumbo recto: se prolonga el último segmento
+                prev_offset = track._slot(count - 2, self.max_points)
+                pdx, pdy = _offset_m(track.data[prev_offset + 1], track.data[prev_offset + 2], lat, lon)
+                offset = track._slot(count - 1, self.max_points)
+                track.data[offset] = ts
+                track.data[offset + 1] = lat
+                track.data[offset + 2] = lon
+                track.bearing = math.degrees(math.atan2(pdx, pdy)) % 360.0
+                return
+            track.bearing = bearing
+
+        if count < self.max_points:
+            track.data.extend((ts, lat, lon))
+            self._total_points += 1
+            self._enforce_budget()
+        else:
+            offset = track.start * STRIDE
+            track.data[offset] = ts
+            track.data[offset + 1] = lat
+            track.data[offset + 2] = lon
+            track.start = (track.start + 1) % self.max_points
+
+    def get(self, mmsi: str, since: Optional[float] = None) -> List[tuple]:
+        """Puntos ``(ts, lat, lon)`` del más antiguo al más reciente."""
+
+        track = self._tracks.get(mmsi)
+        if track is None:
+            return []
+        points = track.points(self.max_points)
+        if since is not None:
+            points = [point for point in points if point[0] >= since]
+        return points
+
+    def discard(self, mmsi: str) -> None:
+        track = self._tracks.pop(mmsi, None)
+        if track is not None:
+            self._total_points -= len(track)
+
+    def expire(self, before: float) -> int:
+        """Elimina las estelas sin actualizar desde ``before``."""
+
+        removed = 0
+        while self._tracks:
+            mmsi, track = next(iter(self._tracks.items()))
+            if track.last(self.max_points)[0] >= before:
+                break
+            self.discard(mmsi)
+            removed += 1
+        return removed
+
+    def clear(self) -> None:
+        self._tracks.clear()
+        self._total_points = 0
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "vessels": len(self._tracks),
+            "points": self._total_points,
+            "max_points": self.max_points,
+            "max_total_points": self.max_total_points,
+            "bytes": self._total_points * STRIDE * 8,
+            "evicted": self.evicted,
+        }
+
+    def _enforce_budget(self) -> None:
+        while self._total_points > self.max_total_points and self._tracks:
+            mmsi, _ = next(iter(self._tracks.items()))
+            self.discard(mmsi)
+            self.evicted += 1
+
+
+def track_to_feature(mmsi: str, points: List[tuple]) -> Dict[str, Any]:
+    return {
+        "type": "Feature",
+        "geometry": {"type": "LineString", "coordinates": [[lon, lat] for _, lat, lon in points]},
+        "properties": {"mmsi": mmsi, "timestamps": [int(ts) for ts, _, _ in points], "points": len(points)},
+    }
+
+
+__all__ = ["VesselTrackStore", "track_to_feature"]
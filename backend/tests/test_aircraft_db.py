@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from backend.services.aircraft_db import AircraftDatabase
+
+OPENSKY_CSV = (
+    "'icao24','timestamp','acars','adsb','built','categoryDescription','country','engines','firstFlightDate',"
+    "'firstSeen','icaoAircraftClass','lineNumber','manufacturerIcao','manufacturerName','model','modes',"
+    "'nextReg','notes','operator','operatorCallsign','operatorIata','operatorIcao','owner','prevReg',"
+    "'regUntil','registered','registration','selCal','serialNumber','status','typecode','vdl'\n"
+    "'34718e','2023-01-01','false','false','','','Spain','','','','L2J','','AIRBUS','Airbus','A320-214','false',"
+    "'','','Vueling','VUELING','VY','VLG','Vueling Airlines','','','','EC-MBE','','','','A320','false'\n"
+    "'3c6444','','','','','','Germany','','','','','','','Boeing','737-8AS','','','','','','','','','','','',"
+    "'D-ABCD','','','','B738',''\n"
+    "'bad','','','','','','','','','','','','','','','','','','','','','','','','','','','','','','',''\n"
+)
+
+
+def test_import_and_bulk_lookup(tmp_path: Path) -> None:
+    csv_path = tmp_path / "aircraftDatabase.csv"
+    csv_path.write_text(OPENSKY_CSV, encoding="utf-8")
+    database = AircraftDatabase(tmp_path / "aircraft.sqlite3")
+    assert database.lookup_many(["34718e"]) == {}
+
+    assert database.import_csv(csv_path) == 2
+    found = database.lookup_many(["34718E", "3c6444", "ffffff", ""])
+    assert set(found) == {"34718e", "3c6444"}
+    assert found["34718e"] == {
+        "registration": "EC-MBE",
+        "typecode": "A320",
+        "model": "A320-214",
+        "manufacturer": "Airbus",
+        "operator": "Vueling",
+        "operator_icao": "VLG",
+        "owner": "Vueling Airlines",
+    }
+    assert "operator" not in found["3c6444"]
+
+    # Segunda consulta desde la memoria (incluido el "no encontrado")
+    database.lookup_many(["34718e", "ffffff"])
+    assert database.memo_hits == 2
+
+    items = [{"icao24": "34718e", "callsign": "VLG1234"}, {"icao24": None, "callsign": "X"}]
+    enriched = database.enrich(items)
+    assert enriched[0]["registration"] == "EC-MBE" and enriched[0]["callsign"] == "VLG1234"
+    assert enriched[1] == items[1] and "registration" not in items[0]
+
+    info = database.describe()
+    assert info["available"] is True and info["rows"] == "2" and info["source"] == "aircraftDatabase.csv"
+
+
+def test_reimport_replaces_database(tmp_path: Path) -> None:
+    database = AircraftDatabase(tmp_path / "aircraft.sqlite3")
+    database.import_rows([("abc123", "EC-AAA", None, None, None, None, None, None)])
+    assert database.lookup("abc123") == {"registration": "EC-AAA"}
+    database.import_rows([("abc123", "EC-BBB", "A20N", None, None, None, None, None)])
+    assert database.lookup("ABC123") == {"registration": "EC-BBB", "typecode": "A20N"}
+    database.close()
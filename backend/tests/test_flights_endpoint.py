@@ -90,6 +90,11 @@ class TestFlightsEndpoint:
 
         monkeypatch.setattr(module.opensky_service._client, "fetch_states", fake_fetch_states)
 
+        async def fake_fetch_states_async(bbox, extended, token):  # type: ignore[no-untyped-def]
+            return fake_fetch_states(bbox, extended, token)
+
+        monkeypatch.setattr(module.opensky_service._async_client, "fetch_states", fake_fetch_states_async)
+
         response = client.get("/api/layers/flights?bbox=35.0,44.0,-10.0,4.5")
         assert response.status_code == 200
         data = response.json()
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import time
+
+from backend.services.blitzortung_service import BlitzortungService, LightningStrike
+from backend.services.lightning_clusters import cell_size_deg, zoom_bucket
+
+
+def _service_with(strikes: list[LightningStrike]) -> BlitzortungService:
+    service = BlitzortungService(enabled=True, buffer_max=2000, prune_seconds=900)
+    with service.strikes_lock:
+        service._add_strikes_locked(strikes)
+    return service
+
+
+def test_zoom_bucket_clamps_and_floors() -> None:
+    assert zoom_bucket(3.7) == 3
+    assert zoom_bucket(-2) == 0
+    assert zoom_bucket(40) == 14
+    assert cell_size_deg(0) > cell_size_deg(5)
+
+
+def test_clusters_aggregate_count_newest_and_centroid() -> None:
+    now = time.time()
+    service = _service_with(
+        [
+            LightningStrike(timestamp=now - 30, lat=40.01, lon=-3.01),
+            LightningStrike(timestamp=now - 10, lat=40.03, lon=-3.03),
+            LightningStrike(timestamp=now - 20, lat=10.0, lon=20.0),
+        ]
+    )
+
+    result = service.to_cluster_geojson(zoom=4)
+    assert result["metadata"]["clusters"] == 2
+    assert result["metadata"]["strikes"] == 3
+
+    biggest = max(result["features"], key=lambda f: f["properties"]["count"])
+    assert biggest["properties"]["count"] == 2
+    assert biggest["properties"]["newest_ts"] == now - 10
+    lon, lat = biggest["geometry"]["coordinates"]
+    assert lat == 40.02
+    assert lon == -3.02
+
+
+def test_clusters_cache_invalidated_by_new_strikes_and_bbox_filter() -> None:
+    now = time.time()
+    service = _service_with([LightningStrike(timestamp=now, lat=40.0, lon=-3.0)])
+
+    first = service.to_cluster_geojson(zoom=6)
+    assert first["metadata"]["strikes"] == 1
+
+    with service.strikes_lock:
+        service._add_strikes_locked([LightningStrike(timestamp=now, lat=50.0, lon=10.0)])
+
+    second = service.to_cluster_geojson(zoom=6)
+    assert second["metadata"]["strikes"] == 2
+
+    filtered = service.to_cluster_geojson(zoom=6, bbox=(35.0, 45.0, -10.0, 5.0))
+    assert filtered["metadata"]["clusters"] == 1
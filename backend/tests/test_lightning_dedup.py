@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import time
+
+from backend.services.blitzortung_service import BlitzortungService, LightningStrike
+from backend.services.lightning_dedup import StrikeDeduplicator
+
+
+def test_deduplicator_drops_same_strike_from_second_source() -> None:
+    dedup = StrikeDeduplicator(window_seconds=30)
+    now = 1000.0
+    first = dedup.filter("mqtt:blitzortung/1", [LightningStrike(timestamp=now, lat=40.001, lon=-3.001)], now=now)
+    # Misma descarga, reloj desplazado 0.4 s y coordenadas casi iguales
+    second = dedup.filter("ws", [LightningStrike(timestamp=now + 0.4, lat=40.002, lon=-3.002)], now=now)
+
+    assert len(first) == 1
+    assert second == []
+
+    stats = dedup.describe(now=now)["sources"]
+    assert stats["ws"]["duplicates_dropped"] == 1
+    assert stats["mqtt:blitzortung/1"]["accepted"] == 1
+    assert stats["ws"]["ingest_rate_per_min"] == 1.0
+
+
+def test_deduplicator_matches_across_rounding_edge() -> None:
+    dedup = StrikeDeduplicator(window_seconds=30)
+    now = 1000.0
+    # 40.0049 redondea a 40.00 y 40.0051 a 40.01: celdas vecinas
+    assert dedup.filter("a", [LightningStrike(timestamp=now, lat=40.0049, lon=-3.0049)], now=now)
+    assert dedup.filter("b", [LightningStrike(timestamp=now, lat=40.0051, lon=-3.0051)], now=now) == []
+    # Un rayo a varias celdas de distancia sí es otro
+    assert dedup.filter("b", [LightningStrike(timestamp=now, lat=40.05, lon=-3.0)], now=now)
+
+
+def test_deduplicator_keeps_close_strikes_from_the_same_source() -> None:
+    dedup = StrikeDeduplicator(window_seconds=30)
+    now = 1000.0
+    close_pair = [
+        LightningStrike(timestamp=now, lat=40.001, lon=-3.001),
+        LightningStrike(timestamp=now + 0.1, lat=40.002, lon=-3.002),
+    ]
+    assert len(dedup.filter("a", close_pair, now=now)) == 2
+    # Otra fuente con el mismo rayo sí se descarta
+    assert dedup.filter("b", close_pair[:1], now=now) == []
+
+
+def test_deduplicator_window_expires_keys() -> None:
+    dedup = StrikeDeduplicator(window_seconds=5)
+    strike = LightningStrike(timestamp=1000.0, lat=1.0, lon=1.0)
+    assert dedup.filter("a", [strike], now=1000.0)
+    assert dedup.filter("b", [strike], now=1010.0) == [strike]
+
+
+def test_service_merges_sources_without_duplicates() -> None:
+    service = BlitzortungService(enabled=True, mqtt_topics=["blitzortung/2"])
+    ts = time.time()
+    payload = {"time": ts, "lat": 39.9, "lon": -0.1}
+
+    service._process_lightning_data(payload, source="mqtt:blitzortung/1")
+    service._process_lightning_data([payload, {"time": ts, "lat": 45.0, "lon": 2.0}], source="ws")
+
+    assert len(service.get_all_strikes()) == 2
+    status = service.get_status()
+    assert status["mqtt_topics"] == ["blitzortung/1", "blitzortung/2"]
+    assert status["dedup"]["sources"]["ws"]["duplicates_dropped"] == 1
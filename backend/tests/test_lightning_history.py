@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import time
+from pathlib import Path
+
+from backend.services.blitzortung_service import BlitzortungService, LightningStrike
+from backend.services.lightning_history import RECORD_DTYPE, LightningHistoryLog
+
+
+def test_history_append_and_query_with_bbox(tmp_path: Path) -> None:
+    log = LightningHistoryLog(tmp_path)
+    base = (time.time() // 3600 - 2) * 3600 + 60
+    log.append(
+        [
+            LightningStrike(timestamp=base, lat=40.0, lon=-3.0, severity="strong"),
+            LightningStrike(timestamp=base + 10, lat=50.0, lon=10.0),
+            # Otra hora -> otro fichero
+            LightningStrike(timestamp=base + 3600, lat=40.5, lon=-3.5),
+        ]
+    )
+    log.close()
+
+    assert len(list(tmp_path.glob("*.bin"))) == 2
+
+    everything = log.query(base - 1, base + 7200)
+    assert everything["ts"].tolist() == [base, base + 10, base + 3600]
+
+    spain = log.query(base - 1, base + 7200, bbox=(35.0, 45.0, -10.0, 5.0))
+    assert len(spain) == 2
+
+    latest = log.query(base - 1, base + 7200, limit=1)
+    assert latest["ts"].tolist() == [base + 3600]
+
+
+def test_history_prunes_expired_files_on_open(tmp_path: Path) -> None:
+    old_hour = int(time.time() // 3600) - 30
+    stale = tmp_path / (time.strftime("%Y%m%d%H", time.gmtime(old_hour * 3600)) + ".bin")
+    stale.write_bytes(b"")
+    recent = tmp_path / (time.strftime("%Y%m%d%H", time.gmtime(time.time())) + ".bin")
+    recent.write_bytes(b"")
+
+    LightningHistoryLog(tmp_path, retention_hours=24)
+
+    assert not stale.exists()
+    assert recent.exists()
+
+
+def test_history_ignores_truncated_trailing_record(tmp_path: Path) -> None:
+    log = LightningHistoryLog(tmp_path)
+    now = time.time()
+    log.append([LightningStrike(timestamp=now, lat=1.0, lon=2.0)])
+    log.close()
+    path = next(tmp_path.glob("*.bin"))
+    with path.open("ab") as handle:
+        handle.write(b"\x00" * (RECORD_DTYPE.itemsize - 3))
+
+    assert len(log.load_recent(60, now=now + 1)) == 1
+
+
+def test_history_append_after_torn_tail_stays_aligned(tmp_path: Path) -> None:
+    log = LightningHistoryLog(tmp_path)
+    now = time.time()
+    log.append([LightningStrike(timestamp=now, lat=1.0, lon=2.0)])
+    log.close()
+    path = next(tmp_path.glob("*.bin"))
+    with path.open("ab") as handle:
+        handle.write(b"\xff" * (RECORD_DTYPE.itemsize - 3))
+
+    log.append([LightningStrike(timestamp=now + 1, lat=3.0, lon=4.0)])
+    log.close()
+
+    assert path.stat().st_size == 2 * RECORD_DTYPE.itemsize
+    records = log.load_recent(60, now=now + 2)
+    assert records["ts"].tolist() == [now, now + 1]
+    assert records["lat"].tolist() == [1.0, 3.0]
+
+
+def test_service_replays_history_on_start(tmp_path: Path) -> None:
+    now = time.time()
+    log = LightningHistoryLog(tmp_path)
+    log.append(
+        [
+            LightningStrike(timestamp=now - 5000, lat=40.0, lon=-3.0),
+            LightningStrike(timestamp=now - 30, lat=41.0, lon=-2.0, severity="weak"),
+        ]
+    )
+    log.close()
+
+    service = BlitzortungService(enabled=True, prune_seconds=900, history=LightningHistoryLog(tmp_path))
+    service._replay_history()
+
+    strikes = service.get_all_strikes()
+    assert len(strikes) == 1
+    assert strikes[0].severity == "weak"
+    assert strikes[0].lat == 41.0
+
+    # El histórico siembra el de-duplicador: la copia en vivo no se acepta otra vez
+    service._ingest_batch([("mqtt:blitzortung/1", [LightningStrike(timestamp=now - 30, lat=41.0, lon=-2.0)])])
+    assert len(service.get_all_strikes()) == 1
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import json
+import time
+
+from backend.services.blitzortung_service import BlitzortungService, LightningStrike
+from backend.services.lightning_ingest import LightningIngestQueue, StrikeDecoder
+
+
+def test_decoder_caches_key_mapping_per_source_and_redetects() -> None:
+    decoder = StrikeDecoder(LightningStrike)
+
+    first = decoder.decode("mqtt:a", b'{"timestamp": 10, "latitude": 40.0, "lng": -3.0}')
+    assert [(s.timestamp, s.lat, s.lon) for s in first] == [(10.0, 40.0, -3.0)]
+    assert decoder.mappings()["mqtt:a"] == {"time": "timestamp", "lat": "latitude", "lon": "lng"}
+
+    # Cambio de formato en la misma fuente
+    second = decoder.decode("mqtt:a", '[{"t": 11, "lat": 41.0, "lon": -2.0}, {"bogus": 1}]')
+    assert [(s.timestamp, s.lat) for s in second] == [(11.0, 41.0)]
+    assert decoder.mappings()["mqtt:a"]["time"] == "t"
+
+
+def test_queue_flush_delivers_one_batch_per_drain() -> None:
+    service = BlitzortungService(enabled=True)
+    batches = []
+
+    def sink(batch):  # type: ignore[no-untyped-def]
+        batches.append(batch)
+        service._ingest_batch(batch)
+
+    queue = LightningIngestQueue(sink, LightningStrike, interval_ms=50)
+    now = time.time()
+    for i in range(5):
+        queue.submit("mqtt:blitzortung/1", json.dumps({"time": now, "lat": 40.0 + i, "lon": 1.0}).encode())
+    queue.submit("ws", b"not json")
+    queue.submit("ws", json.dumps({"time": now, "lat": 30.0, "lon": 1.0}))
+
+    assert queue.flush() == 7
+    assert len(batches) == 1
+    assert {source for source, _ in batches[0]} == {"mqtt:blitzortung/1", "ws"}
+    assert len(service.get_all_strikes()) == 6
+
+    stats = queue.describe()
+    assert stats["decode_errors"] == 1
+    assert stats["batches"] == 1
+    assert queue.flush() == 0
+
+
+def test_queue_drops_oldest_when_full() -> None:
+    delivered = []
+    queue = LightningIngestQueue(delivered.extend, LightningStrike, interval_ms=50, max_pending=3)
+    now = time.time()
+    for i in range(5):
+        queue.submit("ws", json.dumps({"time": now, "lat": float(i), "lon": 1.0}))
+
+    assert queue.describe()["dropped"] == 2
+    assert queue.flush() == 3
+    assert [strike.lat for _, strikes in delivered for strike in strikes] == [2.0, 3.0, 4.0]
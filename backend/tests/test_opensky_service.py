@@ -0,0 +1,642 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.models import OpenSkyBBoxConfig, OpenSkyProviderConfig
+from backend.secret_store import SecretStore
+from backend.services.opensky_service import OpenSkyService
+
+
+class DummyAuth:
+    def credentials_configured(self) -> bool:
+        return True
+
+    def get_token(self, token_url: Optional[str] = None, scope: Optional[str] = None, force_refresh: bool = False) -> str:
+        return "dummy"
+
+    def describe(self) -> Dict[str, Any]:
+        return {}
+
+    def invalidate(self) -> None:
+        pass
+
+
+def _state(icao24: str, lat: float, lon: float) -> List[Any]:
+    return [icao24, "CALL", "ES", 0, 1, lon, lat, 1000.0, False, 230.0, 90.0, 0.0, None, 1050.0, "7000", False, 0]
+
+
+def _config(bbox: Optional[OpenSkyBBoxConfig] = None) -> Any:
+    flights = SimpleNamespace(
+        enabled=True,
+        provider="opensky",
+        opensky=OpenSkyProviderConfig(bbox=bbox),
+        max_items_global=2000,
+    )
+    return SimpleNamespace(layers=SimpleNamespace(flights=flights), opensky=SimpleNamespace(poll_seconds=5, oauth2=None))
+
+
+def _service(tmp_path: Path, calls: List[Any]) -> OpenSkyService:
+    service = OpenSkyService(SecretStore(tmp_path / "secrets.json"), logging.getLogger("test"))
+    service._auth = DummyAuth()  # type: ignore[assignment]
+
+    def fake_fetch_states(bbox: Any, extended: int, token: Optional[str]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        calls.append(bbox)
+        states = [_state("aaa001", 40.0, -3.0), _state("bbb002", 43.0, 2.0)]
+        return {"time": int(time.time()), "states": states}, {"X-Rate-Limit-Remaining": "100"}
+
+    service._client.fetch_states = fake_fetch_states  # type: ignore[method-assign]
+    return service
+
+
+def _wait_published(service: OpenSkyService) -> None:
+    deadline = time.time() + 2
+    while service._published is None and time.time() < deadline:
+        time.sleep(0.01)
+    assert service._published is not None
+
+
+def test_poller_serves_requests_from_published_snapshot(tmp_path: Path) -> None:
+    calls: List[Any] = []
+    service = _service(tmp_path, calls)
+    config = _config(OpenSkyBBoxConfig())
+    service.start_poller(lambda: config)
+    try:
+        _wait_published(service)
+        assert calls == [(36.0, 44.0, -10.0, 5.0)]
+
+        full = service.get_snapshot(config, bbox=None)
+        assert full.payload["count"] == 2
+
+        # Una zona dentro del área sondeada se filtra en local, sin pedir nada
+        inner = service.get_snapshot(config, bbox=(39.0, 41.0, -4.0, -2.0))
+        assert [item["icao24"] for item in inner.payload["items"]] == ["aaa001"]
+        assert inner.bbox == (39.0, 41.0, -4.0, -2.0)
+        assert full.payload["count"] == 2
+        assert len(calls) == 1
+
+        status = service.get_status(config)
+        assert status["poller"]["active"] is True
+    finally:
+        service.stop_poller()
+    assert service.poller_active is False
+
+
+def test_poller_announces_published_aircraft_new_first(tmp_path: Path) -> None:
+    service = _service(tmp_path, [])
+    config = _config(OpenSkyBBoxConfig())
+    announced: List[List[str]] = []
+    service.set_publish_listener(announced.append)
+    states = [_state("aaa001", 40.0, -3.0), _state("bbb002", 43.0, 2.0)]
+    service._client.fetch_states = lambda *_a: ({"time": int(time.time()), "states": list(states)}, {})  # type: ignore[method-assign]
+
+    service._poll_once(config)
+    states.append(_state("ccc003", 41.0, -1.0))
+    service._poll_once(config)
+
+    assert announced == [["aaa001", "bbb002"], ["ccc003", "aaa001", "bbb002"]]
+
+
+def test_poller_falls_back_to_upstream_outside_area(tmp_path: Path) -> None:
+    calls: List[Any] = []
+    service = _service(tmp_path, calls)
+    config = _config(OpenSkyBBoxConfig())
+    service.start_poller(lambda: config)
+    try:
+        _wait_published(service)
+        outside = service.get_snapshot(config, bbox=(50.0, 52.0, 0.0, 2.0))
+        assert outside.polled is True
+        assert calls[-1] == (50.0, 52.0, 0.0, 2.0)
+    finally:
+        service.stop_poller()
+
+
+def test_sub_bbox_is_cut_from_covering_snapshot(tmp_path: Path) -> None:
+    calls: List[Any] = []
+    service = _service(tmp_path, calls)
+    config = _config()
+
+    service.get_snapshot(config, bbox=(35.0, 45.0, -10.0, 5.0))
+    inner = service.get_snapshot(config, bbox=(42.5, 43.5, 1.5, 2.5))
+    assert [item["icao24"] for item in inner.payload["items"]] == ["bbb002"]
+    assert inner.polled is False
+    assert len(calls) == 1
+
+    # Zona que se sale del área cacheada: sí va a OpenSky
+    service.get_snapshot(config, bbox=(30.0, 45.0, -10.0, 5.0))
+    assert len(calls) == 2
+
+    coverage = service.get_status(config)["coverage"]
+    assert coverage["covered"] == 1
+    assert coverage["misses"] == 2
+    assert coverage["hit_ratio"] == round(1 / 3, 3)
+
+
+def test_coverage_entry_grid_matches_linear_filter() -> None:
+    from backend.services.opensky_coverage import CoverageEntry
+    from backend.services.opensky_service import Snapshot
+
+    items = [
+        {"icao24": f"{index:06x}", "lat": 30.0 + (index * 0.37) % 20, "lon": -15.0 + (index * 0.53) % 30}
+        for index in range(500)
+    ]
+    snapshot = Snapshot(payload={"count": len(items), "items": items, "stale": False, "ts": 0}, fetched_at=time.time())
+    entry = CoverageEntry(snapshot, (30.0, 50.0, -15.0, 15.0), 0, time.time() + 10, cell_deg=1.0)
+
+    for bbox in [(38.2, 41.7, -4.4, 0.3), (30.0, 50.0, -15.0, 15.0), (45.0, 45.5, 10.0, 10.2)]:
+        expected = [
+            item["icao24"]
+            for item in items
+            if bbox[0] <= item["lat"] <= bbox[1] and bbox[2] <= item["lon"] <= bbox[3]
+        ]
+        assert sorted(item["icao24"] for item in entry.items_in(bbox)) == sorted(expected)
+
+
+def test_state_columns_match_item_format() -> None:
+    from backend.services.opensky_columns import StateColumns, features_from_columns
+
+    payload = {
+        "time": 1000,
+        "states": [
+            [" ABC123 ", "IBE1  ", "Spain", 990, 995, -3.5, 40.25, 900.0, False, 200.0, 370.0, -1.0, None, None, "7000", False, 0, 3],
+            ["def456", None, "France", 980, 0, 2.0, 43.0, None, True, None, None, None, None, 15.0, None, False, 0],
+            ["bad001", "X", "", 1, 1, None, 40.0, 1.0, False, 1.0, 1.0, 1.0, None, 1.0, None, False, 0],
+            ["bad002", "X", "", 1, 1, 200.0, 40.0, 1.0, False, 1.0, 1.0, 1.0, None, 1.0, None, False, 0],
+            ["short"],
+            "garbage",
+        ],
+    }
+    columns = StateColumns.from_payload(payload)
+    items = columns.to_items()
+    assert items == [
+        {
+            "id": "abc123",
+            "icao24": "abc123",
+            "callsign": "IBE1",
+            "origin_country": "Spain",
+            "lon": -3.5,
+            "lat": 40.25,
+            "alt": 900.0,
+            "velocity": 200.0,
+            "vertical_rate": -1.0,
+            "track": 10.0,
+            "on_ground": False,
+            "squawk": "7000",
+            "category": 3,
+            "last_contact": 995,
+        },
+        {
+            "id": "def456",
+            "icao24": "def456",
+            "callsign": None,
+            "origin_country": "France",
+            "lon": 2.0,
+            "lat": 43.0,
+            "alt": 15.0,
+            "velocity": None,
+            "vertical_rate": None,
+            "track": None,
+            "on_ground": True,
+            "squawk": None,
+            "category": None,
+            "last_contact": 980,
+        },
+    ]
+
+    inside = columns.within((42.0, 44.0, 0.0, 3.0))
+    assert inside.icao24.tolist() == ["def456"]
+
+    features = features_from_columns(columns, items)
+    assert features[0]["geometry"]["coordinates"] == [-3.5, 40.25]
+    assert features[1]["properties"] is items[1]
+
+
+def test_async_snapshot_uses_async_client_once(tmp_path: Path) -> None:
+    calls: List[Any] = []
+    service = _service(tmp_path, calls)
+    config = _config()
+
+    async def fake_fetch_states_async(bbox: Any, extended: int, token: Optional[str]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        await asyncio.sleep(0.01)
+        calls.append(("async", bbox))
+        return {"time": int(time.time()), "states": [_state("aaa001", 40.0, -3.0)]}, {}
+
+    service._async_client.fetch_states = fake_fetch_states_async  # type: ignore[method-assign]
+    store_threads: List[int] = []
+    store_result = service._store_result
+
+    def recording_store_result(*args: Any) -> Any:
+        store_threads.append(threading.get_ident())
+        assert service._lock.locked()
+        return store_result(*args)
+
+    service._store_result = recording_store_result  # type: ignore[method-assign]
+
+    async def run() -> Tuple[List[Any], int]:
+        bbox = (39.0, 41.0, -4.0, -2.0)
+        results = await asyncio.gather(*(service.get_snapshot_async(config, bbox=bbox) for _ in range(5)))
+        return results, threading.get_ident()
+
+    snapshots, loop_thread = asyncio.run(run())
+    assert calls == [("async", (39.0, 41.0, -4.0, -2.0))]
+    assert all(snapshot.payload["count"] == 1 for snapshot in snapshots)
+    # Todo el guardado (items, estelas, cobertura) se hace fuera del loop y con el lock
+    assert len(store_threads) == 1 and store_threads[0] != loop_thread
+
+
+def test_async_snapshot_waits_for_poller_fetch_of_same_area(tmp_path: Path) -> None:
+    calls: List[Any] = []
+    service = _service(tmp_path, calls)
+    config = _config()
+    bbox = (39.0, 41.0, -4.0, -2.0)
+    inside, release = threading.Event(), threading.Event()
+    fetch_states = service._client.fetch_states
+
+    def slow_fetch_states(*args: Any) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        inside.set()
+        release.wait(2)
+        return fetch_states(*args)
+
+    async def fail_fetch_states_async(*_args: Any) -> Any:
+        raise AssertionError("async path fetched an area already in flight")
+
+    service._client.fetch_states = slow_fetch_states  # type: ignore[method-assign]
+    service._async_client.fetch_states = fail_fetch_states_async  # type: ignore[method-assign]
+    # Consulta síncrona (como la del poller) en curso con self._lock tomado
+    worker = threading.Thread(target=service.get_snapshot, args=(config, bbox))
+    worker.start()
+    assert inside.wait(2)
+    threading.Timer(0.1, release.set).start()
+
+    snapshot = asyncio.run(service.get_snapshot_async(config, bbox=bbox))
+    worker.join(2)
+    assert calls == [bbox]
+    assert snapshot is service._cache.get(service._resolve_request(config, bbox).cache_key)
+
+
+def test_async_clients_close_the_client_of_a_previous_loop() -> None:
+    from backend.services.opensky_client import AsyncOpenSkyClient
+
+    client = AsyncOpenSkyClient()
+
+    async def get() -> Any:
+        return client._get_client()
+
+    async def replace() -> Any:
+        current = client._get_client()
+        await asyncio.sleep(0.05)
+        return current
+
+    first = asyncio.run(get())
+    second = asyncio.run(replace())
+    assert second is not first
+    assert first.is_closed and not second.is_closed
+
+
+class _TokenResponse:
+    status_code = 200
+
+    def json(self) -> Dict[str, Any]:
+        return {"access_token": "token-1", "expires_in": 1800}
+
+
+def test_async_token_refresh_is_single_flight(tmp_path: Path) -> None:
+    from backend.services.opensky_auth import OpenSkyAuthenticator
+
+    store = SecretStore(tmp_path / "secrets.json")
+    store.set_secret("opensky_client_id", "client")
+    store.set_secret("opensky_client_secret", "secret")
+    auth = OpenSkyAuthenticator(store, logging.getLogger("test"))
+    posts: List[str] = []
+
+    class FakeAsyncClient:
+        async def post(self, url: str, data: Dict[str, str]) -> _TokenResponse:
+            posts.append(url)
+            await asyncio.sleep(0.01)
+            return _TokenResponse()
+
+    async def run() -> List[Optional[str]]:
+        lock = asyncio.Lock()
+        auth._async_resources = lambda: (lock, FakeAsyncClient())  # type: ignore[method-assign]
+        return await asyncio.gather(*(auth.get_token_async() for _ in range(5)))
+
+    assert asyncio.run(run()) == ["token-1"] * 5
+    assert len(posts) == 1
+    # La API síncrona comparte el token ya obtenido
+    assert auth.get_token() == "token-1"
+
+
+def test_token_refresher_renews_ahead_of_expiry(tmp_path: Path) -> None:
+    from backend.services.opensky_auth import OpenSkyAuthenticator, RefreshSettings
+
+    store = SecretStore(tmp_path / "secrets.json")
+    store.set_secret("opensky_client_id", "client")
+    store.set_secret("opensky_client_secret", "secret")
+    posts: List[str] = []
+
+    class FakeClient:
+        def post(self, url: str, data: Dict[str, str]) -> _TokenResponse:
+            posts.append(url)
+            return _TokenResponse()
+
+    auth = OpenSkyAuthenticator(store, logging.getLogger("test"), http_client=FakeClient())  # type: ignore[arg-type]
+    settings = RefreshSettings(fraction=0.5, jitter_seconds=0)
+    auth.start_refresher(lambda: settings)
+    try:
+        deadline = time.time() + 2
+        while not (auth.describe()["refresh"]["next_in_sec"] or 0) > 0:
+            assert time.time() < deadline
+            time.sleep(0.01)
+        # Sin token se pide enseguida; el siguiente, a mitad de sus 1800 s
+        refresh = auth.describe()["refresh"]
+        assert refresh["active"] is True
+        assert 890 <= refresh["next_in_sec"] <= 900
+        assert len(posts) == 1
+        assert auth.get_token() == "token-1"
+        assert len(posts) == 1
+    finally:
+        auth.stop_refresher()
+
+    info = auth._token_info
+    assert info is not None
+    jittered = auth.next_refresh_at(RefreshSettings(fraction=0.5, jitter_seconds=60), info.obtained_at)
+    assert info.obtained_at + 840 <= jittered <= info.obtained_at + 900
+    # El sorteo se mantiene para el mismo token
+    assert auth.next_refresh_at(RefreshSettings(fraction=0.5, jitter_seconds=60), info.obtained_at) == jittered
+
+
+def test_token_refresher_idles_while_opensky_is_not_in_use(tmp_path: Path) -> None:
+    from backend.services.opensky_auth import OpenSkyAuthenticator
+
+    store = SecretStore(tmp_path / "secrets.json")
+    store.set_secret("opensky_client_id", "client")
+    store.set_secret("opensky_client_secret", "secret")
+    posts: List[str] = []
+
+    class FakeClient:
+        def post(self, url: str, data: Dict[str, str]) -> _TokenResponse:
+            posts.append(url)
+            return _TokenResponse()
+
+    auth = OpenSkyAuthenticator(store, logging.getLogger("test"), http_client=FakeClient())  # type: ignore[arg-type]
+    service = _service(tmp_path, [])
+    service._auth = auth  # type: ignore[assignment]
+    config = _config()
+    config.layers.flights.provider = "aviationstack"
+    assert OpenSkyService._refresh_settings(config).idle
+    service.start_token_refresher(lambda: config)
+    try:
+        time.sleep(0.2)
+        assert posts == []
+        assert auth.describe()["refresh"]["next_in_sec"] is None
+    finally:
+        auth.stop_refresher()
+
+    config.layers.flights.provider = "opensky"
+    assert not OpenSkyService._refresh_settings(config).idle
+    config.layers.flights.enabled = False
+    assert OpenSkyService._refresh_settings(config).idle
+
+
+def test_token_refresher_backs_off_on_errors_without_auth_backoff(tmp_path: Path) -> None:
+    from backend.services.opensky_auth import REFRESH_IDLE_SECONDS, REFRESH_RETRY_MAX_SECONDS, OpenSkyAuthenticator
+
+    auth = OpenSkyAuthenticator(SecretStore(tmp_path / "secrets.json"), logging.getLogger("test"))
+    now = time.time()
+    auth._backoff_until = 0.0
+    delays = []
+    for failures in (1, 2, 3, 10):
+        auth._refresh_failures = failures
+        delays.append(auth._refresh_retry_delay(now))
+    assert delays == [REFRESH_IDLE_SECONDS, REFRESH_IDLE_SECONDS * 2, REFRESH_IDLE_SECONDS * 4, REFRESH_RETRY_MAX_SECONDS]
+    # Un backoff de auth más largo manda
+    auth._refresh_failures = 1
+    auth._backoff_until = now + 1800
+    assert auth._refresh_retry_delay(now) == 1800
+
+
+def test_scheduler_spreads_credits_and_adapts_to_activity() -> None:
+    from backend.services.opensky_scheduler import PollScheduler, credit_cost, seconds_until_reset
+
+    scheduler = PollScheduler(reserve=0.0)
+    now = 1_700_000_000.0
+    until_reset = seconds_until_reset(now)
+    common = dict(min_interval=5.0, max_interval=3600.0, cost=2, local_hour=12, now=now)
+
+    base = scheduler.decide(remaining=1000, last_view_at=now - 300, aircraft=50, **common)
+    assert base.signals == ()
+    assert abs(base.interval - until_reset / 500) < 1e-6
+
+    busy = scheduler.decide(remaining=1000, last_view_at=now - 10, aircraft=500, **common)
+    assert busy.signals == ("visible", "dense")
+    assert busy.interval < base.interval
+
+    quiet = scheduler.decide(remaining=1000, last_view_at=None, aircraft=50, **dict(common, local_hour=3))
+    assert quiet.signals == ("idle", "night")
+    assert quiet.interval > base.interval
+    assert "idle" in quiet.reason
+
+    empty = scheduler.decide(remaining=1, last_view_at=now, aircraft=50, **common)
+    assert empty.interval == min(until_reset, 3600.0)
+    assert scheduler.last is empty
+
+    assert credit_cost(None) == 4
+    assert credit_cost((40.0, 44.0, -4.0, 0.0)) == 1
+
+
+def test_poller_interval_follows_remaining_credits(tmp_path: Path) -> None:
+    service = _service(tmp_path, [])
+    config = _config(OpenSkyBBoxConfig())
+    config.opensky = SimpleNamespace(poll_seconds=5, oauth2=None, adaptive_polling=True, max_poll_seconds=600)
+    config.display = SimpleNamespace(timezone="UTC")
+
+    # 100 créditos restantes (ver _service) no llegan para sondear cada 5 s el resto del día
+    delay = service._poll_once(config)
+    assert 5.0 <= delay <= 600.0
+    decision = service.get_status(config)["scheduler"]["decision"]
+    assert decision["remaining_credits"] == 100
+    assert decision["interval"] == round(delay, 1)
+    assert decision["reason"]
+
+    config.opensky.adaptive_polling = False
+    assert service._poll_once(config) == 5.0
+
+
+def test_fixed_poller_retries_after_rate_limit(tmp_path: Path) -> None:
+    from backend.services.opensky_client import OpenSkyClientError
+
+    calls: List[Any] = []
+    service = _service(tmp_path, calls)
+    config = _config(OpenSkyBBoxConfig())
+    service._poll_once(config)
+    published = service._published
+    assert published is not None and published.expires_at < float("inf")
+
+    fetch_ok = service._client.fetch_states
+
+    def rate_limited(*_args: Any) -> Any:
+        raise OpenSkyClientError("too many requests", status=429)
+
+    service._client.fetch_states = rate_limited  # type: ignore[method-assign]
+    service._poll_once(config)
+    assert service._last_rate_limit_hint == "0"
+
+    # Dentro de la espera no se consulta; pasada la espera se vuelve a intentar
+    service._client.fetch_states = fetch_ok  # type: ignore[method-assign]
+    service._backoff_until = 0.0
+    assert service._poll_once(config) > 0
+    assert len(calls) == 1
+    service._last_fetch_at = time.time() - 61
+    assert service._poll_once(config) == 5.0
+    assert len(calls) == 2
+    assert service._last_rate_limit_hint == "100"
+
+
+def test_track_store_rings_are_bounded_and_expire() -> None:
+    from backend.services.flight_tracks import FlightTrackStore, track_to_feature
+
+    store = FlightTrackStore(max_points=3, max_aircraft=2, expire_seconds=60)
+    for step in range(5):
+        store.add("abc123", 1000.0 + step * 10, 40.0 + step * 0.01, -3.0, 1000.0 + step * 100)
+    # Mismo last_contact: no añade punto
+    store.add("abc123", 1040.0, 41.0, -3.0, 5000.0)
+    points = store.get("abc123")
+    assert [point[0] for point in points] == [1020.0, 1030.0, 1040.0]
+    feature = track_to_feature("abc123", points)
+    assert feature["properties"]["vertical_trend"] == "climb"
+    assert feature["geometry"]["coordinates"][-1] == [-3.0, 40.04]
+
+    store.add("def456", 1040.0, 40.0, -3.0, None)
+    store.add("ghi789", 1050.0, 40.0, -3.0, None)
+    assert len(store) == 2 and store.evicted == 1
+    assert store.get("abc123") == []
+    assert store.get("def456")[0][3] is None
+
+    assert store.expire(now=1105.0) == 1
+    assert store.get("def456") == [] and len(store.get("ghi789")) == 1
+
+
+def test_snapshots_feed_flight_tracks(tmp_path: Path) -> None:
+    service = _service(tmp_path, [])
+    config = _config()
+    start = int(time.time()) - 60
+    contact = [start]
+
+    def fake_fetch_states(bbox: Any, extended: int, token: Optional[str]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        contact[0] += 10
+        state = _state("aaa001", 40.0 + (contact[0] - start) / 1000, -3.0)
+        state[4] = contact[0]
+        return {"time": contact[0], "states": [state]}, {}
+
+    service._client.fetch_states = fake_fetch_states  # type: ignore[method-assign]
+    for _ in range(3):
+        service._cache.clear()
+        service._coverage.clear()
+        service.get_snapshot(config, bbox=(35.0, 45.0, -10.0, 5.0))
+
+    trail = service.get_trails(["aaa001"])["aaa001"]
+    assert [point[0] for point in trail] == [start + 10.0, start + 20.0, start + 30.0]
+    track = service.get_track("AAA001")
+    assert track is not None and track["properties"]["points"] == 3
+    assert service.get_track("zzz999") is None
+    assert service.get_status(config)["tracks"]["aircraft"] == 1
+
+    # Fuera de la ventana de caducidad ni /track ni las estelas lo devuelven
+    service._tracks.expire_seconds = 25.0
+    assert service.get_trails(["aaa001"]) == {}
+    assert service.get_track("aaa001") is None
+
+
+def test_secondary_providers_are_merged_into_published_snapshot(tmp_path: Path) -> None:
+    from backend.services.flight_ingest import FlightIngestor, merge_items
+
+    now = int(time.time())
+
+    class FakeProvider:
+        def fetch(self, bounds: Any = None, since: Any = None) -> Dict[str, Any]:
+            assert bounds == (-10.0, 36.0, 5.0, 44.0)
+
+            def feature(icao24: str, lat: float, lon: float, ts: int) -> Dict[str, Any]:
+                return {
+                    "type": "Feature",
+                    "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                    "properties": {"icao24": icao24, "callsign": "EXT", "speed": 100.0, "timestamp": ts},
+                }
+
+            return {
+                "type": "FeatureCollection",
+                "features": [
+                    feature("AAA001", 40.5, -3.5, now + 5),  # más reciente que OpenSky: gana
+                    feature("ccc003", 41.0, 1.0, now),  # hueco de cobertura
+                    feature("ddd004", 60.0, 1.0, now),  # fuera del área
+                ],
+            }
+
+    calls: List[Any] = []
+    service = _service(tmp_path, calls)
+    ingestor = FlightIngestor(provider_factory=lambda name, flights: FakeProvider() if name == "custom" else None)
+    service.attach_ingestor(ingestor)
+    config = _config(OpenSkyBBoxConfig())
+    config.layers.flights.merge_providers = ["custom"]
+    config.layers.flights.max_age_seconds = 120
+
+    service._poll_once(config)
+    assert ingestor.describe()["merged_items"] is None  # aún no ha sondeado el secundario
+    ingestor._poll_provider("custom", config)
+
+    # (sin hilo del poller: se lee directamente lo publicado)
+    snapshot = service._published.snapshot
+    by_icao = {item["icao24"]: item for item in snapshot.payload["items"]}
+    assert set(by_icao) == {"aaa001", "bbb002", "ccc003"}
+    assert by_icao["aaa001"]["source"] == "custom" and by_icao["aaa001"]["lat"] == 40.5
+    assert "source" not in by_icao["bbb002"]
+    assert len(snapshot.columns) == 3
+    assert len(calls) == 1
+
+    # Nuevo sondeo de OpenSky: se vuelve a fusionar con el último resultado secundario
+    service._poll_once(config)
+    assert service._published.snapshot.payload["count"] == 3
+    assert service.get_status(config)["ingest"]["providers"]["custom"]["items"] == 3
+
+    primary = [{"icao24": "abc123", "id": "abc123", "last_contact": 10}]
+    assert merge_items([primary, [{"icao24": "abc123", "id": "abc123", "last_contact": 10, "source": "x"}]]) == primary
+
+
+def test_secondary_positions_last_until_their_provider_polls_again(tmp_path: Path) -> None:
+    from backend.services.flight_ingest import FlightIngestor
+
+    seen_at = int(time.time()) - 600
+
+    class FakeProvider:
+        def __init__(self, icao24: str) -> None:
+            self.icao24 = icao24
+
+        def fetch(self, bounds: Any = None, since: Any = None) -> Dict[str, Any]:
+            feature = {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [-3.0, 40.0]},
+                "properties": {"icao24": self.icao24, "timestamp": seen_at},
+            }
+            return {"type": "FeatureCollection", "features": [feature]}
+
+    ingestor = FlightIngestor(provider_factory=lambda name, flights: FakeProvider(f"{name[:3]}001"))
+    config = _config()
+    flights = config.layers.flights
+    flights.merge_providers = ["aviationstack", "custom"]
+    flights.max_age_seconds = 120
+    flights.aviationstack = SimpleNamespace(poll_seconds=900)
+    flights.custom = SimpleNamespace(poll_seconds=30)
+    ingestor.merge_primary([], time.time(), (36.0, 44.0, -10.0, 5.0))
+    ingestor._poll_provider("aviationstack", config)
+    ingestor._poll_provider("custom", config)
+
+    # Hace 10 minutos: vale para quien sondea cada 15, no para quien lo hace cada 30 s
+    merged = ingestor.merge_primary([], time.time(), (36.0, 44.0, -10.0, 5.0))
+    assert [item["icao24"] for item in merged] == ["avi001"]
+    providers = ingestor.describe()["providers"]
+    assert (providers["aviationstack"]["max_age_seconds"], providers["custom"]["max_age_seconds"]) == (1020, 150)
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from backend.services.plane_photos import PlanePhotoCache
+
+RESULTS: Dict[str, Tuple[str, Optional[str]]] = {
+    "aaa001": ("found", "https://example.test/aaa001.jpg"),
+    "bbb002": ("missing", None),
+    "ccc003": ("error", None),
+}
+
+
+def _cache(path: Path, calls: List[str], active: List[int], **kwargs: float) -> PlanePhotoCache:
+    cache = PlanePhotoCache(path, concurrency=2, **kwargs)
+
+    async def fake_fetch(code: str) -> Tuple[str, Optional[str]]:
+        calls.append(code)
+        active[0] += 1
+        active[1] = max(active[1], active[0])
+        await asyncio.sleep(0.01)
+        active[0] -= 1
+        return RESULTS.get(code, ("missing", None))
+
+    cache._fetch = fake_fetch  # type: ignore[method-assign]
+    return cache
+
+
+def test_warm_resolves_in_background_with_bounded_concurrency(tmp_path: Path) -> None:
+    path = tmp_path / "plane_photos.json"
+    calls: List[str] = []
+    active = [0, 0]
+    cache = _cache(path, calls, active)
+
+    async def scenario() -> None:
+        codes = ["aaa001", "bbb002", "ccc003", "ddd004", "eee005"]
+        assert cache.get("aaa001") is None
+        assert cache.warm(codes + ["AAA001"]) == 5
+        # Las que ya están en curso no se relanzan
+        assert cache.warm(codes) == 0
+        await asyncio.gather(*cache._tasks)
+        await cache.aclose()
+
+    asyncio.run(scenario())
+    assert sorted(calls) == ["aaa001", "bbb002", "ccc003", "ddd004", "eee005"]
+    assert active[1] == 2
+    assert cache.get("AAA001") == "https://example.test/aaa001.jpg"
+    assert cache.describe()["found"] == 1 and cache.describe()["error"] == 1
+
+    # Persistida: tras reiniciar no se vuelve a preguntar salvo por los errores
+    calls2: List[str] = []
+    reloaded = _cache(path, calls2, [0, 0], error_ttl=0)
+    assert reloaded.get("aaa001") == "https://example.test/aaa001.jpg"
+    result = asyncio.run(reloaded.resolve_many(["aaa001", "bbb002", "ccc003"]))
+    assert calls2 == ["ccc003"]
+    assert result == {"aaa001": "https://example.test/aaa001.jpg", "bbb002": None, "ccc003": None}
+
+
+def test_error_keeps_known_photo(tmp_path: Path) -> None:
+    cache = PlanePhotoCache(tmp_path / "plane_photos.json")
+    cache._store("aaa001", "found", "https://example.test/a.jpg")
+    cache._store("aaa001", "error", None)
+    assert cache.get("aaa001") == "https://example.test/a.jpg"
+    assert cache.needs_lookup("aaa001", now=cache._entries["aaa001"]["checked_at"] + 601)
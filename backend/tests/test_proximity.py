@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import math
+import random
+
+import numpy as np
+
+from backend.services.proximity import ProximityIndex, haversine_km, top_k
+
+
+def _haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlambda / 2) ** 2
+    return 6371.0 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def test_nearest_matches_brute_force() -> None:
+    rng = random.Random(7)
+    lat = np.array([rng.uniform(35.0, 45.0) for _ in range(500)])
+    lon = np.array([rng.uniform(-10.0, 5.0) for _ in range(500)])
+    lat[3] = np.nan  # sin posición: nunca aparece
+    center = (39.94, -0.10)
+
+    expected = sorted(
+        (_haversine(center[0], center[1], y, x), index)
+        for index, (y, x) in enumerate(zip(lat.tolist(), lon.tolist()))
+        if index != 3
+    )[:20]
+    index = ProximityIndex()
+    indices, distances = index.search("v1", lambda: (lat, lon), center[0], center[1], 20)
+    assert indices.tolist() == [position for _, position in expected]
+    assert np.allclose(distances, [distance for distance, _ in expected])
+
+    assert np.allclose(haversine_km(0.0, 0.0, np.array([0.0]), np.array([1.0])), [111.195], atol=1e-3)
+    assert top_k(np.array([3.0, np.inf, 1.0]), 5).tolist() == [2, 0]
+
+
+def test_results_are_cached_until_version_changes() -> None:
+    calls = []
+
+    def positions():  # type: ignore[no-untyped-def]
+        calls.append(1)
+        return np.array([40.0, 41.0, 39.0]), np.array([-3.0, -3.0, 2.0])
+
+    index = ProximityIndex()
+    first = index.search("v1", positions, 40.0, -3.0, 2)
+    second = index.search("v1", positions, 40.0, -3.0, 2)
+    assert second is first and len(calls) == 1 and index.hits == 1
+    assert index.search("v1", positions, 40.0, -3.0, 2, bbox=(38.0, 40.5, -4.0, 3.0))[0].tolist() == [0, 2]
+
+    index.search("v2", positions, 40.0, -3.0, 2)
+    assert len(calls) == 2
+    # Sin versión no se cachea
+    index.search(None, positions, 40.0, -3.0, 2)
+    index.search(None, positions, 40.0, -3.0, 2)
+    assert len(calls) == 4
+    assert index.search("v3", positions, 40.0, -3.0, 3, radius_km=200.0)[0].tolist() == [0, 1]
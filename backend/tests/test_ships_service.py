@@ -0,0 +1,488 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import pytest
+
+from backend.cache import CacheStore
+from backend.secret_store import SecretStore
+from backend.services.ships_service import AISStreamService
+from backend.services.vessel_store import VesselRecord, VesselStore
+
+
+def _service(tmp_path: Path) -> AISStreamService:
+    service = AISStreamService(
+        cache_store=CacheStore(tmp_path / "cache"),
+        secret_store=SecretStore(tmp_path / "secrets.json"),
+        logger=logging.getLogger("test"),
+    )
+    service._provider_enabled = True
+    return service
+
+
+def _position(mmsi: int, lat: float, lon: float, sog: float = 10.0, extra_meta: Optional[Dict[str, Any]] = None) -> str:
+    meta = {"MMSI": mmsi, "ShipName": f"SHIP {mmsi}", "latitude": lat, "longitude": lon}
+    meta.update(extra_meta or {})
+    return json.dumps(
+        {
+            "MessageType": "PositionReport",
+            "MetaData": meta,
+            "Message": {
+                "PositionReport": {
+                    "UserID": mmsi,
+                    "Latitude": lat,
+                    "Longitude": lon,
+                    "Sog": sog,
+                    "Cog": 90.0,
+                    "TrueHeading": 91,
+                }
+            },
+        }
+    )
+
+
+def test_published_snapshot_is_shared_and_preserialized(tmp_path: Path) -> None:
+    service = _service(tmp_path)
+    service._handle_message(_position(224000001, 39.9, -0.05))
+    service._handle_message(_position(224000002, 40.1, 0.2))
+
+    published = service.get_published_snapshot()
+    assert published is not None
+    assert len(published.features) == 2
+    assert service.get_published_snapshot() is published
+
+    body = json.loads(published.body)
+    assert body["type"] == "FeatureCollection"
+    assert len(body["features"]) == 2
+    assert body["meta"]["buffer_size"] == 2
+    assert published.etag.startswith('"')
+
+    # get_snapshot devuelve un dict nuevo que el llamador puede modificar
+    as_dict = service.get_snapshot()
+    as_dict["features"].clear()
+    assert len(service.get_published_snapshot().features) == 2
+
+
+def test_snapshot_etag_follows_body_but_not_built_at(tmp_path: Path) -> None:
+    service = _service(tmp_path)
+    service._handle_message(_position(224000001, 39.9, -0.05, sog=0.0))
+    first = service._publish_snapshot(time.time())
+    # Barco parado: otro instante, mismo cuerpo salvo built_at
+    second = service._publish_snapshot(time.time() + 30)
+    assert second.built_at != first.built_at
+    assert second.etag == first.etag
+
+    # Barco en movimiento: la posición estimada cambia el cuerpo y el ETag
+    service._handle_message(_position(224000002, 40.1, 0.2, sog=12.0))
+    moving = service._publish_snapshot(time.time() + 5)
+    later = service._publish_snapshot(time.time() + 35)
+    assert moving.etag != first.etag
+    assert later.etag != moving.etag
+
+
+def test_snapshot_persisted_only_after_reads(tmp_path: Path) -> None:
+    service = _service(tmp_path)
+    service._handle_message(_position(224000001, 39.9, -0.05))
+    stored = []
+    service._cache_store.store = lambda key, value: stored.append(key)  # type: ignore[method-assign]
+
+    service._publish_snapshot(time.time())
+    assert stored == []
+
+    service.get_published_snapshot()
+    service._publish_snapshot(time.time())
+    service._publish_snapshot(time.time())
+    assert stored == ["ships_stream"]
+
+
+def test_snapshot_disabled_provider_returns_none(tmp_path: Path) -> None:
+    service = _service(tmp_path)
+    service._provider_enabled = False
+    assert service.get_snapshot() is None
+    assert service.get_published_snapshot() is None
+
+
+def test_ships_endpoint_serves_etag(app_module, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    import asyncio
+
+    from starlette.requests import Request
+
+    from backend.routers import layers
+
+    module, _ = app_module
+    service = _service(tmp_path)
+    service._handle_message(_position(224000003, 39.5, 0.1))
+    monkeypatch.setattr(module, "ships_service", service)
+    monkeypatch.setattr(layers, "_load_main_module", lambda: module)
+
+    def _request(headers: Dict[str, str]) -> Request:
+        raw = [(k.lower().encode(), v.encode()) for k, v in headers.items()]
+        return Request({"type": "http", "method": "GET", "path": "/api/layers/ships", "headers": raw})
+
+    response = asyncio.run(layers.ships_data(_request({})))
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert len(json.loads(response.body)["features"]) == 1
+
+    cached = asyncio.run(layers.ships_data(_request({"If-None-Match": etag})))
+    assert cached.status_code == 304
+
+
+def test_vessel_store_evicts_least_recently_seen_and_expires(tmp_path: Path) -> None:
+    service = _service(tmp_path)
+    service._vessels.set_capacity(2)
+    service._handle_message(_position(224000001, 39.0, 0.0))
+    service._handle_message(_position(224000002, 39.1, 0.1))
+    # Volver a ver el primero lo convierte en el más reciente
+    service._handle_message(_position(224000001, 39.2, 0.2))
+    service._handle_message(_position(224000003, 39.3, 0.3))
+
+    assert sorted(r.mmsi for r in service._vessels) == ["224000001", "224000003"]
+    assert service._vessels.get("224000001").lat == 39.2
+    assert service._vessels.get("224000001").name == "SHIP 224000001"
+    assert service._vessels.evicted == 1
+
+    assert service._vessels.expire(time.time() + 1) == 2
+    assert len(service._vessels) == 0
+
+
+def test_vessel_store_keeps_ts_order_for_late_reports() -> None:
+    store = VesselStore()
+    store.upsert(VesselRecord("1", 39.0, 0.0, 5.0, 0.0, 0.0, ts=100.0))
+    store.upsert(VesselRecord("2", 39.1, 0.1, 5.0, 0.0, 0.0, ts=200.0))
+    # Informe diferido aplicado después pero con un ts anterior al del barco 2
+    store.upsert(VesselRecord("3", 39.2, 0.2, 5.0, 0.0, 0.0, ts=150.0))
+    store.upsert(VesselRecord("1", 39.3, 0.3, 5.0, 0.0, 0.0, ts=120.0))
+
+    assert [r.mmsi for r in store] == ["1", "3", "2"]
+    assert store.expire(160.0) == 2
+    assert [r.mmsi for r in store] == ["2"]
+
+
+def test_bbox_query_uses_grid_and_priority_truncation(tmp_path: Path) -> None:
+    service = _service(tmp_path)
+    service._handle_message(_position(224000001, 39.0, 0.0, sog=5.0))
+    service._handle_message(_position(224000002, 39.2, 0.3, sog=20.0))
+    service._handle_message(_position(224000003, 39.4, 0.6, sog=12.0))
+    service._handle_message(_position(224000004, 43.0, 3.0, sog=30.0))
+    # Un barco que se mueve a otra celda debe dejar de aparecer en la antigua
+    service._handle_message(_position(224000001, 41.0, 2.0, sog=5.0))
+
+    result = service.get_ships_in_bbox("-0.5,38.5,1.0,39.5")
+    assert sorted(f["properties"]["mmsi"] for f in result["features"]) == ["224000002", "224000003"]
+    assert result["meta"]["in_bbox"] == 2
+
+    fastest = service.get_ships_in_bbox("-5,35,5,45", max_items=2, priority="speed")
+    assert [f["properties"]["mmsi"] for f in fastest["features"]] == ["224000004", "224000002"]
+    assert fastest["meta"]["in_bbox"] == 4
+
+    recent = service.get_ships_in_bbox("-5,35,5,45", max_items=1)
+    assert [f["properties"]["mmsi"] for f in recent["features"]] == ["224000001"]
+    assert len(service._vessels._cells) == 4
+
+
+def test_throttle_drops_repeated_reports_before_parsing(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    service = _service(tmp_path)
+    service._throttle.configure(min_interval_seconds=30, min_move_meters=100)
+
+    service._handle_message(_position(224000001, 39.0, 0.0, sog=5.0))
+    # Mismo barco casi en el mismo sitio: se descarta sin llegar a json.loads
+    monkeypatch.setattr(json, "loads", lambda *_a, **_k: pytest.fail("throttled message was parsed"))
+    service._handle_message(_position(224000001, 39.0001, 0.0, sog=6.0))
+    monkeypatch.undo()
+    # Movimiento mayor que el umbral: se aplica aunque no haya pasado el intervalo
+    service._handle_message(_position(224000001, 39.01, 0.0, sog=7.0))
+    service._handle_message(_position(224000002, 39.0, 0.0))
+
+    stats = service.get_status()["ingest"]
+    assert (stats["received"], stats["applied"], stats["throttled"]) == (4, 3, 1)
+    assert service._vessels.get("224000001").sog == 7.0
+
+
+def test_throttle_applies_latest_deferred_report_when_interval_elapses(tmp_path: Path) -> None:
+    service = _service(tmp_path)
+    service._throttle.configure(min_interval_seconds=30, min_move_meters=100)
+    start = time.time()
+
+    service._handle_message(_position(224000001, 39.0, 0.0, sog=5.0))
+    service._handle_message(_position(224000001, 39.0001, 0.0, sog=6.0))
+    service._handle_message(_position(224000001, 39.0002, 0.0, sog=6.5))
+    assert service._vessels.get("224000001").sog == 5.0
+
+    assert service._apply_deferred(start + 1) == 0
+    assert service._apply_deferred(start + 31) == 1
+    record = service._vessels.get("224000001")
+    assert (record.sog, record.lat) == (6.5, 39.0002)
+    stats = service.get_status()["ingest"]
+    assert (stats["applied"], stats["throttled"], stats["pending"]) == (2, 2, 0)
+
+
+def _static(mmsi: int, destination: str) -> str:
+    return json.dumps(
+        {
+            "MessageType": "ShipStaticData",
+            "MetaData": {"MMSI": mmsi, "latitude": 39.0, "longitude": 0.0},
+            "Message": {
+                "ShipStaticData": {
+                    "UserID": mmsi,
+                    "Name": "SHIP@@@@",
+                    "CallSign": "EA1234 ",
+                    "ImoNumber": 9123456,
+                    "Type": 70,
+                    "Destination": destination,
+                    "Dimension": {"A": 100, "B": 20, "C": 10, "D": 8},
+                    "Eta": {"Month": 6, "Day": 2, "Hour": 14, "Minute": 30},
+                    "MaximumStaticDraught": 7.5,
+                }
+            },
+        }
+    )
+
+
+def test_static_data_is_joined_at_serialization_and_persisted(tmp_path: Path) -> None:
+    service = _service(tmp_path)
+    service._throttle.configure(min_interval_seconds=60, min_move_meters=1000)
+    service._handle_message(_position(224000001, 39.0, 0.0))
+    # Los mensajes estáticos nunca pasan por el limitador
+    service._handle_message(_static(224000001, "VALENCIA"))
+    service._handle_message(_static(224000001, "VALENCIA"))
+
+    props = service.get_snapshot()["features"][0]["properties"]
+    assert props["destination"] == "VALENCIA"
+    assert props["name"] == "SHIP 224000001"  # MetaData tiene prioridad
+    assert (props["type"], props["length_m"], props["width_m"], props["eta"]) == (70, 120, 18, "06-02 14:30")
+    assert service._static.describe()["updates"] == 1
+    assert service._static.describe()["unchanged"] == 1
+
+    service.close()
+    reloaded = _service(tmp_path)
+    assert reloaded._static.get("224000001")["callsign"] == "EA1234"
+
+
+def test_tracks_downsample_straight_runs_and_respect_budget() -> None:
+    from backend.services.vessel_tracks import VesselTrackStore
+
+    tracks = VesselTrackStore(max_points=4, min_distance_m=100, min_turn_deg=10, max_total_points=6)
+    # Rumbo norte en línea recta: sólo se conservan inicio y punto actual
+    for i in range(10):
+        tracks.add("1", 1000.0 + i, 39.0 + i * 0.01, 0.0)
+    assert [round(lat, 2) for _, lat, _ in tracks.get("1")] == [39.0, 39.09]
+    # Giro al este: nuevo vértice; después el anillo rota sin crecer
+    for i in range(1, 6):
+        tracks.add("1", 2000.0 + i, 39.09 + (i % 2) * 0.01, i * 0.02)
+    points = tracks.get("1")
+    assert len(points) == 4
+    assert points[-1][0] == 2005.0
+
+    tracks.add("2", 3000.0, 40.0, 1.0)
+    tracks.add("2", 3001.0, 40.0, 1.1)
+    tracks.add("3", 3002.0, 41.0, 1.0)
+    # El presupuesto global (6 puntos) expulsa la estela menos reciente
+    assert tracks.get("1") == []
+    assert tracks.total_points == 3
+    assert tracks.evicted == 1
+
+
+def test_moored_vessel_keeps_track_while_reporting() -> None:
+    from backend.services.vessel_tracks import VesselTrackStore
+
+    tracks = VesselTrackStore(min_distance_m=100)
+    tracks.add("1", 1000.0, 39.0, 0.0)
+    # Informes sin moverse: no añaden punto pero renuevan su hora
+    tracks.add("1", 1500.0, 39.0001, 0.0)
+    assert tracks.expire(1200.0) == 0
+    assert tracks.get("1", since=1200.0) == [(1500.0, 39.0, 0.0)]
+    assert tracks.expire(1600.0) == 1
+
+
+def test_track_endpoint_and_bulk_tracks(tmp_path: Path) -> None:
+    service = _service(tmp_path)
+    for i in range(3):
+        service._handle_message(_position(224000001, 39.0 + i * 0.01, 0.0 + (i % 2) * 0.01))
+
+    track = service.get_track("224000001")
+    assert track["geometry"]["type"] == "LineString"
+    assert len(track["geometry"]["coordinates"]) == 3
+    assert service.get_track("999") is None
+
+    bulk = service.get_ships_in_bbox(tracks=True)
+    assert len(bulk["features"][0]["properties"]["track"]) == 3
+
+    # Un punto más antiguo que el TTL desaparece igual en ambas rutas
+    service._tracks._tracks["224000001"].data[0] = time.time() - service._ttl_seconds - 1
+    assert len(service.get_track("224000001")["geometry"]["coordinates"]) == 2
+    bulk = service.get_ships_in_bbox(tracks=True)
+    assert len(bulk["features"][0]["properties"]["track"]) == 2
+
+
+def test_dead_reckoning_projects_along_course_with_cap() -> None:
+    from backend.services.dead_reckoning import extrapolate
+
+    lat, lon, applied = extrapolate(
+        [40.0, 40.0, 40.0, 40.0],
+        [0.0, 0.0, 0.0, 179.99],
+        [10.0, 10.0, None, 100.0],
+        [0.0, 90.0, 45.0, 90.0],
+        [100.0, 1000.0, 100.0, 60.0],
+        300,
+    )
+    # 10 m/s al norte durante 100 s = 1 km
+    assert lat[0] - 40.0 == pytest.approx(1000 / 111_195, rel=1e-3)
+    # Al este, recortado a 300 s = 3 km
+    assert applied[1] == 300
+    assert lon[1] == pytest.approx(3000 / (111_195 * 0.766), rel=1e-2)
+    # Sin velocidad no se mueve; cruce del antimeridiano normalizado
+    assert (lat[2], lon[2], applied[2]) == (40.0, 0.0, 0.0)
+    assert lon[3] < -179.9
+
+
+def test_ship_features_are_dead_reckoned_at_snapshot_time(tmp_path: Path) -> None:
+    service = _service(tmp_path)
+    service._handle_message(_position(224000001, 39.0, 0.0, sog=10.0))
+    record = service._vessels.get("224000001")
+    feature = service._features_for([record], record.ts + 60)[0]
+    lon, lat = feature["geometry"]["coordinates"]
+    assert feature["properties"]["dr_seconds"] == 60
+    # Rumbo 90: avanza al este ~308 m
+    assert lat == pytest.approx(39.0)
+    assert lon > 0.003
+
+    # Sog 102.3 = velocidad no disponible: no se extrapola
+    service._handle_message(_position(224000002, 39.0, 0.0, sog=102.3))
+    record = service._vessels.get("224000002")
+    feature = service._features_for([record], record.ts + 60)[0]
+    assert feature["geometry"]["coordinates"] == [0.0, 39.0]
+    assert "dr_seconds" not in feature["properties"]
+
+
+class _FakeSocket:
+    def __init__(self) -> None:
+        self.sent: list = []
+        self.inbox: "asyncio.Queue[str]" = asyncio.Queue()
+
+    async def send(self, payload: str) -> None:
+        self.sent.append(json.loads(payload))
+
+    async def recv(self) -> str:
+        return await self.inbox.get()
+
+
+def test_live_resubscription_with_multiple_boxes(tmp_path: Path) -> None:
+    import threading
+
+    service = _service(tmp_path)
+    stop = threading.Event()
+
+    async def scenario() -> _FakeSocket:
+        ws = _FakeSocket()
+        task = asyncio.create_task(service._handle_connection(ws, "key", stop))
+        await ws.inbox.put(_position(224000001, 39.0, 0.0))
+        await asyncio.sleep(0.05)
+        # Dos franjas costeras en lugar de la caja grande, sin reconectar
+        service.set_view_bboxes([[[39.0, -0.5], [40.5, 0.5]], [[36.0, -6.0], [36.5, -5.0]]])
+        await asyncio.sleep(1.2)
+        await ws.inbox.put(_position(224000002, 39.5, 0.1))
+        await asyncio.sleep(0.05)
+        stop.set()
+        await ws.inbox.put(_position(224000003, 39.6, 0.1))
+        await asyncio.wait_for(task, timeout=3)
+        return ws
+
+    ws = asyncio.run(scenario())
+    assert [len(msg["BoundingBoxes"]) for msg in ws.sent] == [1, 2]
+    assert ws.sent[1]["BoundingBoxes"][1] == [[36.0, -6.0], [36.5, -5.0]]
+
+    stats = service.get_status()["subscription"]
+    assert stats["resubscriptions"] == 1
+    assert stats["view_override"] is True
+    assert stats["history"][0]["messages"] == 1
+    assert stats["area_vs_default"] < 0.2
+
+
+def test_event_loop_ingest_mode_runs_supervised_task(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    service = _service(tmp_path)
+    service._ingest_mode = "event_loop"
+    runs = []
+
+    async def fake_connection_loop(stop_event) -> None:  # type: ignore[no-untyped-def]
+        runs.append(stop_event)
+        if len(runs) == 1:
+            raise RuntimeError("boom")  # el supervisor debe reiniciar la ingesta
+        while not stop_event.is_set():
+            await asyncio.sleep(0.01)
+
+    monkeypatch.setattr(service, "_run_connection_loop", fake_connection_loop)
+
+    async def scenario() -> None:
+        with service._lock:
+            service._start_thread_locked()
+        assert service._thread is None
+        await asyncio.sleep(1.2)
+        assert service.runs_in_event_loop
+        assert len(runs) == 2 and isinstance(runs[1], asyncio.Event)
+        assert service.get_status()["ingest_mode"] == "event_loop"
+        task = service._task
+        service.close()
+        await asyncio.sleep(0.05)
+        assert task.done()
+        assert not service.runs_in_event_loop
+
+    asyncio.run(scenario())
+
+
+def test_event_loop_snapshot_builds_off_loop_without_the_lock(tmp_path: Path) -> None:
+    import threading
+
+    service = _service(tmp_path)
+    service._handle_message(_position(224000001, 39.0, 0.0))
+    holders = []
+
+    class _RecordingLock:
+        def __init__(self) -> None:
+            self._inner = threading.Lock()
+
+        def __enter__(self):  # type: ignore[no-untyped-def]
+            holders.append(threading.get_ident())
+            return self._inner.__enter__()
+
+        def __exit__(self, *exc):  # type: ignore[no-untyped-def]
+            return self._inner.__exit__(*exc)
+
+    service._lock = _RecordingLock()  # type: ignore[assignment]
+
+    async def scenario() -> None:
+        stop_event = asyncio.Event()
+        task = asyncio.create_task(service._snapshot_loop(stop_event))
+        await asyncio.sleep(0.2)
+        stop_event.set()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(scenario())
+    assert len(service._published.features) == 1
+    assert holders and set(holders) == {loop_thread}
+
+
+def test_event_loop_requests_never_build_snapshots_inline(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    service = _service(tmp_path)
+    service._ingest_mode = "event_loop"
+    service._handle_message(_position(224000001, 39.0, 0.0))
+
+    async def scenario() -> None:
+        service._loop = asyncio.get_running_loop()
+        service._task = asyncio.create_task(asyncio.sleep(10))
+        monkeypatch.setattr(service, "_collect_snapshot", lambda *_a: pytest.fail("request built a snapshot"))
+        # Sin publicación previa se sirve el snapshot vacío en vez de construirlo
+        assert service.get_published_snapshot().features == ()
+        service._task.cancel()
+
+    asyncio.run(scenario())
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from backend.services.blitzortung_service import LightningStrike
+from backend.services.storm_tracker import StormProximityTracker
+
+HOME_LAT, HOME_LON = 39.9378, -0.1014
+KM_PER_DEG_LAT = 110.574
+
+
+def _strike(ts: float, km_north: float) -> LightningStrike:
+    return LightningStrike(timestamp=ts, lat=HOME_LAT + km_north / KM_PER_DEG_LAT, lon=HOME_LON)
+
+
+def test_tracker_reports_nothing_without_strikes() -> None:
+    tracker = StormProximityTracker(HOME_LAT, HOME_LON)
+    state = tracker.snapshot()
+    assert state["active"] is False
+    assert state["status"] == "none"
+
+
+def test_tracker_estimates_approach_of_storm_moving_south() -> None:
+    now = time.time()
+    tracker = StormProximityTracker(HOME_LAT, HOME_LON, radius_km=150)
+    # Tormenta a 60 km al norte que avanza hacia el sur a 20 km/h durante 15 minutos
+    for minute in range(16):
+        ts = now - (15 - minute) * 60
+        distance = 60.0 - 20.0 * minute / 60.0
+        tracker.add_strikes([_strike(ts, distance), _strike(ts + 1, distance + 0.5)])
+    # Rayo muy lejano: se descarta sin entrar en los agregados
+    tracker.add_strikes([LightningStrike(timestamp=now, lat=10.0, lon=10.0)])
+
+    state = tracker.snapshot(now=now)
+    assert state["active"] is True
+    assert state["status"] == "approaching"
+    assert state["approach_kmh"] == pytest.approx(20.0, abs=1.0)
+    assert state["nearest"]["distance_km"] == pytest.approx(55.0, abs=0.5)
+    assert state["nearest"]["bearing_deg"] == pytest.approx(0.0, abs=1.0)
+    assert state["movement"]["heading_deg"] == pytest.approx(180.0, abs=2.0)
+    assert state["eta_minutes"] == pytest.approx(165, abs=10)
+    assert "acercándose" in state["summary"]
+    assert tracker.ignored_far == 1
+
+
+def test_tracker_expires_buckets_outside_window() -> None:
+    now = time.time()
+    tracker = StormProximityTracker(HOME_LAT, HOME_LON, window_seconds=600)
+    tracker.add_strikes([_strike(now - 300, 10.0)])
+    assert tracker.snapshot(now=now)["strike_count"] == 1
+    assert tracker.snapshot(now=now + 900)["active"] is False
+
+
+def test_storm_proximity_endpoint_follows_configured_location(monkeypatch: pytest.MonkeyPatch) -> None:
+    from types import SimpleNamespace
+
+    from backend.routers import weather
+
+    tracker = StormProximityTracker(HOME_LAT, HOME_LON)
+    config = SimpleNamespace(location=SimpleNamespace(lat=40.4168, lon=-3.7038), ephemerides=None)
+    monkeypatch.setattr(weather, "_load_main_module", lambda: SimpleNamespace(storm_tracker=tracker))
+    monkeypatch.setattr(weather.config_manager, "read", lambda: config)
+
+    weather.get_storm_proximity()
+
+    assert (tracker.lat, tracker.lon) == (40.4168, -3.7038)
@@ -48,6 +48,11 @@ def test_transport_nearby_includes_aircraft(
 
     monkeypatch.setattr(module, "opensky_service", module.opensky_service, raising=False)
     monkeypatch.setattr(module.opensky_service, "get_snapshot", fake_snapshot)
+
+    async def fake_snapshot_async(config, bbox, extended_override):  # type: ignore[no-untyped-def]
+        return fake_snapshot(config, bbox, extended_override)
+
+    monkeypatch.setattr(module.opensky_service, "get_snapshot_async", fake_snapshot_async)
     monkeypatch.setattr(module, "ships_service", DummyShipsService())
 
     response = client.get("/api/transport/nearby?lat=40.0&lon=-3.0&radius_km=50")